@@ -12,12 +12,12 @@ if __name__ == "__main__":
     args = parse_args()
     
     # Apply all validation functions to the args
-    args.band = bandcheck(args.band)
+    args.band = bandcheck(args.band[0]) # one module
     if args.pwr is not None:
         args.pwr = pwrcheck(args.pwr)
     args.mode = modecheck(args.mode)  
     args.netid = netidcheck(args.netid)
-    args.port = uartcheck(args.port)
+    args.port = uartcheck(args.port[0])
 
      # Parameter validation including netid check
     validate_netid_parameter(args.netid, args.parameter)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Bytes and airtime saved by compressing messages.
+#
+# Encodes every line of a corpus of chat, ham and telemetry messages
+# as rylr998.py --compress would, and totals the payload bytes and the
+# time on air at a PARAMETER setting, with and without compression.
+# Airtime moves in whole symbols, so a saved byte is not always a
+# saved millisecond.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.compression [PARAMETER] [corpus]
+
+import os
+import sys
+
+from src.core.airtime import format_airtime, parameter_airtime
+from src.core.compress import encode
+from src.core.payload import fragment
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'corpus.txt')
+
+
+def airtime(parameter: str, body: bytes) -> float:
+    """Seconds on air for a body, fragments included"""
+    return sum(parameter_airtime(parameter, len(p)) for p in fragment(body, 0))
+
+
+def main() -> None:
+    parameter = sys.argv[1] if len(sys.argv) > 1 else '9,7,1,12'
+    corpus = sys.argv[2] if len(sys.argv) > 2 else CORPUS
+    with open(corpus, 'rb') as f:
+        messages = [line.rstrip(b'\r\n') for line in f if line.strip()]
+
+    plain_bytes = sent_bytes = compressed = 0
+    plain_time = sent_time = 0.0
+    for msg in messages:
+        body = encode(msg)
+        compressed += body is not msg
+        plain_bytes += len(msg)
+        sent_bytes += len(body)
+        plain_time += airtime(parameter, msg)
+        sent_time += airtime(parameter, body)
+
+    print(f"{len(messages)} messages, PARAMETER={parameter}, {compressed} sent compressed")
+    print(f"   bytes: {plain_bytes:8d} plain {sent_bytes:8d} sent, "
+          f"{100 * (1 - sent_bytes / plain_bytes):5.1f}% saved")
+    print(f" airtime: {format_airtime(plain_time):>8} plain {format_airtime(sent_time):>8} sent, "
+          f"{100 * (1 - sent_time / plain_time):5.1f}% saved")
+
+
+if __name__ == "__main__":
+    main()
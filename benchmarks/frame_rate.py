@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Receive throughput benchmark: one byte per await versus bulk reads.
+#
+# Streams back-to-back +RCV frames into a pseudo-terminal and counts how
+# many frames per second a SerialManager on the slave side can take in,
+# first through read_byte() (the old xcvr() path: one coroutine round
+# trip per byte, accumulating until '\n'), then through read_available()
+# and the ResponseParser, as Radio.read() does.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.frame_rate [frames]
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from src.core.protocol import ResponseParser
+from src.core.serial import SerialManager
+
+FRAME = b'+RCV=42,39,The quick brown fox jumps over the lazy,-47,12\r\n'
+
+
+def writer(fd: int, frames: int) -> None:
+    """Write frames to the pty master, blocking when the pty is full"""
+    data = FRAME * frames
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+async def byte_path(serial: SerialManager, frames: int) -> None:
+    """Await read_byte() once per byte, as xcvr() used to"""
+    line = bytearray()
+    count = 0
+    while count < frames:
+        if serial.has_data():
+            data = await serial.read_byte()
+            line += data
+            if data == b'\n':
+                line.clear()
+                count += 1
+        else:
+            await asyncio.sleep(0)
+
+
+async def frame_path(serial: SerialManager, frames: int) -> None:
+    """Sleep until readable, then parse every waiting response at once"""
+    parser = ResponseParser()
+    wakeup = asyncio.Event()
+    serial.add_reader(wakeup.set)
+    count = 0
+    try:
+        while count < frames:
+            await wakeup.wait()
+            wakeup.clear()
+            count += len(parser.feed(serial.read_available()))
+    finally:
+        serial.remove_reader()
+
+
+def measure(path, frames: int) -> float:
+    """Return the frames per second path achieves"""
+    master, slave = os.openpty()
+    os.set_blocking(master, True)
+    serial = SerialManager(os.ttyname(slave), '115200')
+    thread = threading.Thread(target=writer, args=(master, frames), daemon=True)
+    try:
+        start = time.perf_counter()
+        thread.start()
+        asyncio.run(path(serial, frames))
+        elapsed = time.perf_counter() - start
+    finally:
+        thread.join()
+        serial.close()
+        os.close(slave)
+        os.close(master)
+    return frames / elapsed
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{frames} frames of {len(FRAME)} bytes")
+    rates = {}
+    for path in (byte_path, frame_path):
+        rates[path.__name__] = measure(path, frames)
+        print(f"{path.__name__:>10}: {rates[path.__name__]:10.0f} frames/s")
+    print(f"   speedup: {rates['frame_path'] / rates['byte_path']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
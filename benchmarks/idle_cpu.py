@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Idle CPU benchmark for the xcvr() wait strategies.
+#
+# Opens a pseudo-terminal, points a SerialManager at the slave side and
+# lets it sit on a quiet "band" for a few seconds, first busy-polling
+# has_data() the way xcvr() used to, then sleeping on the readiness
+# callback. CPU usage is process time over wall time.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.idle_cpu [seconds]
+
+import asyncio
+import os
+import sys
+import time
+
+from src.core.serial import SerialManager
+
+
+async def busy_poll(serial: SerialManager, seconds: float) -> None:
+    """Spin on has_data() with no await, as the old xcvr() loop did"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if serial.has_data():
+            await serial.read_byte()
+
+
+async def event_driven(serial: SerialManager, seconds: float) -> None:
+    """Sleep until the port is readable"""
+    wakeup = asyncio.Event()
+    if not serial.add_reader(wakeup.set):
+        raise RuntimeError("event loop cannot watch the serial port")
+    try:
+        deadline = time.monotonic() + seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                await asyncio.wait_for(wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            wakeup.clear()
+            while serial.has_data():
+                await serial.read_byte()
+    finally:
+        serial.remove_reader()
+
+
+def measure(strategy, serial: SerialManager, seconds: float) -> float:
+    """Return the CPU usage of strategy in percent of one core"""
+    wall = time.monotonic()
+    cpu = time.process_time()
+    asyncio.run(strategy(serial, seconds))
+    return 100.0 * (time.process_time() - cpu) / (time.monotonic() - wall)
+
+
+def main() -> None:
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    master, slave = os.openpty()  # keep the master open: nobody talks
+    serial = SerialManager(os.ttyname(slave), '115200')
+    try:
+        for strategy in (busy_poll, event_driven):
+            usage = measure(strategy, serial, seconds)
+            print(f"{strategy.__name__:>12}: {usage:6.2f}% CPU over {seconds:.1f}s idle")
+    finally:
+        serial.close()
+        os.close(slave)
+        os.close(master)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Throughput of the sans-I/O response parser, no hardware attached.
+#
+# Feeds a synthetic stream of +RCV frames mixed with command responses
+# to ResponseParser in serial-port-sized chunks and reports bytes and
+# events per second. Every frame must parse: a stream the parser
+# discards from measures resynchronisation, not parsing.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.parser_throughput [megabytes]
+
+import sys
+import time
+
+from src.core.protocol import ResponseParser
+
+RESPONSES = (
+    b'+RCV=42,39,The quick brown fox jumps over the lazy,-47,12\r\n',
+    b'+RCV=7,240,' + b'x' * 240 + b',-102,-3\r\n',
+    b'+OK\r\n',
+    b'+ERR=17\r\n',
+    b'+PARAMETER=9,7,1,12\r\n',
+)
+CHUNK = 4096  # about what one read of a busy port returns
+
+
+def main() -> None:
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    block = b''.join(RESPONSES) * 64
+    stream = block * max(1, int(megabytes * 1e6 / len(block)))
+    chunks = [stream[i:i+CHUNK] for i in range(0, len(stream), CHUNK)]
+
+    parser = ResponseParser()
+    events = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        events += len(parser.feed(chunk))
+    elapsed = time.perf_counter() - start
+    assert parser.discarded == 0, f"{parser.discarded} lines discarded: a malformed response"
+
+    print(f"{len(stream) / 1e6:.1f} MB in {elapsed:.2f}s: "
+          f"{len(stream) / elapsed / 1e6:.2f} MB/s, {events / elapsed:,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
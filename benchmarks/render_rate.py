@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Terminal output benchmark: one screen update per frame versus a frame
+# interval.
+#
+# Runs the curses Display on a pseudo-terminal and draws frames as
+# xcvr() does for +RCVs, arriving in bursts, then counts the doupdate()
+# calls and the bytes written to the terminal: first with no frame
+# interval, every frame flushed as it is drawn, then with
+# Display.FRAME_INTERVAL. Over SSH, every byte goes over the link.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.render_rate [frames]
+
+import curses as cur
+import os
+import pty
+import sys
+import time
+
+from display import Display
+
+TEXT = 'The quick brown fox jumps over the lazy'
+BURST = 10     # frames read at once, as from a busy channel
+GAP = 0.005    # seconds between bursts
+
+
+def draw(interval: float, frames: int, report: int) -> None:
+    """In the child: draw the frames and write the flush count to report"""
+    def run(scr) -> None:
+        dsply = Display(scr, frame_interval=interval)
+        start = time.perf_counter()
+        for n in range(frames):
+            dsply.rxaddnstr(f"{n % 1000:3}: {TEXT}"[:40], 40, dsply.BLACK_PINK)
+            dsply.stwin.addnstr(0, dsply.RSSI_COL + 5, f"{-40 - n % 50:4}", 4)
+            dsply.stwin.noutrefresh()
+            dsply.mark()
+            dsply.flush()
+            if n % BURST == BURST - 1:
+                time.sleep(GAP)
+        dsply.mark(urgent=True)
+        dsply.flush() # the last of them
+        elapsed = time.perf_counter() - start
+        cur.noraw()
+        cur.resetty()
+        os.write(report, f"{dsply.flushes} {elapsed}".encode())
+    cur.wrapper(run)
+
+
+def measure(interval: float, frames: int):
+    """Return the flushes, bytes written to the tty and seconds taken"""
+    report_r, report_w = os.pipe()
+    pid, master = pty.fork()
+    if pid == 0:
+        os.close(report_r)
+        os.environ.update(TERM='xterm-256color', LINES='40', COLUMNS='80')
+        try:
+            draw(interval, frames, report_w)
+        finally:
+            os._exit(0)
+    os.close(report_w)
+    written = 0
+    while True:
+        try:
+            data = os.read(master, 65536)
+        except OSError:  # EIO: the child is gone
+            break
+        if not data:
+            break
+        written += len(data)
+    os.waitpid(pid, 0)
+    os.close(master)
+    flushes, elapsed = os.read(report_r, 100).split()
+    os.close(report_r)
+    return int(flushes), written, float(elapsed)
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{frames} frames, {BURST} at a time, {GAP * 1000:.0f} ms apart")
+    results = {}
+    for interval in (0.0, Display.FRAME_INTERVAL):
+        flushes, written, elapsed = results[interval] = measure(interval, frames)
+        print(f"interval {interval * 1000:3.0f} ms: {flushes * 1000 / frames:7.1f} flushes and "
+              f"{written * 1000 / frames:9.0f} tty bytes per 1000 frames, {elapsed:.2f} s")
+    before, after = results[0.0][1], results[Display.FRAME_INTERVAL][1]
+    print(f"       bytes: {before / after:10.1f}x fewer")
+
+
+if __name__ == "__main__":
+    main()
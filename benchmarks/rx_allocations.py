@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Allocation benchmark for the receive path, measured with tracemalloc.
+#
+# Runs a synthetic stream of 240 byte +RCV frames through
+#
+#   legacy:  the old xcvr() accumulation, rx_buf += str(data, 'utf8')
+#            per byte, then rx_buf[:-2] and split(',', 2) at end of line
+#   parser:  ResponseParser, which parses in one preallocated buffer
+#            and hands out the payload as a memoryview
+#
+# Each path decodes the payload once, as the display does. The parser
+# buffer is allocated before tracing starts, as it is at startup. tracemalloc
+# only reports current and peak memory, so each path yields after every
+# unit of work it does (a byte for legacy, a serial read for parser) and
+# the growth of the peak over each unit is summed. That is the memory
+# churned per frame, give or take allocations within one unit.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.rx_allocations [frames]
+
+import sys
+import time
+import tracemalloc
+
+from src.core.protocol import ResponseParser
+
+FRAME = b'+RCV=42,240,' + b'x' * 240 + b',-102,-3\r\n'
+CHUNK = 64  # bytes per serial read
+
+
+def legacy(chunks):
+    """The per-byte string accumulation xcvr() used to do"""
+    rx_buf = ''
+    for chunk in chunks:
+        for i in range(len(chunk)):
+            data = chunk[i:i+1]
+            rx_buf += str(data, 'utf8')
+            if data == b'\n':
+                rx_buf = rx_buf[5:-2]  # drop +RCV= and CR LF
+                addr, n, rx_buf = rx_buf.split(',', 2)
+                n = int(n)
+                msg = rx_buf[:n]
+                rx_buf = rx_buf[n+1:]
+                rssi, snr = rx_buf.split(',')
+                rx_buf = ''
+            yield
+
+
+def parser(chunks, p=ResponseParser()):
+    """ResponseParser, decoding only the payload"""
+    for chunk in chunks:
+        for event in p.feed(chunk):
+            msg = str(event.payload, 'utf8')
+        yield
+
+
+def measure(path, chunks, frames: int):
+    """Return (bytes churned per frame, peak bytes, microseconds per frame)"""
+    churn = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    steps = path(chunks)
+    while True:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        if next(steps, StopIteration) is StopIteration:
+            break
+        churn += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return churn / frames, peak, 1e6 * elapsed / frames
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    stream = FRAME * frames
+    chunks = [stream[i:i+CHUNK] for i in range(0, len(stream), CHUNK)]
+    print(f"{frames} frames of {len(FRAME)} bytes in {CHUNK} byte reads")
+    for path in (legacy, parser):
+        churn, peak, usec = measure(path, chunks, frames)
+        print(f"{path.__name__:>7}: {churn:9.0f} bytes/frame churned, "
+              f"peak {peak:6d} bytes, {usec:7.1f} us/frame (traced)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# UI cost per received frame in the urwid front end.
+#
+# Does to the widgets of src/ui/urwid_init.py what urwid998.py does for
+# each +RCV: add the message to the receive box and set ADDR, RSSI and
+# SNR on the Status, whose 'change' signal updates the status widgets.
+# Then draws, as MainLoop.draw_screen() does: renders the frame to a
+# canvas and writes it with a raw_display Screen whose output is kept in
+# memory, so the terminal's speed is left out but the escape sequences
+# are counted.
+#
+# The frames arrive in bursts, and are drawn first after each frame,
+# then once a burst, as the FRAME_INTERVAL coalescing does. The receive
+# box fills up to MAX_LINES and stays there, so the later frames show
+# what a long-running session costs.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.urwid_frame_cost [frames]
+
+import io
+import os
+import sys
+import time
+
+import urwid
+
+from src.ui.constants import WindowSize
+from src.ui.urwid_init import PALETTE, RadioFrame, Status
+
+TEXT = 'The quick brown fox jumps over the lazy'
+BURST = 10     # frames read at once, as from a busy channel
+SIZE = (WindowSize.MAX_COL, WindowSize.MAX_ROW)
+
+
+def measure(frames: int, burst: int):
+    """Return the seconds updating widgets, seconds drawing, draws and bytes written"""
+    output = io.StringIO()
+    keys, _ = os.pipe() # a keyboard that stays quiet
+    screen = urwid.raw_display.Screen(input=os.fdopen(keys), output=output)
+    screen.set_terminal_properties(colors=256)
+    screen.register_palette(PALETTE)
+    screen.start()
+    status = Status()
+    frame = RadioFrame(status)
+    status.set(band='915000000', pwr='22', netid='18')
+    screen.draw_screen(SIZE, frame.widget.render(SIZE, focus=True))
+    output.seek(0)
+    output.truncate()
+
+    updating = drawing = 0.0
+    draws = 0
+    for n in range(frames):
+        start = time.perf_counter()
+        frame.add(f"{n % 1000:3}: {TEXT}"[:WindowSize.RX_WIDTH], 'receive')
+        status.set(txrx='', addr=str(n % 3 + 1), rssi=str(-40 - n % 50), snr=str(n % 12))
+        updating += time.perf_counter() - start
+        if n % burst == burst - 1:
+            start = time.perf_counter()
+            screen.draw_screen(SIZE, frame.widget.render(SIZE, focus=True))
+            drawing += time.perf_counter() - start
+            draws += 1
+    screen.stop()
+    return updating, drawing, draws, len(output.getvalue().encode())
+
+
+def main() -> None:
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{frames} frames, {RadioFrame.MAX_LINES} kept in the receive box")
+    results = {}
+    for burst in (1, BURST):
+        updating, drawing, draws, written = results[burst] = measure(frames, burst)
+        label = 'every frame' if burst == 1 else f"once per {burst}"
+        print(f"drawn {label:<12}: update {updating * 1e6 / frames:6.1f} µs + draw "
+              f"{drawing * 1e6 / frames:6.1f} µs per frame, {draws} draws, "
+              f"{written / frames:5.0f} bytes per frame")
+    before, after = (results[b][0] + results[b][1] for b in (1, BURST))
+    print(f"   UI time: {before / after:10.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
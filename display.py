@@ -15,6 +15,8 @@
 import curses as cur
 import _curses
 import curses.ascii
+import time
+from typing import Callable, Optional
 
 
 import locale
@@ -73,8 +75,36 @@ class Display:
     NETID_ROW = 2
     NETID_COL = 26 
 
+    # expected time on air, on the bottom border, relative to the bdrwin
+    AIRTIME_ROW = 27
+    AIRTIME_COL = 2
+    AIRTIME_LEN = 38
+    airtime_lbl = ''
+
+    # news of a link on the top border: the delivery stats of the last
+    # peer sent to reliably, or how well the last peer heard is heard
+    LINK_ROW = 0
+    LINK_COL = 2
+    LINK_LEN = 38
+    link_lbl = ''
+    scroll_lbl = ''
+
     MAX_ROW   = 28
     MAX_COL   = 42
+    RX_ROWS   = 20
+    RX_WIDTH  = 40
+
+    # Screen updates. Drawing goes to the windows with noutrefresh() and
+    # costs nothing at the terminal; doupdate() writes the changes out.
+    # In a burst of frames, writing them out after each one would make
+    # the terminal, over a slow SSH link too, the bottleneck of the
+    # receive path, so the changes are flushed at most once per
+    # FRAME_INTERVAL, whatever number of frames they hold. Echoing a key
+    # cannot wait: mark(urgent=True) flushes on the next pass.
+    FRAME_INTERVAL = 0.05 # seconds between flushes, at least
+    dirty = False   # changes not yet written out
+    urgent = False  # the changes echo a key
+    flushes = 0
 
     # this needs to be part of the Display class
     rxrow = 0   # rxwin_y relative window coordinates
@@ -153,6 +183,39 @@ class Display:
 
         self.bdrwin.addnstr(24, self.NETID_COL+1, self.NETID_LBL, self.NETID_LEN, fg_bg)
 
+        if self.airtime_lbl:
+            self.bdrwin.addnstr(self.AIRTIME_ROW, self.AIRTIME_COL, self.airtime_lbl, self.AIRTIME_LEN, fg_bg)
+        if self.link_lbl:
+            self.bdrwin.addnstr(self.LINK_ROW, self.LINK_COL, self.link_lbl, self.LINK_LEN, fg_bg)
+
+        self.bdrwin.noutrefresh()
+
+    def show_airtime(self, label: str) -> None:
+        # redraw the bottom border in case the label got shorter
+        self.bdrwin.hline(self.AIRTIME_ROW, 1, cur.ACS_HLINE, self.maxcol-2)
+        self.airtime_lbl = label
+        self.bdrwin.addnstr(self.AIRTIME_ROW, self.AIRTIME_COL, label, self.AIRTIME_LEN,
+                            cur.color_pair(self.WHITE_BLACK))
+        self.bdrwin.noutrefresh()
+
+    def show_link(self, label: str) -> None:
+        self.link_lbl = label
+        if not self.scroll_lbl: # the scrollback position has the border
+            self.show_top(label, self.WHITE_BLACK)
+
+    def show_scroll(self, label: str) -> None:
+        # where the receive window is in the scrollback, '' when following
+        self.scroll_lbl = label
+        if label:
+            self.show_top(label, self.YELLOW_BLACK)
+        else:
+            self.show_top(self.link_lbl, self.WHITE_BLACK)
+
+    def show_top(self, label: str, fg_bg: int) -> None:
+        # redraw the top border in case the label got shorter
+        self.bdrwin.hline(self.LINK_ROW, 1, cur.ACS_HLINE, self.maxcol-2)
+        self.bdrwin.addnstr(self.LINK_ROW, self.LINK_COL, label, self.LINK_LEN,
+                            cur.color_pair(fg_bg))
         self.bdrwin.noutrefresh()
 
 
@@ -189,6 +252,19 @@ class Display:
         self.rxNextRow()
         self.rxwin.noutrefresh()
 
+    # a page of the scrollback: the rows in view, each (text, color)
+    def show_page(self, rows, highlight: Optional[int] = None) -> None:
+        self.rxwin.erase()
+        for n, (text, fg_bg) in enumerate(rows):
+            if n == highlight:
+                fg_bg = self.WHITE_RED
+            # insnstr() does not wrap or scroll, even in the last row
+            self.rxwin.insnstr(n, 0, text, self.RX_WIDTH, cur.color_pair(fg_bg))
+        # rxaddnstr() carries on below the last row
+        self.rxrow, self.rxcol = min(len(rows), self.RX_ROWS - 1), 0
+        self.rxwin.move(self.rxrow, self.rxcol)
+        self.rxwin.noutrefresh()
+
     def derive_txwin(self) -> _curses.window:
         txwin = self.bdrwin.derwin(1,self.maxcol-2,26,1)
         self.txwin = txwin 
@@ -211,7 +287,35 @@ class Display:
         self.stwin.bkgd(' ', fg_bg)
         self.stwin.noutrefresh()
 
-    def __init__(self, scr) -> None:
+    def mark(self, urgent: bool = False) -> None:
+        """Note changes made with noutrefresh(), to be written out"""
+        self.dirty = True
+        self.urgent = self.urgent or urgent
+
+    def due(self) -> Optional[float]:
+        """Seconds until the changes should be written out, None if there are none"""
+        if not self.dirty:
+            return None
+        if self.urgent:
+            return 0.0
+        return max(0.0, self.flushed_at + self.frame_interval - self.clock())
+
+    def flush(self) -> bool:
+        """Write out the changes if they are due. Returns True if it did"""
+        due = self.due() # the same sum, so that a flush due at 0.0 happens
+        if due is None or due > 0:
+            return False
+        cur.doupdate()
+        self.flushed_at = self.clock()
+        self.dirty = self.urgent = False
+        self.flushes += 1
+        return True
+
+    def __init__(self, scr, frame_interval: float = FRAME_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.frame_interval = frame_interval
+        self.clock = clock
+        self.flushed_at = clock() - frame_interval
         cur.savetty() # this has become necessary here  
         cur.raw()  # raw, almost vegan character handling needed
         scr.nodelay(True) # non-blocking getch()
@@ -31,13 +31,26 @@
 #
 
 import asyncio
+from typing import List, Optional
 from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
 #from serial.serialutil import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
 import logging
+import time
 import curses as cur
 import _curses
 import curses.ascii
-from src.core.serial import SerialManager  
+from src.core.radio import Outcome, Radio
+from src.core.protocol import (
+    MAX_PAYLOAD, Event, Ok, Err, ParamReport, RcvFrame, Factory, Reset, Ready
+)
+from src.core.at_engine import CommandTimeout, Command
+from src.core.reliable import format_stats
+from src.core.linkstats import format_link
+from src.core.store import Message, MessageStore
+from src.core.metrics import Registry, serve, watch_loop
+from src.core.trace import Tracer
+from src.ui.scrollback import Scrollback
+from src.core.airtime import parameter_airtime, format_airtime
 
 from display import Display
 
@@ -52,6 +65,9 @@ DEFAULT_SPREADING_FACTOR = '9'
 DEFAULT_BANDWIDTH = '7'
 DEFAULT_CODING_RATE = '1'
 DEFAULT_PREAMBLE = '12'
+TX_LINE = 40 # characters in the transmit window
+TX_MAX = 1000 # characters in a message; longer than a payload, it goes in fragments
+HISTORY = 1000 # messages from the log put in the scrollback at startup
 DEFAULT_PARAMETER = DEFAULT_SPREADING_FACTOR + ',' + DEFAULT_BANDWIDTH + ',' + DEFAULT_CODING_RATE + ',' + DEFAULT_PREAMBLE 
 
 
@@ -67,6 +83,7 @@ except ModuleNotFoundError:
 
 import argparse 
 import sys # needed to compensate for argparse's arg-parsing
+import signal # SIGUSR1 writes the --trace histograms
         
 class RYLR998:
 
@@ -75,13 +92,35 @@ class RYLR998:
     RXD1   = 15    # GPIO.BCM  pin 10
     RST    = 4     # GPIO.BCM  pin 7
 
-    serial: SerialManager = None
-    
+    # One Radio per module: its port, parser, command engine and queues.
+    # Typed messages go to the selected one.
+    radios: List[Radio] = []
+    radio: Radio = None
+
+    store: MessageStore = None # --log: messages sent and received
+    exporter = None # --metrics: the HTTP server
+
+    # What scrolls off the receive window is kept, for PgUp and PgDn and
+    # for CTRL-R, which searches back through it as you type
+    scrollback: Scrollback = None
+    query: Optional[str] = None  # the search, None if not searching
+    match: Optional[int] = None  # the scrollback row it found
+    failed = False               # the last search found nothing
+
     debug  = False # By default, don't go into debug mode
     reset  = False
+    echo   = False # retransmit received messages
+    hops   = 3     # times a message may be repeated on its way
+    duty   = '100' # duty cycle budget, percent
+    compress = False # compress outgoing messages when it saves airtime
+    coalesce = None  # ms a short message may wait to share a packet
+    reliable = False # have messages to one address acknowledged
+    mesh   = False # route messages through other nodes
+    dest   = None  # where typed messages go; None: our own address
 
     # RYLR998 configuration parameters 
     addr      = str(DEFAULT_ADDR_INT) # the default
+    band      = str(DEFAULT_BAND)
     netid     = str(DEFAULT_NETID)
     pwr       = str(DEFAULT_CRFOP) # will be set to None if --pwr is absent because of unexpected module behavior
     mode      = str(DEFAULT_MODE) 
@@ -90,53 +129,18 @@ class RYLR998:
     bandwidth = str(DEFAULT_BANDWIDTH)
     coding_rate = str(DEFAULT_CODING_RATE)
     preamble  = str(DEFAULT_PREAMBLE)
-    version   = ''
-    uid       = '' 
-
-    # state "machines" for various AT command and receiver responses
-    
-    ADDR_TABLE  = [b'+',b'A',b'D',b'D',b'R',b'E',b'S',b'S',b'=']
-    BAND_TABLE  = [b'+',b'B',b'A',b'N',b'D',b'=']
-    CRFOP_TABLE = [b'+',b'C',b'R',b'F',b'O',b'P',b'=']
-    ERR_TABLE   = [b'+',b'E',b'R',b'R',b'=']
-    FACT_TABLE  = [b'+',b'F',b'A',b'C',b'T',b'O',b'R',b'Y'] # reset to factory defaults
-    IPR_TABLE   = [b'+',b'I',b'P',b'R',b'=']
-    MODE_TABLE  = [b'+',b'M',b'O',b'D',b'E',b'=']
-    NETID_TABLE = [b'+',b'N',b'E',b'T',b'W',b'O',b'R',b'K',b'I',b'D',b'=']
-    OK_TABLE    = [b'+',b'O',b'K']
-    PARAM_TABLE = [b'+',b'P',b'A',b'R',b'A',b'M',b'E',b'T',b'E',b'R',b'=']
-    RCV_TABLE   = [b'+',b'R',b'C',b'V',b'=']  # receive is the default "state"
-#   RESET_table = [b'+',b'R',b'E',b'S',b'E',b'T'] # RESET detected in state 2 if state_table == RCV_table
-#   READY_table = [b'+',b'R',b'E',b'A',b'D',b'Y'] # if RESET received, state_table = READY_table
-    UID_TABLE   = [b'+',b'U',b'I',b'D',b'=']
-    VER_TABLE   = [b'+',b'V',b'E',b'R',b'=']
- 
-    # state machine initial state 
-
-    state = 0   # index into the current state table
-    state_table = RCV_TABLE # start state for the "machine"
-
-    # initial receive buffer state
 
-    rx_buf = ''  # string response
-    rx_len = 0
+    # Coroutines that draw outside the xcvr() loop set the dirty bit and
+    # wake the loop up, so that the display writes the changes out
+    dirty = False
+    wakeup: asyncio.Event = None
 
     # initial transmit buffer state
 
     tx_buf = ''     # tx buffer
     tx_len = 0      # tx buffer length
-
-    # reset the receive buffer state
-    # NOTE: the receive buffer state is part of the RYLR998 object
-    # but the curses receive window state is maintained in the xcvr() function
-
-    # the state table can be overriden. This is used in the transition
-    # from the RESET_table state to the READY_table state.
-    def rx_buf_reset(self, state_table = RCV_TABLE) -> None:
-        self.rx_buf = ''
-        self.rx_len = 0
-        self.state = 0
-        self.state_table = state_table # default since RCV takes priority
+    tx_pos = 0      # cursor position in the tx buffer
+    tx_off = 0      # first tx buffer character shown in the txwin
 
     # reset the transmit buffer state
     # NOTE: the transmit buffer state is part of the RYRL998 object
@@ -145,45 +149,368 @@ class RYLR998:
     def tx_buf_reset(self) -> None:
         self.tx_buf = '' # clear tx buffer
         self.tx_len = 0  # tx_len is zero
+        self.tx_pos = 0
+        self.tx_off = 0
+
+    # The tx buffer may be longer than the txwin is wide: the window
+    # scrolls sideways to keep the cursor in view. Returns the cursor column.
+
+    def tx_show(self, dsply: Display) -> int:
+        if self.tx_pos < self.tx_off:
+            self.tx_off = self.tx_pos
+        elif self.tx_pos - self.tx_off > TX_LINE - 1:
+            self.tx_off = self.tx_pos - (TX_LINE - 1)
+        dsply.txwin.erase()
+        # insnstr() does not wrap or move the cursor, even in the last column
+        dsply.txwin.insnstr(0, 0, self.tx_buf[self.tx_off:self.tx_off + TX_LINE], TX_LINE)
+        tx_col = self.tx_pos - self.tx_off
+        dsply.txwin.move(0, tx_col)
+        dsply.txwin.noutrefresh()
+        return tx_col
+
+    # Each line in the receive window says which radio it is about when
+    # there is more than one. Use insnstr() for a full line, so that the
+    # window does not scroll twice.
+
+    def say(self, dsply: Display, radio: Radio, msg: str, fg_bg: int = Display.BLUE_BLACK) -> None:
+        if len(self.radios) > 1:
+            msg = f"{radio.number}:{msg}"
+        self.scrollback.append(msg, fg_bg)
+        if not self.scrollback.following:
+            self.show_position(dsply) # the view stays on the rows it shows
+            return
+        if len(msg) == TX_LINE:
+            dsply.rxinsnstr(msg, len(msg), fg_bg=fg_bg)
+        else:
+            dsply.rxaddnstr(msg, len(msg), fg_bg=fg_bg)
+
+    # With --log, the last messages sent and received come back at startup
+
+    def show_history(self, dsply: Display) -> None:
+        for message in self.store.last(HISTORY):
+            text = f"{message.radio}:{message.text}" if len(self.radios) > 1 else message.text
+            self.scrollback.append(text, dsply.YELLOW_BLACK if message.sent else dsply.BLACK_PINK)
+        self.show_page(dsply)
+
+    # The receive window shows a page of the scrollback when scrolled
+    # back or searching, and the top border where it is
+
+    def show_page(self, dsply: Display) -> None:
+        sb = self.scrollback
+        highlight = None if self.match is None else self.match - sb.first
+        dsply.show_page(sb.page(), highlight)
+        self.show_position(dsply)
+
+    def show_position(self, dsply: Display) -> None:
+        sb = self.scrollback
+        if sb.following and self.query is None:
+            dsply.show_scroll('')
+        else:
+            dsply.show_scroll(f" {sb.appended - sb.offset - sb.oldest}/{len(sb)} ")
+
+    # CTRL-R starts a search, and again finds the match before; the
+    # keys typed meanwhile make the query. ENTER stays where the search
+    # led, ESC goes back to the newest rows. Returns the cursor column.
+
+    def search_key(self, dsply: Display, ch: int) -> int:
+        sb = self.scrollback
+        if ch == cur.ascii.DC2:
+            if self.query is None:
+                self.query, self.match, self.failed = '', None, False
+            elif self.query and self.match is not None:
+                found = sb.search(self.query, before=self.match)
+                self.failed = found is None
+                self.match = self.match if found is None else found
+        elif ch in (cur.ascii.ESC, cur.ascii.LF):
+            self.query = self.match = None
+            if ch == cur.ascii.ESC:
+                sb.bottom()
+            self.show_page(dsply)
+            return self.tx_show(dsply)
+        elif ch == cur.ascii.BS:
+            self.query = self.query[:-1]
+            self.match = sb.search(self.query) if self.query else None
+            self.failed = bool(self.query) and self.match is None
+        elif cur.ascii.isprint(ch):
+            self.query += chr(ch)
+            # the match so far, if the longer query still matches it
+            found = sb.search(self.query, before=None if self.match is None else self.match + 1)
+            self.failed = found is None
+            self.match = self.match if found is None else found
+        if self.match is not None:
+            sb.show(self.match)
+        self.show_page(dsply)
+        prompt = f"{'failed ' if self.failed else ''}search: {self.query}"[-(TX_LINE - 1):]
+        dsply.txwin.erase()
+        dsply.txwin.addnstr(0, 0, prompt, TX_LINE - 1, cur.color_pair(dsply.YELLOW_BLACK))
+        dsply.txwin.noutrefresh()
+        return len(prompt)
+
+    # The status window shows the settings of the radio that typed
+    # messages go to; TAB picks the next one.
+
+    def show_settings(self, dsply: Display) -> None:
+        radio = self.radio
+        dsply.stwin.addnstr(dsply.VFO_ROW, dsply.VFO_COL+4, radio.band,
+                      len(radio.band), cur.color_pair(dsply.WHITE_BLACK))
+        if radio.pwr:
+            dsply.stwin.addnstr(dsply.PWR_ROW, dsply.PWR_COL+4, f"{radio.pwr:<2}",
+                          2, cur.color_pair(dsply.WHITE_BLACK))
+        dsply.stwin.addnstr(dsply.NETID_ROW, 37, f"{radio.netid:<2}",
+                      2, cur.color_pair(dsply.WHITE_BLACK))
+        dsply.stwin.noutrefresh()
+
+    def select(self, dsply: Display) -> None:
+        self.radio = self.radios[(self.radios.index(self.radio) + 1) % len(self.radios)]
+        self.say(dsply, self.radio, f"to {self.radio.port}", fg_bg=dsply.YELLOW_BLACK)
+        self.show_settings(dsply)
+
+    # Response handlers. The parameter handlers take the display, the
+    # radio that answered and the value of a ParamReport: the text after
+    # the '=' sign. The others take the display, the radio and the event
+    # from the parser. The radio has already taken note of the settings
+    # the module reports.
+
+    def on_address(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"addr: {value}")
+
+    def on_band(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"frequency: {value} Hz")
+        if radio is self.radio:
+            self.show_settings(dsply)
+
+    def on_crfop(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"power output: {value} dBm")
+        if radio is self.radio:
+            self.show_settings(dsply)
+
+    def on_err(self, dsply: Display, radio: Radio, event: Err) -> None:
+        if len(self.radios) > 1:
+            self.say(dsply, radio, radio.port)
+        dsply.xlateError(str(event.code))
+
+    def on_factory(self, dsply: Display, radio: Radio, event: Factory) -> None:
+        self.say(dsply, radio, "Factory defaults")
+
+    def on_ipr(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"uart: {value} baud")
+
+    def on_mode(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"mode: {value}")
+
+    def on_networkid(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"NETWORK ID: {value}")
+        if radio is self.radio:
+            self.show_settings(dsply)
+
+    def on_ok(self, dsply: Display, radio: Radio, event: Ok) -> None:
+        if radio.tx_flag:
+            # turn the transmit indicator off
+            dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
+                          cur.color_pair(dsply.WHITE_BLACK))
+            dsply.stwin.noutrefresh() # yes, that was it
+            radio.tx_flag = False
+        else:
+            self.say(dsply, radio, "+OK")
+
+    def on_parameter(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"spreading factor: {radio.spreading_factor}")
+        self.say(dsply, radio, f"bandwidth: {radio.bandwidth}")
+        self.say(dsply, radio, f"coding rate: {radio.coding_rate}")
+        self.say(dsply, radio, f"preamble: {radio.preamble}")
+
+        # how long a full line and a full payload occupy the channel
+        try:
+            line, full = (parameter_airtime(value, n) for n in (TX_LINE, MAX_PAYLOAD))
+        except ValueError as e:
+            logging.info(str(e))
+            return
+        label = f" airtime {TX_LINE}B {format_airtime(line)}  {MAX_PAYLOAD}B {format_airtime(full)} "
+        self.say(dsply, radio, label.strip())
+        if radio is self.radio:
+            dsply.show_airtime(label)
+
+    def on_rcv(self, dsply: Display, radio: Radio, event: RcvFrame) -> None:
+        # ACKs and duplicates show nothing, nor does a fragment until its
+        # message is complete; a batch holds several messages, each shown
+        # on its own line. Reliable frames are always acknowledged.
+        received = radio.receive(event)
+        msgs = [str(data, 'utf8', errors='replace') for data in received.messages]
+        addr, rssi, snr = str(event.addr), str(event.rssi), str(event.snr)
+
+        for msg in msgs:
+            self.say(dsply, radio, msg, fg_bg=dsply.BLACK_PINK)
+            if self.store is not None:
+                self.store.append(Message(time.time(), False, radio.number, received.origin,
+                                          msg, event.rssi, event.snr))
+
+        dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
+                      cur.color_pair(dsply.WHITE_BLACK))
+
+        # add the ADDRESS, RSSI and SNR to the status window
+        dsply.stwin.addstr(0, 13, addr, cur.color_pair(dsply.BLUE_BLACK))
+        dsply.stwin.addstr(0, 26, rssi, cur.color_pair(dsply.BLUE_BLACK))
+        dsply.stwin.addstr(0, 36, snr, cur.color_pair(dsply.BLUE_BLACK))
+        dsply.stwin.noutrefresh()
+        # and how that compares with what we have been hearing from there
+        dsply.show_link(format_link(radio.links.summary(event.addr)))
+        # if echoing the received message, delay 0.25 sec
+        frame = radio.repeats(received) if self.echo else None
+        if frame is not None:
+            self.spawn(self.repeat(dsply, radio, frame, delay=dsply.FOURTHSEC))
+
+    def on_ready(self, dsply: Display, radio: Radio, event: Ready) -> None:
+        self.say(dsply, radio, "Ready") # the second of the two AT+RESET responses
+
+    def on_reset(self, dsply: Display, radio: Radio, event: Reset) -> None:
+        self.say(dsply, radio, "Reset") # +READY follows
+
+    def on_uid(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"UID: {value}")
+
+    def on_ver(self, dsply: Display, radio: Radio, value: str) -> None:
+        self.say(dsply, radio, f"VER: {value}")
+
+    def on_param_report(self, dsply: Display, radio: Radio, event: ParamReport) -> None:
+        handler = self.PARAM_HANDLERS.get(event.name)
+        if handler is not None:
+            handler(self, dsply, radio, event.value)
+
+    # The response dispatchers, built once when the class is defined.
+    # The parser classifies each line; the event type (and for replies
+    # to queries, the parameter name) picks the handler with a single
+    # dictionary lookup. To handle a new response, add an event to
+    # src/core/protocol.py, write a handler and register it here.
+
+    PARAM_HANDLERS = {
+        'ADDRESS':   on_address,
+        'BAND':      on_band,
+        'CRFOP':     on_crfop,
+        'IPR':       on_ipr,
+        'MODE':      on_mode,
+        'NETWORKID': on_networkid,
+        'PARAMETER': on_parameter,
+        'UID':       on_uid,
+        'VER':       on_ver,
+    }
+
+    EVENT_HANDLERS = {
+        Ok:          on_ok,
+        Err:         on_err,
+        ParamReport: on_param_report,
+        RcvFrame:    on_rcv, # not a reply to an AT command
+        Factory:     on_factory, # reset to factory defaults
+        Reset:       on_reset,
+        Ready:       on_ready,
+    }
+
+    def dispatch(self, dsply: Display, radio: Radio, event) -> None:
+        self.EVENT_HANDLERS[type(event)](self, dsply, radio, event)
+
+    # Coroutines that talk to the module through the command engine.
+    # They run as tasks beside the xcvr() loop, which reads the replies.
+
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task) # keep a reference until it is done
+        task.add_done_callback(self.reap)
+        return task
+
+    def reap(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"{task.get_coro().__name__}: {task.exception()!r}")
+
+    def redraw(self) -> None:
+        self.dirty = True
+        if self.wakeup:
+            self.wakeup.set()
+
+    async def command(self, dsply: Display, radio: Radio, cmd: Command) -> Optional[Event]:
+        # The handlers display the reply. Only a silent module is news here.
+        try:
+            return await radio.engine.send(cmd)
+        except CommandTimeout:
+            name = (cmd if isinstance(cmd, str) else str(cmd, 'utf8', errors='replace')).split('=')[0]
+            self.say(dsply, radio, f"No reply to AT+{name}", fg_bg=dsply.RED_BLACK)
+            self.redraw()
+            return None
+
+    async def configure(self, dsply: Display, radio: Radio) -> None:
+        # The engine writes each command once the previous one is answered
+
+        # NOTE: AT+RCV is NOT a valid command.
+        # The RYLR998 module emits "+RCV=w,x,y,z" when it receives a packet
+        # To test the +ERR= logic, add 'RCV' to the commands below.
+        # This generates the response b'+ERR=4\r\n'.
+
+        if self.factory:
+            await self.command(dsply, radio, 'FACTORY')
+            await asyncio.sleep(dsply.FOURTHSEC)
+
+        for cmd in radio.commands():
+            await self.command(dsply, radio, cmd)
+
+    async def transmit(self, dsply: Display, radio: Radio, addr: str, msg: str, delay: float = 0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
 
-    # state machine functions
-
-    def in_rcv(self): # I would rather short-circuit inline
-        return self.state == 2 and self.state_table == self.RCV_TABLE
-  
-    # character differs from RCV_table at position 1 
-    # -- change the state table or start over
-    def change_state_table(self, data):
-        self.state += 1 # advance the state index
-        match data:
-            case b'A':
-                self.state_table = self.ADDR_TABLE
-            case b'B':
-                self.state_table = self.BAND_TABLE
-            case b'C':
-                self.state_table = self.CRFOP_TABLE
-            case b'E':
-                self.state_table = self.ERR_TABLE
-            case b'F': # factory
-                self.state_table = self.FACT_TABLE
-            case b'I':
-                self.state_table = self.IPR_TABLE
-            case b'M':
-                self.state_table = self.MODE_TABLE
-            case b'N':
-                self.state_table = self.NETID_TABLE # like a net group
-            case b'O':
-                self.state_table = self.OK_TABLE 
-            case b'P':
-                self.state_table = self.PARAM_TABLE
-            case b'R':
-                self.state_table = self.RCV_TABLE  # impossibe! 
-            case b'U':
-                self.state_table = self.UID_TABLE
-            case b'V':
-                self.state_table = self.VER_TABLE
-            case _:
-                self.rx_buf_reset() # beats me start over
+        # compressed if --compress and it saves airtime; a message longer
+        # than one payload goes out in fragments
+        data = bytes(msg, 'utf8') # the length is in bytes, not characters
+        try:
+            payloads = radio.split(data, self.compress)
+        except ValueError as e:
+            self.say(dsply, radio, str(e), fg_bg=dsply.RED_BLACK)
+            self.redraw()
+            return
+
+        self.say(dsply, radio, msg, fg_bg=dsply.YELLOW_BLACK)
+        if self.store is not None:
+            self.store.append(Message(time.time(), True, radio.number, int(addr), msg))
+
+        # flash the LoRa® indicator on transmit; on_ok() turns it off
+        dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
+                  cur.color_pair(dsply.WHITE_RED))
+        dsply.stwin.noutrefresh()
+        radio.tx_flag = True # transmitting 
+        self.redraw()
+
+        outcome = await radio.send(int(addr), payloads, self.reliable)
+        if outcome is Outcome.HELD:
+            self.say(dsply, radio, f"No route to {addr} yet: held", fg_bg=dsply.RED_BLACK)
+        elif outcome is Outcome.LOST:
+            self.say(dsply, radio, f"Not delivered to {addr}", fg_bg=dsply.RED_BLACK)
+        elif outcome is Outcome.QUEUE_FULL:
+            self.say(dsply, radio, "TX queue full: not sent", fg_bg=dsply.RED_BLACK)
+        elif outcome is Outcome.NO_REPLY:
+            self.say(dsply, radio, "No reply to AT+SEND", fg_bg=dsply.RED_BLACK)
+        elif outcome is Outcome.REJECTED:
+            self.say(dsply, radio, f"AT+SEND rejected: +ERR={radio.rejected}", fg_bg=dsply.RED_BLACK)
+        if outcome in (Outcome.HELD, Outcome.QUEUE_FULL, Outcome.NO_REPLY, Outcome.REJECTED):
+            self.on_ok(dsply, radio, Ok()) # no +OK is coming: turn the indicator off
+        if outcome in (Outcome.DELIVERED, Outcome.LOST):
+            dsply.show_link(format_stats(int(addr), radio.link.stats(int(addr))))
+        self.redraw()
+
+        if self.debug:
+            m = radio.scheduler.metrics
+            logging.info(f"{radio.port} TX queue depth {radio.scheduler.depth}, waited {m.wait_last:.3f}s "
+                         f"(mean {m.wait_mean:.3f}s, max {m.wait_max:.3f}s)")
+
+    # Echo mode makes a digipeater; the radio says which payloads are
+    # repeated, and how.
+    async def repeat(self, dsply: Display, radio: Radio, frame: bytes, delay: float = 0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN,
+                  cur.color_pair(dsply.WHITE_RED))
+        dsply.stwin.noutrefresh()
+        radio.tx_flag = True # transmitting
+        self.redraw()
+        if not await radio.repeat(frame):
+            self.on_ok(dsply, radio, Ok()) # no +OK is coming: turn the indicator off
+            self.redraw()
 
     def gpio_setup(self) -> None:
         if self.exist_gpio:
@@ -195,11 +522,11 @@ class RYLR998:
                 #subprocess.run(["raspi-gpio", "get", '4,14,15'])
 
     def __del__(self):
-        try:
-            if self.serial:
-                self.serial.close()
-        except Exception as e:
-            logging.error(str(e))
+        for radio in self.radios:
+            try:
+                radio.serial.close()
+            except Exception as e:
+                logging.error(str(e))
 
         if self.exist_gpio:
             GPIO.cleanup()  # clean up the GPIO
@@ -207,10 +534,27 @@ class RYLR998:
 
     def __init__(self, args):
 
-        self.port = args.port     # the RYLR998 cares about this
+        self.ports = args.port    # one RYLR998 on each
         self.baudrate = args.baud # and this (type string!)
         self.debug = args.debug
         self.factory = args.factory
+        self.echo = args.echo
+        self.hops = args.hops
+        self.duty = args.duty # percent of the time the radio may transmit
+        self.compress = args.compress
+        self.coalesce = args.coalesce
+        self.reliable = args.reliable
+        self.mesh = args.mesh
+        self.dest = args.dest
+        self.metrics = args.metrics # (host, port), or None
+        self.trace_path = args.trace
+        self.trace = Tracer() if args.trace else None
+        # one band for all the modules, or one each
+        if len(args.band) not in (1, len(self.ports)):
+            logging.error('Give --band once, or once for each --port.')
+            raise argparse.ArgumentTypeError('Give --band once, or once for each --port.')
+        bands = args.band * len(self.ports) if len(args.band) == 1 else args.band
+        self.band = bands[0]
 
         # note: self.addr is a str, args.addr is an int
         self.addr = str(args.addr) # set the default
@@ -240,11 +584,52 @@ class RYLR998:
 
         self.gpio_setup()
 
+        self.tasks = set()
+        self.scrollback = Scrollback()
+
+        # each module has its own port, parser, command engine and
+        # queues; they share the settings but for the band
+        self.radios = []
+        for number, (port, band) in enumerate(zip(self.ports, bands), 1):
+            try:
+                self.radios.append(Radio(port, self.baudrate, self.addr, band, self.netid,
+                    f"{self.spreading_factor},{self.bandwidth},{self.coding_rate},{self.preamble}",
+                    pwr=self.pwr, mode=self.mode,
+                    duty_cycle=float(self.duty) / 100,
+                    coalesce=self.coalesce, mesh=self.mesh, hops=self.hops, echo=self.echo,
+                    number=number, debug=self.debug))
+            except Exception as e:
+                logging.error(str(e))
+                exit(1)
+        self.radio = self.radios[0] # typed messages go here
+        for radio in self.radios:
+            radio.trace = self.trace
+
+        if args.log:
+            try:
+                self.store = MessageStore(args.log)
+            except OSError as e:
+                logging.error(str(e))
+                exit(1)
+
+    async def export(self, dsply: Display) -> None:
+        """Serve the radios' metrics over HTTP, beside the xcvr() loop"""
+        registry = Registry()
+        for radio in self.radios:
+            radio.register(registry)
+        host, port = self.metrics
         try:
-            self.serial = SerialManager(self.port, self.baudrate)
-        except Exception as e:
-            logging.error(str(e))
-            exit(1)
+            self.exporter = await serve(registry, host, port)
+        except OSError as e:
+            self.say(dsply, self.radio, f"metrics: {e.strerror}", fg_bg=dsply.RED_BLACK)
+            return
+        self.spawn(watch_loop(registry))
+
+    def dump_trace(self) -> None:
+        try:
+            self.trace.dump(self.trace_path)
+        except OSError as e:
+            logging.error(f"{self.trace_path}: {e.strerror}")
 
     # Transceiver function
     #
@@ -256,19 +641,8 @@ class RYLR998:
 
     async def xcvr(self, scr : _curses.window) -> None:
 
-        # ATcmd() is only called within the transceiver loop (OUTER LOOP), 
-        # so it is an inner function. The OUTER LOOP parses the response 
-        # to AT commands from the RYLR998 in two phases, incidentally.
-
-        async def at_cmd(cmd: str = '') -> int:
-            command = f"AT{'+' if len(cmd) > 0 else ''}{cmd}\r\n"
-            count: int = await self.serial.write(bytes(command, 'utf8'))
-            return count
-        
         dsply  = Display(scr) 
  
-        # The LoRa® status indicator turns beet RED if the following is True
-        tx_flag = False # True if and only if transmitting
         # txwin cursor coordinates
         tx_row = 0   # txwin_y
         tx_col = 0   # txwin_x
@@ -279,296 +653,144 @@ class RYLR998:
  
         # show the rectangles etc
         scr.noutrefresh()
+        if self.store is not None:
+            self.show_history(dsply)
      
         # Brace yourself: we are approaching the xcvr() loop 
 
-        # NOTE: AT+RCV is NOT a valid command.
-        # The RYLR998 module emits "+RCV=w,x,y,z" when it receives a packet
-        # To test the +ERR= logic, uncomment the following
-        # count : int  = await at_cmd('RCV')
-        # This generates the response b'+ERR=4\r\n'. Else, leave commented.
-
-        # this next causes trouble  debug
-        # count : int  = await at_cmd('RESET')
-        # Add English interpretations of the ERR conditions
-
-        # sorry, these commands have to be enqueued and dequeued
-        # one at a time within the transceiver loop
-
-        queue = asyncio.Queue()  # no limit
-
-
-        if self.factory:
-            await queue.put('FACTORY')
-            await queue.put(f"DELAY,{str(dsply.FOURTHSEC)}")
-
-        await queue.put(f"IPR={self.baudrate}") #  chicken and egg
-        await queue.put(f"ADDRESS={self.addr}")  
-        await queue.put(f"NETWORKID={self.netid}") # this is a str
-        await queue.put(f"BAND={args.band}")
-
-        if self.pwr:   
-            await queue.put(f"CRFOP={self.pwr}") # the next is needed to receive again!
-        await queue.put(f"PARAMETER={self.spreading_factor},{self.bandwidth},{self.coding_rate},{self.preamble}")
-
-        await queue.put('ADDRESS?')
-        await queue.put('BAND?')
-        await queue.put('CRFOP?')
-        await queue.put(f"MODE={self.mode}")
-        await queue.put('PARAMETER?') 
-        await queue.put('UID?')
-        await queue.put('VER?')
-        await queue.put('NETWORKID?')
-
+        # configure the modules and query their settings while the loop
+        # below reads the replies. Each has its own engine, so they are
+        # configured side by side.
+        for radio in self.radios:
+            self.spawn(self.configure(dsply, radio))
+            radio.start() # HELLOs, so that routes spread
+        self.show_settings(dsply)
+        if self.metrics is not None:
+            await self.export(dsply)
 
         # You are about to participate in a great adventure.
         # You are about to experience the awe and mystery that
         # reaches from the inner functions to THE OUTER LOOP
 
-        dirty = True  # transmit and RCV will set this
-
-        # a state variable is enough to synchronize AT commands
-        wait_for_reply =  False 
+        self.dirty = True  # transmit and RCV will set this
+
+        # Rather than spin on has_data() and getch(), sleep until a
+        # serial port or the keyboard has something for us. The readiness
+        # callbacks only set the wakeup flag; the loop does the work.
+        # Fall back to polling if the event loop cannot watch file
+        # descriptors (the Windows proactor loop cannot).
+        loop = asyncio.get_running_loop()
+        self.wakeup = wakeup = asyncio.Event()
+        event_driven = all([radio.add_reader(wakeup.set) for radio in self.radios])
+        if event_driven:
+            try:
+                loop.add_reader(sys.stdin.fileno(), wakeup.set)
+            except (NotImplementedError, OSError) as e:
+                logging.info(f"Cannot watch the keyboard, polling: {str(e)}")
+                event_driven = False
+        if not event_driven:
+            for radio in self.radios:
+                radio.serial.remove_reader()
+        trace = self.trace
+        if trace is not None:
+            try:
+                loop.add_signal_handler(signal.SIGUSR1, self.dump_trace)
+            except (NotImplementedError, AttributeError):
+                pass # no signals here: the trace is written on exit only
 
         # Hold onto your chair and godspeed. 
 
+        typed = False # a key was pressed since the last pass
         while True:
-            # At the beginning of the xcvr loop, 
-            # cur.doupdate() is called and the dirty flag is  reset,
-            # provided the dirty flag is set. This speeds up the display
-
-            if dirty:
-                cur.doupdate() # oh baby
-                dirty = False # reset the dirty bit
-
-            if self.serial.has_data():  # Changed from self.aio.in_waiting
-                # read and act one byte at a time. Be a Markov process.
-                data = await self.serial.read_byte()  # Changed from self.aio.read_async
-                # you could use a debug window -- perhaps
-                if self.debug: # this is buggy
-                    logging.info("read:{} state:{}".format(data, self.state))
-
-                # Phase One: parse the fixed portion of the serial port response
-                if self.state < len(self.state_table):
-                    if self.state_table[self.state] == data:
-                        if self.state == 2 and self.state_table == self.RCV_TABLE:
-                            dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                          cur.color_pair(dsply.WHITE_GREEN))
-                            dsply.stwin.noutrefresh()
-                            # cursor back to tx window to avoid flicker
-                            dsply.txwin.move(tx_row, tx_col)  
-                            dsply.txwin.noutrefresh()
-                            dirty = True
-
-                        self.state += 1 # advance the state index
-                    else:
-                        if self.state == 1:
-                            # advance the state index
-                            # if the state table cannot be changed
-                            # the rx buffer and the state will be reset
-                            self.change_state_table(data)
-                        else:
-                            # in this case, the state is 0 and you are lost
-                            # preamble possibly -- or state > 1 and you are lost
-                            self.rx_buf_reset() 
-
-                    continue  # parsing output takes priority over input
-                else:
-                    # Phase Two: parse the data portion of the response
-                    # the precondition for the second parsing phase obtains:
-                    # self.state == len(self.state_table). 
-
-                    # accumulate data into rx_buf after the '=' sign until '\n'
-                    # The OK does not have an equal sign, so it vanishes.
-
-                    # advance the rx buffer 
-                    self.rx_buf += str(data,'utf8')
-                    self.rx_len += 1 # superior to calling len()
-
-                    # If you made it here, the msg is <= 240 chars
-                    # the hardware ensures this
-
-                    if data == b'\n':
-                        # remove the carriage return, newline from rx_buf
-                        self.rx_buf = self.rx_buf[:-2]
-                        self.rx_len -= 2
-
-                        match self.state_table:
-                            case self.ADDR_TABLE:
-                                dsply.rxaddnstr(f"addr: {self.rx_buf}", self.rx_len+6)
-                                self.addr = self.rx_buf
-                                wait_for_reply = False
-
-                            case self.BAND_TABLE:
-                                dsply.rxaddnstr(f"frequency: {self.rx_buf} Hz", self.rx_len+15) 
-                                self.band = self.rx_buf
-                                dsply.stwin.addnstr(dsply.VFO_ROW, dsply.VFO_COL+4,self.band, 
-                                              self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                dsply.stwin.noutrefresh()
-                                wait_for_reply = False
-
-                            case self.CRFOP_TABLE:
-                                dsply.rxaddnstr(f"power output: {self.rx_buf} dBm", self.rx_len+18)       
-                                self.pwr = self.rx_buf
-                                dsply.stwin.addnstr(dsply.PWR_ROW, dsply.PWR_COL+4,self.pwr, 
-                                              self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                dsply.stwin.noutrefresh()
-                                wait_for_reply = False
-
-                            case self.ERR_TABLE:
-                                dsply.xlateError(self.rx_buf)
-                                wait_for_reply = False
-                                  
-                            case self.FACT_TABLE:
-                                dsply.rxaddnstr("Factory defaults", 16)
-                                wait_for_reply = False
-
-                            case self.IPR_TABLE:
-                                dsply.rxaddnstr(f"uart: {self.rx_buf} baud", self.rx_len+11)
-                                self.baudrate = self.rx_buf
-                                wait_for_reply = False
-
-                            case self.MODE_TABLE:
-                                dsply.rxaddnstr(f"mode: {self.rx_buf}", self.rx_len+6)
-                                self.mode = self.rx_buf
-                                wait_for_reply = False
-        
-
-                            case self.OK_TABLE:
-                                if tx_flag:
-                                    # turn the transmit indicator off
-                                    dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                                  cur.color_pair(dsply.WHITE_BLACK))
-                                    dsply.stwin.noutrefresh() # yes, that was it
-                                    tx_flag = False # will be reset below
-                                else:
-                                    dsply.rxaddnstr("+OK", 3)
-                                wait_for_reply = False
-                                
-                            case self.NETID_TABLE:
-                                dsply.rxaddnstr(f"NETWORK ID: {self.rx_buf}", self.rx_len+12) 
-                                self.netid = self.rx_buf
-                                dsply.stwin.addnstr(dsply.NETID_ROW, 37,self.netid, 
-                                              self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                dsply.stwin.noutrefresh()
-                                wait_for_reply = False
-
-                                
-                            case self.PARAM_TABLE:
-                                self.spreading_factor, self.bandwidth, self.coding_rate, self.preamble = self.rx_buf.split(',', 3)
-                                dsply.rxaddnstr(f"spreading factor: {self.spreading_factor}", len(self.spreading_factor)+18) 
-                                dsply.rxaddnstr(f"bandwidth: {self.bandwidth}", len(self.bandwidth)+11)  
-                                dsply.rxaddnstr(f"coding rate: {self.coding_rate}", len(self.coding_rate)+13)  
-                                dsply.rxaddnstr(f"preamble: {self.preamble}", len(self.preamble)+10)
-                                wait_for_reply = False
-
-                            case self.RCV_TABLE:
-                                # The following five lines are adapted from
-                                # https://github.com/wybiral/micropython-rylr/blob/master/rylr.py
-                                
-                                addr, n, self.rx_buf = self.rx_buf.split(',', 2)
-                                n = int(n)
-                                msg = self.rx_buf[:n]
-                                self.rx_buf = self.rx_buf[n+1:]
-                                rssi, snr = self.rx_buf.split(',')
-
-                                if n == 40:
-                                    # prevent auto scrolling if EOL at the
-                                    # end of the window
-                                    dsply.rxinsnstr(msg, n, fg_bg = dsply.BLACK_PINK)
-                                else:
-                                    # take advantage of auto scroll if n > 40.
-                                    dsply.rxaddnstr(msg, n, fg_bg = dsply.BLACK_PINK) 
-
-                                dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                              cur.color_pair(dsply.WHITE_BLACK))
-
-                                # add the ADDRESS, RSSI and SNR to the status window
-                                dsply.stwin.addstr(0, 13, addr, cur.color_pair(dsply.BLUE_BLACK))
-                                dsply.stwin.addstr(0, 26, rssi, cur.color_pair(dsply.BLUE_BLACK))
-                                dsply.stwin.addstr(0, 36, snr, cur.color_pair(dsply.BLUE_BLACK))
-                                dsply.stwin.noutrefresh()
-                                # not waiting for a reply from the module
-                                # so we do not reset the waitForReply flag
-
-                                # if echoing the received message, delay 0.25 sec
-                                if args.echo:
-                                     await queue.put(f"DELAY,{str(dsply.FOURTHSEC)}")
-                                     await queue.put(f"SEND={addr},{str(n)},{msg}")
-
-                            case self.UID_TABLE:
-                                dsply.rxaddnstr(f"UID: {self.rx_buf}", self.rx_len+5) 
-                                self.uid = self.rx_buf
-                                wait_for_reply = False
-
-
-                            case self.VER_TABLE:
-                                dsply.rxaddnstr(f"VER: {self.rx_buf}", self.rx_len+5) 
-                                self.version = self.rx_buf
-                                wait_for_reply = False
-                                
-                            case _:
-                                dsply.rxaddnstr("ERROR. Call Tech Support!",25, fg_bg = dsply.RED_BLACK) 
-                                wait_for_reply = False
-                         
-                        # also return to the txwin
-                        dsply.txwin.move(tx_row, tx_col)
-                        dsply.txwin.noutrefresh()
-
-                        self.rx_buf_reset() # reset the receive buffer state and assume RCV -- this is necessary
-
-                        dirty = True    # instead of doupdate() here, use the dirty bit
-                        # RCV does not reset waitForReply, since there is no AT command 
-                        # for which a response is expected
-
-                    continue # The dirty bit logic will update the screen
-
-                   # else: # not a newline yet. Prioritize receive and responses from the module
-                   #     if self.rx_len > 240: # hardware should prevent this from occurring.
-                   #         self.rxbufReset() # this is an error
-                   #     continue # still accumulating chars from serial port, keep listening
+            # At the beginning of the xcvr loop, the changes marked by
+            # the dirty flag are handed to the display, which writes them
+            # out with cur.doupdate() once per frame interval, or at once
+            # to echo a key. A burst of frames is drawn in one go.
+
+            if self.dirty:
+                dsply.mark(urgent=typed)
+                self.dirty = False # reset the dirty bit
+            typed = False
+            if trace is not None:
+                start = trace.clock()
+            if dsply.flush() and trace is not None: # oh baby
+                trace.lap('render', start)
+                trace.shown()
+
+            heard = [radio for radio in self.radios if radio.has_data()]
+            for radio in heard:
+                # read everything that is waiting in one call and act on
+                # whole responses. No coroutine hop per byte. Replies to
+                # AT commands go to the radio's engine as well.
+                events = radio.read()
+
+                if radio.receiving:
+                    # a message is still arriving: light up the indicator
+                    dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
+                                  cur.color_pair(dsply.WHITE_GREEN))
+                    dsply.stwin.noutrefresh()
+                    # cursor back to tx window to avoid flicker
+                    dsply.txwin.move(tx_row, tx_col)  
+                    dsply.txwin.noutrefresh()
+                    self.dirty = True
+
+                if trace is not None:
+                    start = trace.clock()
+                for event in events:
+                    self.dispatch(dsply, radio, event)
+
+                    # also return to the txwin
+                    dsply.txwin.move(tx_row, tx_col)
+                    dsply.txwin.noutrefresh()
+
+                    self.dirty = True    # instead of doupdate() here, use the dirty bit
+                if trace is not None:
+                    trace.lap('dispatch', start)
+
+            if heard:
+                continue # The dirty bit logic will update the screen
 
             # at long last, you can speak
             ch = dsply.txwin.getch()
             if ch == -1: # cat got your tongue? 
-                # dequeue AT commands only if not waiting for AT response to finish
-                # receive will take priority if you are receiving
-                # use a waitForReply.instead of the txflag, which is for the tx indictor
-                # check if there is a command
-                if not wait_for_reply and  not queue.empty(): 
-                    wait_for_reply = True
-                    cmd = await queue.get()
-                    if cmd.startswith('SEND='):
-                        # parse the command SEND=#,msglen,msg) 
-                        _, _msg_len, msg = cmd.split(',', 2) # the 2 here accounts for commas in msg
-                        msg_len = int(_msg_len) # _msglen is a string
-                        # use insnsstr() here to avoid scrolling if 40 characters (the maximum)
-                        if msg_len == 40:
-                            dsply.rxinsnstr(msg, msg_len, fg_bg = dsply.YELLOW_BLACK)
-                        else:
-                            dsply.rxaddnstr(msg, msg_len, fg_bg = dsply.YELLOW_BLACK)
-
-                        tx_col=0  # local transmit window cursor position
-                        dsply.txwin.move(tx_row, tx_col) # cursor to tx initial input position
-                        dsply.txwin.clear()
-                        dsply.txwin.noutrefresh()
-                        self.tx_buf_reset()
-
-                        # flash the LoRa® indicator on transmit
-                        dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                  cur.color_pair(dsply.WHITE_RED))
-                        dsply.stwin.noutrefresh()
-                        tx_flag = True # transmitting 
-                        dirty = True # really True this time 
-                    elif cmd.startswith('DELAY,'):
-                        _,delay = cmd.split(',',1)
-                        await asyncio.sleep(float(delay))
-                        wait_for_reply = False # not an AT command!
-                        continue # use this to escape
-                    await at_cmd( cmd ) # send command to serial port to rylr998
+                # the command engine and transmit coroutines run while
+                # the loop waits here
+                if event_driven:
+                    # nothing heard, nothing to type: sleep until a byte
+                    # arrives, a key is pressed, a coroutine redraws or
+                    # the changes on the screen are due to be written out.
+                    due = dsply.due()
+                    if due is None:
+                        await wakeup.wait()
+                    else:
+                        try:
+                            await asyncio.wait_for(wakeup.wait(), due)
+                        except asyncio.TimeoutError:
+                            pass
+                    wakeup.clear()
+                else:
+                    await asyncio.sleep(0)
                 continue # remember that RCV and AT cmd responses take priority
 
-            elif ch == cur.ascii.ETX: # CTRL-C
+            typed = True # echo it without waiting for the frame interval
+            if self.query is not None and ch not in (cur.ascii.ETX, cur.KEY_PPAGE, cur.KEY_NPAGE):
+                tx_col = self.search_key(dsply, ch)
+                self.dirty = True
+                continue
+
+            if ch == cur.ascii.ETX: # CTRL-C
+                for radio in self.radios:
+                    radio.close() # and its reader
+                if self.store is not None:
+                    self.store.close()
+                if self.exporter is not None:
+                    self.exporter.close()
+                if trace is not None:
+                    self.dump_trace()
+                for task in list(self.tasks):
+                    task.cancel()
+                if event_driven:
+                    loop.remove_reader(sys.stdin.fileno())
                 cur.noraw()     # go back to cooked mode
                 cur.resetty()   # restore the terminal
                 print("\n")
@@ -584,73 +806,86 @@ class RYLR998:
                 self.tx_buf_reset()
                 dsply.txwin.erase()
                 dsply.txwin.noutrefresh() # may not be needed
-
-                dirty = True
+                if self.scrollback.bottom():
+                    self.show_page(dsply) # back to the newest rows
+                    dsply.txwin.move(tx_row, tx_col)
+                    dsply.txwin.noutrefresh()
+
+                self.dirty = True
+
+            elif ch in (cur.KEY_PPAGE, cur.KEY_NPAGE):
+                moved = self.scrollback.page_up() if ch == cur.KEY_PPAGE \
+                    else self.scrollback.page_down()
+                if moved:
+                    self.show_page(dsply)
+                    dsply.txwin.move(tx_row, tx_col)
+                    dsply.txwin.noutrefresh()
+                    self.dirty = True
+
+            elif ch == cur.ascii.DC2: # CTRL-R
+                tx_col = self.search_key(dsply, ch)
+                self.dirty = True
+
+            elif ch == cur.ascii.TAB:
+                if len(self.radios) > 1:
+                    self.select(dsply) # type to the next radio
+                    dsply.txwin.move(tx_row, tx_col)
+                    dsply.txwin.noutrefresh()
+                    self.dirty = True
 
             elif ch == cur.ascii.LF:
                 if self.tx_len > 0:
                     # the SEND_COMMAND includes the address 
                     # Don't be silly: you don't have to send only to your address!!!
                     # you could send to some other address
-                    await queue.put(f"SEND={self.addr},{str(self.tx_len)},{self.tx_buf}")
+                    dest = self.radio.addr if self.dest is None else str(self.dest)
+                    self.spawn(self.transmit(dsply, self.radio, dest, self.tx_buf))
+                    await asyncio.sleep(0) # let it start before the next key
+
+                    tx_col=0  # local transmit window cursor position
+                    dsply.txwin.move(tx_row, tx_col) # cursor to tx initial input position
+                    dsply.txwin.clear()
+                    dsply.txwin.noutrefresh()
+                    self.tx_buf_reset()
+                    self.dirty = True
 
             elif ch == cur.KEY_LEFT:
-                tx_col = max(0, tx_col - 1)
-                dsply.txwin.move(tx_row, tx_col)
-                dsply.txwin.noutrefresh()
-                dirty = True
+                self.tx_pos = max(0, self.tx_pos - 1)
+                tx_col = self.tx_show(dsply)
+                self.dirty = True
 
             elif ch == cur.KEY_RIGHT:
-                tx_col = min(tx_col+1, self.tx_len, 39)
-                dsply.txwin.move(tx_row, tx_col)
-                dsply.txwin.noutrefresh()
-                dirty = True
+                self.tx_pos = min(self.tx_pos + 1, self.tx_len)
+                tx_col = self.tx_show(dsply)
+                self.dirty = True
 
             elif ch == cur.KEY_DC: # Delete
-                if tx_col >= self.tx_len:
+                if self.tx_pos >= self.tx_len:
                     continue
-                # tx_col must be to the left of a character to delete somethin  to the right
-                self.tx_buf = self.tx_buf[0:tx_col] + self.tx_buf[tx_col+1:min(40,self.tx_len)]
-                self.tx_len = max(0,min(40, self.tx_len)-1)
-                dsply.txwin.delch(tx_row,tx_col)
-                if self.tx_len < 40:
-                    dsply.txwin.addnstr(tx_row, 0, self.tx_buf ,self.tx_len)
-                else:
-                    dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)
-                dsply.txwin.move(tx_row,tx_col)
-                dsply.txwin.noutrefresh()
-                dirty = True
+                # the cursor must be to the left of a character to delete something to the right
+                self.tx_buf = self.tx_buf[:self.tx_pos] + self.tx_buf[self.tx_pos+1:]
+                self.tx_len = len(self.tx_buf)
+                tx_col = self.tx_show(dsply)
+                self.dirty = True
 
             elif ch == cur.ascii.BS: # Backspace
-                if tx_col == 0:
+                if self.tx_pos == 0:
                     continue # nothing to delete
-                # tx_col > 0 here: must be to the right of a character to delete something to the left
-                self.tx_buf = self.tx_buf[0:max(0,tx_col-1)]+self.tx_buf[tx_col:self.tx_len]
+                # the cursor must be to the right of a character to delete something to the left
+                self.tx_buf = self.tx_buf[:self.tx_pos-1] + self.tx_buf[self.tx_pos:]
                 self.tx_len = len(self.tx_buf) # Don't take chances with this
-                tx_col -= 1
-                dsply.txwin.clear() # clear the transmit window
-                if self.tx_len < 40:
-                    dsply.txwin.addnstr(tx_row, 0, self.tx_buf, self.tx_len) # display the tx buffer
-                else:
-                    dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)  # display the tx buffer 
-                dsply.txwin.move(tx_row, tx_col) # move the cursor
-                dsply.txwin.noutrefresh()
-                dirty = True
+                self.tx_pos -= 1
+                tx_col = self.tx_show(dsply)
+                self.dirty = True
 
             elif cur.ascii.isascii(ch):
-                if self.tx_len == 40 and tx_col < 40:
+                if self.tx_len == TX_MAX:
                     continue   # don't change!
-                self.tx_buf = self.tx_buf[0:tx_col] + str(chr(ch)) + self.tx_buf[tx_col:min(39,self.tx_len)]
-                self.tx_len = min(40, self.tx_len+1) #  
-                #txwin.insnstr(tx_row, tx_col, str(chr(ch)),1)
-                if self.tx_len < 40:
-                    dsply.txwin.addnstr(tx_row, 0, self.tx_buf ,self.tx_len)
-                else:
-                    dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)
-                tx_col = min(39, tx_col+1)
-                dsply.txwin.move(tx_row, tx_col)
-                dsply.txwin.noutrefresh()
-                dirty = True
+                self.tx_buf = self.tx_buf[:self.tx_pos] + chr(ch) + self.tx_buf[self.tx_pos:]
+                self.tx_len += 1
+                self.tx_pos += 1
+                tx_col = self.tx_show(dsply)
+                self.dirty = True
 
  
 # end of the XCVR loop
@@ -659,8 +894,8 @@ if __name__ == "__main__":
     import re # regular expressions for argument checking
     from src.ui.constants import (RadioDefaults, RadioLimits)
     from src.config.validators import (
-        bandcheck, pwrcheck, modecheck, netidcheck, uartcheck,
-         paramcheck, validate_netid_parameter
+        bandcheck, pwrcheck, modecheck, netidcheck, uartcheck, dutycheck,
+         paramcheck, metricscheck, validate_netid_parameter
     )
 
  
@@ -669,12 +904,15 @@ if __name__ == "__main__":
     args = parse_args()
     
     # Apply all validation functions to the args
-    args.band = bandcheck(args.band)
     if args.pwr is not None:
         args.pwr = pwrcheck(args.pwr)
     args.mode = modecheck(args.mode)  
     args.netid = netidcheck(args.netid)
-    args.port = uartcheck(args.port)
+    args.band = [bandcheck(band) for band in args.band]
+    args.port = [uartcheck(port) for port in args.port]
+    args.duty = dutycheck(args.duty)
+    if args.metrics is not None:
+        args.metrics = metricscheck(args.metrics)
 
      # Parameter validation including netid check
     validate_netid_parameter(args.netid, args.parameter)
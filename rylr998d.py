@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# The RYLR998 radios as a service, with no terminal.
+#
+# Takes the options of rylr998.py, and --socket. Clients send, subscribe
+# to what is heard and ask for status through the socket, one JSON object
+# per line; see src/core/daemon.py for the protocol. For example:
+#
+#   python3 rylr998d.py --port /dev/ttyUSB0 --socket /tmp/rylr998.sock &
+#   echo '{"op": "send", "addr": 0, "text": "hello"}' | nc -UN /tmp/rylr998.sock
+#
+# With --metrics, Prometheus can scrape the radios' counters as well.
+# With --trace, SIGUSR1 and exit write how long reading, parsing and
+# handling take.
+#
+# SIGTERM and CTRL-C stop it.
+
+import asyncio
+import logging
+import signal
+import sys
+
+from src.config.parser import create_parser, parse_args
+from src.config.validators import (
+    bandcheck, pwrcheck, modecheck, netidcheck, uartcheck, dutycheck,
+    paramcheck, metricscheck, validate_netid_parameter
+)
+from src.core.daemon import RadioDaemon
+from src.core.metrics import Registry, serve, watch_loop
+from src.core.radio import Radio
+from src.core.store import MessageStore
+from src.core.trace import Tracer
+
+DEFAULT_SOCKET = '/tmp/rylr998.sock'
+
+
+def radios(args) -> list:
+    if len(args.band) not in (1, len(args.port)):
+        raise SystemExit('Give --band once, or once for each --port.')
+    bands = args.band * len(args.port) if len(args.band) == 1 else args.band
+    # the odd behavior of crfop seems to require this
+    pwr = args.pwr if any(arg.startswith('--pwr') for arg in sys.argv[1:]) else None
+    return [Radio(port, args.baud, str(args.addr), band, str(args.netid), args.parameter,
+                  pwr=pwr, mode=str(args.mode), duty_cycle=float(args.duty) / 100,
+                  coalesce=args.coalesce, mesh=args.mesh, hops=args.hops, echo=args.echo,
+                  number=number, debug=args.debug)
+            for number, (port, band) in enumerate(zip(args.port, bands), 1)]
+
+
+async def main(args) -> None:
+    try:
+        modules = radios(args)
+        store = MessageStore(args.log) if args.log else None
+    except Exception as e:
+        logging.error(str(e))
+        exit(1)
+    daemon = RadioDaemon(modules, args.socket, factory=args.factory,
+                         echo=args.echo, compress=args.compress, reliable=args.reliable,
+                         store=store)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    loop.add_signal_handler(signal.SIGTERM, task.cancel)
+    trace = None
+    if args.trace:
+        trace = Tracer()
+        for radio in modules:
+            radio.trace = trace
+        loop.add_signal_handler(signal.SIGUSR1, lambda: dump(trace, args.trace))
+    exporter = watcher = None
+    if args.metrics is not None:
+        registry = Registry()
+        for radio in modules:
+            radio.register(registry)
+        try:
+            exporter = await serve(registry, *args.metrics)
+        except OSError as e:
+            logging.error(f"metrics: {str(e)}")
+            daemon.close()
+            exit(1)
+        watcher = asyncio.create_task(watch_loop(registry))
+    try:
+        await daemon.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.close()
+            watcher.cancel()
+        if trace is not None:
+            dump(trace, args.trace)
+
+
+def dump(trace: Tracer, path: str) -> None:
+    try:
+        trace.dump(path)
+    except OSError as e:
+        logging.error(f"{path}: {e.strerror}")
+
+
+if __name__ == "__main__":
+    parser = create_parser()
+    parser.add_argument('--socket',
+        required=False,
+        type=str,
+        dest='socket',
+        default=DEFAULT_SOCKET,
+        help=f'Unix domain socket clients connect to. Default: {DEFAULT_SOCKET}')
+    args = parse_args(parser)
+
+    args.band = [bandcheck(band) for band in args.band]
+    if args.pwr is not None:
+        args.pwr = pwrcheck(args.pwr)
+    args.mode = modecheck(args.mode)
+    args.netid = netidcheck(args.netid)
+    args.port = [uartcheck(port) for port in args.port]
+    args.duty = dutycheck(args.duty)
+    if args.metrics is not None:
+        args.metrics = metricscheck(args.metrics)
+    validate_netid_parameter(args.netid, args.parameter)
+    args.parameter = paramcheck(args.parameter)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -2,6 +2,7 @@
 # -*- coding: utf8 -*-
 
 import argparse
+from typing import Optional
 from src.ui.constants import RadioLimits, RadioDefaults, SerialDefaults
 
 def create_parser() -> argparse.ArgumentParser:
@@ -15,6 +16,12 @@ def create_parser() -> argparse.ArgumentParser:
                        help='Factory reset to manufacturer defaults')
     parser.add_argument('--noGPIO', action='store_true',
                        help="Do not use rPI.GPIO module even if available")
+    parser.add_argument('--log', type=str, metavar='PATH', default=None,
+                       help='Keep the messages sent and received in this file, its index in PATH.idx')
+    parser.add_argument('--metrics', type=str, metavar='[HOST:]PORT', default=None,
+                       help='Serve Prometheus metrics at http://HOST:PORT/metrics. HOST defaults to 127.0.0.1')
+    parser.add_argument('--trace', type=str, metavar='PATH', default=None,
+                       help='Time each stage from serial read to screen update; append the histograms to PATH on exit and on SIGUSR1')
 
     # RYLR998 configuration
     rylr998_config = parser.add_argument_group('rylr998 config')
@@ -28,13 +35,23 @@ def create_parser() -> argparse.ArgumentParser:
         default=RadioDefaults.ADDR,
         help=f'Module address ({RadioLimits.MIN_ADDR}..{RadioLimits.MAX_ADDR}). Default is {RadioDefaults.ADDR}')
 
+    rylr998_config.add_argument('--dest',
+        required=False,
+        type=int,
+        choices=range(RadioLimits.MIN_ADDR, RadioLimits.MAX_ADDR + 1),
+        metavar=f'[{RadioLimits.MIN_ADDR}..{RadioLimits.MAX_ADDR}]',
+        dest='dest',
+        default=None,
+        help='Address that typed messages go to, 0 for everyone. Default: the module address')
+
     rylr998_config.add_argument('--band',
         required=False,
         type=str,
+        action='append',
         metavar=f'[{RadioLimits.MIN_FREQ}..{RadioLimits.MAX_FREQ}]',
         dest='band',
-        default=RadioDefaults.FREQ,
-        help=f'Module frequency in Hz. Default: {RadioDefaults.FREQ}')
+        default=None,
+        help=f'Module frequency in Hz, once for all modules or once for each --port, in order. Default: {RadioDefaults.FREQ}')
 
     rylr998_config.add_argument('--pwr',
         required=False,
@@ -88,7 +105,45 @@ def create_parser() -> argparse.ArgumentParser:
 
     rylr998_config.add_argument('--echo',
         action='store_true',
-        help='Retransmit received message')
+        help='Repeat received messages to everyone, each once, like a digipeater')
+
+    rylr998_config.add_argument('--hops',
+        required=False,
+        type=int,
+        choices=range(1, 16),
+        metavar='[1..15]',
+        dest='hops',
+        default=3,
+        help='Times a message may be repeated on its way. Default: 3')
+
+    rylr998_config.add_argument('--compress',
+        action='store_true',
+        help='Compress messages when that saves airtime. Stock modules cannot read them')
+
+    rylr998_config.add_argument('--reliable',
+        action='store_true',
+        help='Have messages to one address acknowledged, resending what is lost. Stock modules cannot read them')
+
+    rylr998_config.add_argument('--mesh',
+        action='store_true',
+        help='Route messages through other --mesh nodes to addresses out of range, and pass theirs on')
+
+    rylr998_config.add_argument('--coalesce',
+        required=False,
+        type=int,
+        choices=range(0, 10001),
+        metavar='[0..10000]',
+        dest='coalesce',
+        default=None,
+        help='Pack short messages queued for the same address into one packet, waiting up to this many ms for company')
+
+    rylr998_config.add_argument('--duty',
+        required=False,
+        type=str,
+        metavar=f'({RadioLimits.MIN_DUTY}..{RadioLimits.MAX_DUTY}]',
+        dest='duty',
+        default=RadioDefaults.DUTY,
+        help=f'Percent of the time the radio may transmit. Default: {RadioDefaults.DUTY}')
 
     # Serial port configuration
     serial_config = parser.add_argument_group('serial port config')
@@ -96,10 +151,11 @@ def create_parser() -> argparse.ArgumentParser:
     serial_config.add_argument('--port',
         required=False,
         type=str,
-        metavar='[/dev/ttyS0../dev/ttyS999|/dev/ttyUSB0../dev/ttyUSB999|COM0..COM999]',
-        default=SerialDefaults.PORT,
+        action='append',
+        metavar='[/dev/ttyS0../dev/ttyS999|/dev/ttyUSB0../dev/ttyUSB999|COM0..COM999|/dev/pts/N]',
+        default=None,
         dest='port',
-        help=f'Serial port device name. Default: {SerialDefaults.PORT}')
+        help=f'Serial port device name. Repeat to drive several modules. Default: {SerialDefaults.PORT}')
 
     baudchoices = '(' + '|'.join(SerialDefaults.VALID_BAUDRATES) + ')'
     
@@ -114,7 +170,13 @@ def create_parser() -> argparse.ArgumentParser:
 
     return parser
 
-def parse_args():
-    """Parse command line arguments"""
-    parser = create_parser()
-    return parser.parse_args()
+def parse_args(parser: Optional[argparse.ArgumentParser] = None):
+    """Parse command line arguments, with create_parser() unless given a parser"""
+    parser = parser or create_parser()
+    args = parser.parse_args()
+    # lists, whether given or not; append would add to a default list
+    if args.port is None:
+        args.port = [SerialDefaults.PORT]
+    if args.band is None:
+        args.band = [RadioDefaults.FREQ]
+    return args
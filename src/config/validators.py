@@ -4,6 +4,7 @@
 import logging
 import argparse
 import re
+from typing import Tuple
 from src.ui.constants import RadioLimits
 
 def bandcheck(n: str) -> str:
@@ -53,7 +54,7 @@ def pwrcheck(n: str) -> str:
 # Pattern compilation at module level
 MODE_PATTERN = re.compile('^(0)|(1)|(2,(\\d{2,5}),(\\d{2,5}))$')
 NETID_PATTERN = re.compile(f'^{"|".join(str(x) for x in range(RadioLimits.MIN_NETID, RadioLimits.MAX_NETID + 1))}|{RadioLimits.ALT_NETID}')
-UART_PATTERN = re.compile('^(/dev/tty(S|USB)|COM)\\d{1,3}')
+UART_PATTERN = re.compile('^((/dev/tty(S|USB)|COM)\\d{1,3}|/dev/pts/\\d{1,4})$')
 
 
 def modecheck(s: str) -> str:
@@ -109,7 +110,44 @@ def uartcheck(s: str) -> str:
     if UART_PATTERN.match(s):
         return s
     
-    error_msg = "Serial Port device name not of the form ^(/dev/tty(S|USB)|COM)\\d{1,3}$"
+    error_msg = "Serial Port device name not of the form ^(/dev/tty(S|USB)|COM)\\d{1,3}$ or /dev/pts/N"
+    logging.error(error_msg)
+    raise argparse.ArgumentTypeError(error_msg)
+
+def dutycheck(s: str) -> str:
+    """
+    Validate the transmit duty cycle.
+    Args:
+        s: String containing a percentage
+    Returns:
+        Original string if valid
+    Raises:
+        ArgumentTypeError if not a number in (0..100]
+    """
+    try:
+        d = float(s)
+        if RadioLimits.MIN_DUTY < d <= RadioLimits.MAX_DUTY:
+            return s
+        error_msg = f"Duty cycle must be in range ({RadioLimits.MIN_DUTY}..{RadioLimits.MAX_DUTY}]"
+    except ValueError:
+        error_msg = "Duty cycle must be a number"
+    logging.error(error_msg)
+    raise argparse.ArgumentTypeError(error_msg)
+
+def metricscheck(s: str) -> Tuple[str, int]:
+    """
+    Validate the address of the metrics endpoint.
+    Args:
+        s: String containing PORT or HOST:PORT
+    Returns:
+        (host, port), the host 127.0.0.1 if not given
+    Raises:
+        ArgumentTypeError if the port is not a number in 1..65535
+    """
+    host, _, port = s.rpartition(':')
+    if port.isdigit() and 0 < int(port) < 65536:
+        return host.strip('[]') or '127.0.0.1', int(port)
+    error_msg = "Metrics address must be PORT or HOST:PORT, the port in 1..65535"
     logging.error(error_msg)
     raise argparse.ArgumentTypeError(error_msg)
 
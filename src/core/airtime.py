@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# LoRa time on air for the RYLR998 PARAMETER settings.
+#
+# The Semtech formula (AN1200.13), with what the module always uses:
+# explicit header, CRC on, and low data rate optimization whenever a
+# symbol lasts longer than 16 ms.
+#
+#   Tsym     = 2^SF / BW
+#   Tpre     = (preamble + 4.25) * Tsym
+#   symbols  = 8 + max(ceil((8PL - 4SF + 28 + 16) / (4(SF - 2DE))) * (CR + 4), 0)
+#   airtime  = Tpre + symbols * Tsym
+#
+# The preamble term does not depend on the payload and the payload term
+# does not depend on the preamble, so both are tabulated separately for
+# every SF, BW, CR, preamble and payload length 0..240 when the module
+# is imported. A lookup is two indexed reads and an add.
+
+from array import array
+from math import ceil
+from typing import Tuple
+
+from src.core.protocol import MAX_PAYLOAD
+from src.ui.constants import RadioLimits
+
+# PARAMETER bandwidth codes, in Hz
+BANDWIDTH_HZ = {7: 125000, 8: 250000, 9: 500000}
+
+LDRO_SYMBOL_TIME = 0.016  # seconds; longer symbols need low data rate optimization
+
+_SF = range(RadioLimits.MIN_SF, RadioLimits.MAX_SF + 1)
+_BW = range(RadioLimits.MIN_BW, RadioLimits.MAX_BW + 1)
+_CR = range(RadioLimits.MIN_CR, RadioLimits.MAX_CR + 1)
+_PREAMBLE = range(RadioLimits.MIN_PREAMBLE, RadioLimits.MAX_PREAMBLE + 1)
+_LENGTH = range(MAX_PAYLOAD + 1)
+
+
+def symbol_time(sf: int, bw: int) -> float:
+    """Seconds per symbol for spreading factor sf and bandwidth code bw"""
+    return (1 << sf) / BANDWIDTH_HZ[bw]
+
+
+def time_on_air(sf: int, bw: int, cr: int, preamble: int, length: int) -> float:
+    """
+    Compute the airtime of one packet from the formula.
+    Args:
+        sf, bw, cr, preamble: The AT+PARAMETER fields; cr 1..4 is 4/5..4/8
+        length: Payload bytes
+    Returns:
+        Seconds from the first preamble symbol to the last payload symbol
+    """
+    tsym = symbol_time(sf, bw)
+    de = 1 if tsym > LDRO_SYMBOL_TIME else 0
+    bits = 8 * length - 4 * sf + 28 + 16  # CRC on, explicit header
+    symbols = 8 + max(ceil(bits / (4 * (sf - 2 * de))) * (cr + 4), 0)
+    return (preamble + 4.25) * tsym + symbols * tsym
+
+
+def _build() -> Tuple[array, array]:
+    payload = array('d', (time_on_air(sf, bw, cr, 0, length) - 4.25 * symbol_time(sf, bw)
+                          for sf in _SF for bw in _BW for cr in _CR for length in _LENGTH))
+    preamble = array('d', ((n + 4.25) * symbol_time(sf, bw)
+                           for sf in _SF for bw in _BW for n in _PREAMBLE))
+    return payload, preamble
+
+
+_PAYLOAD_TIME, _PREAMBLE_TIME = _build()
+
+
+def airtime(sf: int, bw: int, cr: int, preamble: int, length: int) -> float:
+    """
+    Look up the airtime of one packet in the precomputed tables.
+    Args:
+        sf, bw, cr, preamble: The AT+PARAMETER fields
+        length: Payload bytes, 0..240
+    Returns:
+        Seconds on air, as time_on_air() computes it
+    Raises:
+        ValueError if any argument is out of range
+    """
+    if not (sf in _SF and bw in _BW and cr in _CR and preamble in _PREAMBLE and length in _LENGTH):
+        raise ValueError(f"No airtime for PARAMETER={sf},{bw},{cr},{preamble} and {length} bytes")
+    sf_bw = (sf - _SF.start) * len(_BW) + bw - _BW.start
+    return (_PAYLOAD_TIME[(sf_bw * len(_CR) + cr - _CR.start) * len(_LENGTH) + length]
+            + _PREAMBLE_TIME[sf_bw * len(_PREAMBLE) + preamble - _PREAMBLE.start])
+
+
+def parameter_airtime(parameter: str, length: int) -> float:
+    """Airtime for a PARAMETER string such as '9,7,1,12'; see airtime()"""
+    sf, bw, cr, preamble = (int(field) for field in parameter.split(','))
+    return airtime(sf, bw, cr, preamble, length)
+
+
+def format_airtime(seconds: float) -> str:
+    """Milliseconds below a second, seconds above, e.g. '304ms' or '1.21s'"""
+    if seconds < 1.0:
+        return f"{seconds * 1000:.0f}ms"
+    return f"{seconds:.2f}s"
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# AT command engine for the RYLR998.
+#
+# The module answers one command at a time, in order, so the engine
+# keeps a bounded queue of commands and writes the next one as soon as
+# the previous one is answered. Each send() returns the parsed response.
+# Lost replies time out and are retried, as is +ERR=17 (last TX not
+# completed), and round-trip times are recorded, in a histogram as well
+# for the metrics exporter. A SEND is the exception: a lost +OK may mean
+# the packet went out anyway, and sending it again would put it on the
+# air twice, so a SEND is only retried on +ERR=17, which says it did not
+# go; on a timeout the caller decides.
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Union
+
+from src.core.metrics import Histogram
+from src.core.protocol import Event, Err, RcvFrame, Ready
+
+Command = Union[str, bytes]
+
+
+class CommandTimeout(Exception):
+    """Raised when the module does not answer an AT command"""
+    pass
+
+
+def format_command(cmd: Command) -> bytes:
+    """
+    Frame a command for the serial port.
+    Args:
+        cmd: The command without AT+, e.g. 'BAND=915000000', or '' for AT
+    Returns:
+        The bytes to write, e.g. b'AT+BAND=915000000\\r\\n'
+    """
+    if isinstance(cmd, str):
+        cmd = cmd.encode('utf8')
+    return b'AT+' + cmd + b'\r\n' if cmd else b'AT\r\n'
+
+
+@dataclass
+class CommandMetrics:
+    """Counters and round-trip times for the commands sent so far"""
+    sent: int = 0       # commands answered or given up on
+    writes: int = 0     # including retries
+    retries: int = 0
+    timeouts: int = 0   # commands given up on for lack of a reply
+    errors: int = 0     # commands answered with +ERR
+    rtt_last: float = 0.0  # seconds, from write to reply
+    rtt_max: float = 0.0
+    rtt_total: float = 0.0
+    replies: int = 0
+
+    @property
+    def rtt_mean(self) -> float:
+        return self.rtt_total / self.replies if self.replies else 0.0
+
+
+class ATCommandEngine:
+    """Sends AT commands one at a time and matches them to their replies"""
+
+    TIMEOUT = 2.0         # seconds to wait for a reply
+    RETRIES = 2           # further attempts after a timeout or a retryable error
+    RETRY_DELAY = 0.25    # seconds before retrying a retryable error
+    RETRY_ERRORS = frozenset({17})  # Last TX was not completed
+    QUEUE_SIZE = 32       # send() waits when this many commands are queued
+
+    # Queued commands go out lowest priority first, in order within a priority
+    COMMAND = 0           # configuration and queries
+    DATA = 1              # AT+SEND
+
+    def __init__(self, write: Callable[[bytes], Awaitable[int]],
+                 timeout: float = TIMEOUT, retries: int = RETRIES,
+                 queue_size: int = QUEUE_SIZE):
+        """
+        Args:
+            write: Coroutine function that writes bytes to the module
+            timeout: Default seconds to wait for each reply
+            retries: Default number of retries per command
+            queue_size: Commands that may wait for their turn
+        """
+        self._write = write
+        self.timeout = timeout
+        self.retries = retries
+        self.metrics = CommandMetrics()
+        self.latency = Histogram() # round-trip times, seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._worker: Optional[asyncio.Task] = None
+        self._seq = 0  # keeps equal priorities in order
+        self._reply: Optional[asyncio.Future] = None
+        self.current: Optional[Command] = None  # awaiting its reply
+
+    async def send(self, cmd: Command, timeout: Optional[float] = None,
+                   retries: Optional[int] = None, priority: int = COMMAND) -> Event:
+        """
+        Queue a command and wait for the module's answer.
+        Args:
+            cmd: The command without AT+, e.g. 'BAND=915000000'
+            timeout: Seconds to wait for each reply, default self.timeout
+            retries: Further attempts, default self.retries; DATA and
+                SEND commands are only retried on +ERR=17
+            priority: COMMAND or DATA; commands overtake queued data
+        Returns:
+            The reply: Ok, Err, or the ParamReport for a query. An Err is
+            returned, not raised, once the retries are used up.
+        Raises:
+            CommandTimeout if no attempt got a reply
+        """
+        if self._worker is None:
+            self._queue = asyncio.PriorityQueue(self._queue_size)
+            self._worker = asyncio.create_task(self._run())
+        done = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        await self._queue.put((priority, self._seq, cmd,
+                               self.timeout if timeout is None else timeout,
+                               self.retries if retries is None else retries,
+                               done))
+        return await done
+
+    @property
+    def depth(self) -> int:
+        """Commands waiting for their turn"""
+        return self._queue.qsize() if self._queue else 0
+
+    def on_event(self, event: Event) -> bool:
+        """
+        Offer an event from the parser. Returns True if it answered the
+        command in flight. Received packets and +READY are never replies.
+        """
+        if isinstance(event, (RcvFrame, Ready)):
+            return False
+        if self._reply is None or self._reply.done():
+            return False
+        self._reply.set_result(event)
+        return True
+
+    def close(self) -> None:
+        """Stop the worker. Commands still queued are cancelled"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            *_, done = self._queue.get_nowait()
+            done.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            priority, _, cmd, timeout, retries, done = await self._queue.get()
+            if done.cancelled():
+                continue
+            # the caller may have been cancelled while its command was in
+            # flight: its future is done, and the engine carries on
+            try:
+                reply = await self._exchange(cmd, timeout, retries, priority)
+            except asyncio.CancelledError:
+                done.cancel()
+                raise
+            except Exception as e:  # a timeout, or a write failed: fail the caller, not the engine
+                if not isinstance(e, CommandTimeout):
+                    logging.error(f"AT+{cmd!r} failed: {str(e)}")
+                if not done.done():
+                    done.set_exception(e)
+            else:
+                if not done.done():
+                    done.set_result(reply)
+            finally:
+                self.current = None
+                self.metrics.sent += 1
+
+    async def _exchange(self, cmd: Command, timeout: float, retries: int,
+                        priority: int = COMMAND) -> Event:
+        """Write cmd and wait for its reply, retrying as configured"""
+        data = format_command(cmd)
+        # a SEND without its +OK may be on the air already
+        once = priority == self.DATA or data.startswith(b'AT+SEND=')
+        loop = asyncio.get_running_loop()
+        self.current = cmd
+        for attempt in range(retries + 1):
+            if attempt:
+                self.metrics.retries += 1
+            self._reply = loop.create_future()
+            start = time.perf_counter()
+            await self._write(data)
+            self.metrics.writes += 1
+            try:
+                reply = await asyncio.wait_for(self._reply, timeout)
+            except asyncio.TimeoutError:
+                logging.info(f"No reply to AT+{cmd!r}, attempt {attempt + 1}")
+                if once:
+                    break
+                continue
+            finally:
+                self._reply = None
+            self._record_rtt(time.perf_counter() - start)
+            if isinstance(reply, Err):
+                if reply.code in self.RETRY_ERRORS and attempt < retries:
+                    await asyncio.sleep(self.RETRY_DELAY)
+                    continue
+                self.metrics.errors += 1
+            return reply
+        self.metrics.timeouts += 1
+        raise CommandTimeout(f"No reply to AT+{cmd!r}")
+
+    def _record_rtt(self, rtt: float) -> None:
+        m = self.metrics
+        m.replies += 1
+        m.rtt_last = rtt
+        m.rtt_total += rtt
+        m.rtt_max = max(m.rtt_max, rtt)
+        self.latency.observe(rtt)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Compression of message bodies to save airtime.
+#
+# Chat lines are too short for plain zlib to find much to repeat, so
+# deflate is primed with a preset dictionary of the words and phrases
+# that turn up in chat and on the ham bands. A compressed body is
+#
+#   COMPRESSED | raw deflate stream
+#
+# and is sent only if it is shorter than the text. Both ends must use
+# the same dictionary: changing it means a new PayloadType marker.
+
+import logging
+import zlib
+from typing import Optional
+
+from src.core.payload import Buffer, PayloadType, is_plain
+
+# deflate favours the end of the dictionary, so the commonest go last
+DICTIONARY = (
+    b"antenna battery weather temperature frequency repeater simplex "
+    b"meters miles north south east west grid square locator "
+    b"QRP QRO QRT QRV QRX QSB QRM QRN QSY QTH QSL QSO QRZ RST SOTA POTA "
+    b"CQ CQ CQ DE  K  KN  SK  BK  TNX  TU  FB  OM  YL  XYL  HI HI  73 88 "
+    b"5/9 5/7 59 57 599 RSSI SNR dBm rylr998 LoRa packet received sent "
+    b"good morning good afternoon good evening good night "
+    b"how are you? I'm fine, thanks. thank you. please copy? "
+    b"can you hear me? loud and clear. signal report: "
+    b"test test testing 1 2 3 check this is my name is "
+    b"what where when why who with will would should could "
+    b"about from have that this there they them then than "
+    b"the and for you are not but all any can out now "
+    b"yes no ok OK hello Hello hi Hi "
+)
+
+LEVEL = 9
+WBITS = -15  # raw deflate: no zlib header or checksum on the air
+MAX_OUTPUT = 64 * 1024  # a decompressed body may be no larger
+
+
+def encode(data: bytes, compress: bool = True) -> bytes:
+    """
+    Produce the body to send for a message.
+    Args:
+        data: The message
+        compress: Compress if that makes the body shorter
+    Returns:
+        The message as is, or COMPRESSED and its deflate stream. A
+        message that starts with a control byte is always compressed,
+        so no body is ever mistaken for a marked one.
+    """
+    plain = is_plain(data)
+    if not compress and plain:
+        return data
+    c = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, zdict=DICTIONARY)
+    body = bytes((PayloadType.COMPRESSED,)) + c.compress(data) + c.flush()
+    if plain and len(body) >= len(data):
+        return data
+    return body
+
+
+def decode(body: Buffer) -> Optional[bytes]:
+    """
+    Recover a message from a body.
+    Args:
+        body: A plain or COMPRESSED body
+    Returns:
+        The message, or None if the body is neither or will not inflate
+    """
+    if is_plain(body):
+        return bytes(body)
+    if body[0] != PayloadType.COMPRESSED:
+        return None
+    d = zlib.decompressobj(WBITS, zdict=DICTIONARY)
+    try:
+        data = d.decompress(bytes(body[1:]), MAX_OUTPUT)
+    except zlib.error as e:
+        logging.info(f"Cannot decompress a {len(body)} byte body: {str(e)}")
+        return None
+    if d.unconsumed_tail or not d.eof:
+        logging.info(f"Discarding a {len(body)} byte body: truncated or too large")
+        return None
+    return data
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Headless radio service.
+#
+# The daemon runs the radios, their parsers, command engines and queues,
+# with no terminal attached, and serves clients on a Unix domain socket.
+# Clients and daemon exchange JSON objects, one per line. A request has
+# an "op" and, if the client wants to match the reply to it, an "id",
+# which the reply repeats. Every reply has "ok"; a failed request has an
+# "error" saying why.
+#
+#   {"op": "send", "addr": 2, "text": "hello", "radio": 1, "reliable": false}
+#       {"ok": true, "outcome": "sent"}   outcome as in radio.Outcome
+#       addr 0 is everyone; radio and reliable are optional
+#       {"ok": true, "outcome": "rejected", "code": 5}   the module's +ERR code
+#   {"op": "status"}
+#       {"ok": true, "radios": [{"number": 1, "port": ..., "addr": ..., ...}]}
+#   {"op": "history", "count": 20, "before": 1000}
+#       {"ok": true, "total": 1234, "messages": [{"index": 980, "time": ...,
+#        "sent": false, "radio": 1, "addr": 5, "rssi": -80, "snr": 8,
+#        "text": "hi"}, ...]}   with a log only; before defaults to the end
+#   {"op": "links", "radio": 1}
+#       {"ok": true, "links": [{"addr": 5, "samples": 128, "rssi_mean": -88.2,
+#        "rssi_p10": -95, ...}, ...]}   RSSI and SNR over the last packets
+#       from each address heard, as in linkstats.LinkSummary
+#   {"op": "subscribe"} and {"op": "unsubscribe"}
+#       {"ok": true}, then, for each message heard, until unsubscribed:
+#       {"event": "rcv", "radio": 1, "addr": 5, "origin": 5, "rssi": -80,
+#        "snr": 8, "text": "hi"}
+#
+# A send is answered when the message is on the air, delivered or given
+# up on, which may take a while; the client may send other requests
+# meanwhile, and the replies may come out of order. A subscriber that
+# does not keep up with the messages is dropped rather than allowed to
+# hold them in the daemon's memory.
+
+import asyncio
+import json
+import logging
+import os
+import stat
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Set
+
+from src.core.protocol import RcvFrame
+from src.core.radio import Outcome, Radio
+from src.core.store import Message, MessageStore
+
+
+class RadioDaemon:
+    """Runs radios with no terminal and serves JSON line clients"""
+
+    BACKLOG = 1 << 16  # bytes a subscriber may fall behind before it is dropped
+    HISTORY = 100      # messages a history request may ask for at once
+
+    def __init__(self, radios: List[Radio], path: str, factory: bool = False,
+                 echo: bool = False, compress: bool = False, reliable: bool = False,
+                 store: Optional[MessageStore] = None, backlog: int = BACKLOG):
+        """
+        Args:
+            radios: The radios, numbered from 1, not yet configured
+            path: Where to put the socket; a socket already there is replaced,
+                anything else is not
+            factory: Reset the modules to factory defaults first
+            echo: Repeat received messages, like a digipeater
+            compress: Compress messages when that saves airtime
+            reliable: Have messages to one address acknowledged by default
+            store: Where to keep the messages sent and received, if anywhere
+            backlog: Bytes a subscriber may fall behind before it is dropped
+        """
+        self.radios = radios
+        self.path = path
+        self.factory = factory
+        self.echo = echo
+        self.compress = compress
+        self.reliable = reliable
+        self.store = store
+        self.backlog = backlog
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.server = None
+
+    async def start(self) -> None:
+        """Configure the radios and open the socket"""
+        for radio in self.radios:
+            if not radio.add_reader(lambda radio=radio: self.on_readable(radio)):
+                self._spawn(self._poll(radio))
+            self._spawn(self.configure(radio))
+            radio.start()
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path) # left behind by a daemon that died
+        except FileNotFoundError:
+            pass
+        self.server = await asyncio.start_unix_server(self._serve, self.path)
+        logging.info(f"Serving {len(self.radios)} radio(s) on {self.path}")
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        for writer in list(self.subscribers):
+            writer.close()
+        self.subscribers.clear()
+        for task in list(self.tasks):
+            task.cancel()
+        for radio in self.radios:
+            radio.close()
+        if self.store is not None:
+            self.store.close()
+
+    async def configure(self, radio: Radio) -> None:
+        if self.factory:
+            await self._command(radio, 'FACTORY')
+            await asyncio.sleep(0.25)
+        for cmd in radio.commands():
+            await self._command(radio, cmd)
+
+    async def _command(self, radio: Radio, cmd: str) -> None:
+        try:
+            await radio.engine.send(cmd)
+        except Exception as e:
+            logging.error(f"{radio.port} AT+{cmd}: {e!r}")
+
+    # Radios
+
+    def on_readable(self, radio: Radio) -> None:
+        events = radio.read()
+        trace = radio.trace
+        if trace is not None:
+            start = trace.clock()
+        for event in events:
+            if isinstance(event, RcvFrame):
+                self.on_rcv(radio, event)
+        if trace is not None:
+            trace.lap('dispatch', start)
+            trace.shown() # no screen: handled is done
+
+    async def _poll(self, radio: Radio) -> None:
+        # for loops that cannot watch the port
+        while True:
+            if radio.has_data():
+                self.on_readable(radio)
+            await asyncio.sleep(0.01)
+
+    def on_rcv(self, radio: Radio, event: RcvFrame) -> None:
+        received = radio.receive(event)
+        for data in received.messages:
+            text = str(data, 'utf8', errors='replace')
+            if self.store is not None:
+                self.store.append(Message(time.time(), False, radio.number, received.origin,
+                                          text, received.rssi, received.snr))
+            self.publish({'event': 'rcv', 'radio': radio.number, 'addr': received.addr,
+                          'origin': received.origin, 'rssi': received.rssi,
+                          'snr': received.snr, 'text': text})
+        frame = radio.repeats(received) if self.echo else None
+        if frame is not None:
+            self._spawn(radio.repeat(frame))
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        line = self._encode(message)
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > self.backlog:
+                logging.info("Dropping a subscriber that does not keep up")
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    # Clients
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._request(line, writer)
+        except (ConnectionError, ValueError) as e:  # ValueError: a line too long
+            logging.info(f"Client gone: {e!r}")
+        except asyncio.CancelledError:
+            pass # the daemon is stopping
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def _request(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request is a JSON object')
+        except ValueError as e:
+            self._reply(writer, {}, {'ok': False, 'error': f"bad request: {str(e)}"})
+            return
+        op = request.get('op')
+        if op == 'send':
+            self._spawn(self._send(request, writer))
+        elif op == 'status':
+            self._reply(writer, request, {'ok': True, 'radios': [self.status(radio) for radio in self.radios]})
+        elif op == 'links':
+            self._reply(writer, request, self.links(request))
+        elif op == 'history':
+            self._reply(writer, request, self.history(request))
+        elif op == 'subscribe':
+            self.subscribers.add(writer)
+            self._reply(writer, request, {'ok': True})
+        elif op == 'unsubscribe':
+            self.subscribers.discard(writer)
+            self._reply(writer, request, {'ok': True})
+        else:
+            self._reply(writer, request, {'ok': False, 'error': f"unknown op {op!r}"})
+
+    async def _send(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        try:
+            addr, text = request['addr'], request['text']
+            number = request.get('radio', 1)
+            if not isinstance(addr, int) or not 0 <= addr <= 65535:
+                raise ValueError('addr is 0..65535')
+            if not isinstance(text, str):
+                raise ValueError('text is a string')
+            if not isinstance(number, int) or not 1 <= number <= len(self.radios):
+                raise ValueError(f"radio is 1..{len(self.radios)}")
+            radio = self.radios[number - 1]
+            payloads = radio.split(bytes(text, 'utf8'), self.compress)
+        except KeyError as e:
+            self._reply(writer, request, {'ok': False, 'error': f"missing {e.args[0]}"})
+            return
+        except ValueError as e:
+            self._reply(writer, request, {'ok': False, 'error': str(e)})
+            return
+        if self.store is not None:
+            self.store.append(Message(time.time(), True, radio.number, addr, text))
+        outcome = await radio.send(addr, payloads, request.get('reliable', self.reliable))
+        reply = {'ok': True, 'outcome': outcome.value}
+        if outcome is Outcome.REJECTED:
+            reply['code'] = radio.rejected
+        self._reply(writer, request, reply)
+
+    def links(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        number = request.get('radio', 1)
+        if not isinstance(number, int) or not 1 <= number <= len(self.radios):
+            return {'ok': False, 'error': f"radio is 1..{len(self.radios)}"}
+        return {'ok': True, 'links': [asdict(summary)
+                                      for summary in self.radios[number - 1].links.summaries()]}
+
+    def history(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if self.store is None:
+            return {'ok': False, 'error': 'no log: start the daemon with --log'}
+        total = len(self.store)
+        count, before = request.get('count', 20), request.get('before', total)
+        if not isinstance(count, int) or not 0 <= count <= self.HISTORY:
+            return {'ok': False, 'error': f"count is 0..{self.HISTORY}"}
+        if not isinstance(before, int):
+            return {'ok': False, 'error': 'before is a record number'}
+        before = max(0, min(before, total))
+        start = max(0, before - count)
+        messages = [dict(asdict(message), index=n)
+                    for n, message in enumerate(self.store.range(start, before), start)]
+        return {'ok': True, 'total': total, 'messages': messages}
+
+    def status(self, radio: Radio) -> Dict[str, Any]:
+        metrics = radio.scheduler.metrics
+        return {
+            'number': radio.number,
+            'port': radio.port,
+            'addr': radio.addr,
+            'band': radio.band,
+            'netid': radio.netid,
+            'pwr': radio.pwr,
+            'mode': radio.mode,
+            'parameter': radio.parameter,
+            'version': radio.version,
+            'uid': radio.uid,
+            'queued': radio.scheduler.depth,
+            'sent': metrics.sent,
+            'dropped': metrics.dropped,
+            'airtime': round(metrics.airtime, 3),
+            'held': 0 if radio.router is None else radio.router.held,
+        }
+
+    def _reply(self, writer: asyncio.StreamWriter, request: Dict[str, Any],
+               reply: Dict[str, Any]) -> None:
+        if 'id' in request:
+            reply['id'] = request['id']
+        if not writer.is_closing():
+            writer.write(self._encode(reply))
+
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> bytes:
+        return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task) # keep a reference until it is done
+        task.add_done_callback(self._reap)
+        return task
+
+    def _reap(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"{task.get_coro().__name__}: {task.exception()!r}")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Duplicate suppression for repeaters.
+#
+# Two nodes echoing what they hear would pass the same payload back and
+# forth for ever, and a message relayed along two paths would be shown
+# twice. The cache remembers which payloads have been seen from which
+# origin for a while, so that repeats can be dropped. It holds a bounded
+# number of keys, each an address and an 8 byte digest, so it fits in a
+# few tens of kilobytes whatever the traffic.
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+from src.core.payload import Buffer
+
+
+@dataclass
+class DedupMetrics:
+    """Counts of what the cache has seen"""
+    checked: int = 0     # payloads looked up
+    suppressed: int = 0  # payloads seen before
+    evicted: int = 0     # keys pushed out by newer ones before they expired
+
+
+class DuplicateCache:
+    """Time-bounded LRU of (origin, payload digest)"""
+
+    SIZE = 256     # keys held at most
+    TTL = 60.0     # seconds a payload is remembered
+
+    def __init__(self, size: int = SIZE, ttl: float = TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.metrics = DedupMetrics()
+        self._clock = clock
+        self._keys: 'OrderedDict[Tuple[int, bytes], float]' = OrderedDict()  # -> expiry
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def seen(self, origin: int, payload: Buffer) -> bool:
+        """
+        Look a payload up and remember it.
+        Args:
+            origin: The address of the node the payload came from first
+            payload: The payload, without any relay header
+        Returns:
+            True if the same payload from the same origin was seen within ttl
+        """
+        self.metrics.checked += 1
+        key = self._key(origin, payload)
+        self._expire()
+        if key in self._keys:
+            self.metrics.suppressed += 1
+            self._keys.move_to_end(key)
+            self._keys[key] = self._clock() + self.ttl
+            return True
+        self._remember(key)
+        return False
+
+    def add(self, origin: int, payload: Buffer) -> None:
+        """Remember a payload, e.g. one we sent, without counting a lookup"""
+        self._expire()
+        key = self._key(origin, payload)
+        self._keys.pop(key, None)
+        self._remember(key)
+
+    def _key(self, origin: int, payload: Buffer) -> Tuple[int, bytes]:
+        return origin, hashlib.blake2b(payload, digest_size=8).digest()
+
+    def _remember(self, key: Tuple[int, bytes]) -> None:
+        self._keys[key] = self._clock() + self.ttl
+        if len(self._keys) > self.size:
+            self._keys.popitem(last=False)
+            self.metrics.evicted += 1
+
+    def _expire(self) -> None:
+        # keys are in order of expiry, since each is moved to the end when set
+        now = self._clock()
+        while self._keys and next(iter(self._keys.values())) <= now:
+            self._keys.popitem(last=False)
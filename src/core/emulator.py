@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# A software RYLR998 on a pseudo-terminal.
+#
+# The emulator opens a pty, answers the AT commands rylr998.py uses on the
+# master side and leaves the slave path (/dev/pts/N) for SerialManager to
+# open, exactly as it would open /dev/ttyS0. +RCV frames can be injected
+# one at a time or at a fixed rate, and replies can be delayed, so that
+# throughput and latency tests run without radios and without luck.
+#
+# Emulators may share an Air: what one sends, those in range of it with
+# the same NETWORKID receive when the airtime is over, as +RCV with the
+# RSSI and SNR of the link. A module that is transmitting hears nothing.
+#
+# Run a standalone emulator and point rylr998.py at the path it prints:
+#
+#   python -m src.core.emulator [--rate FRAMES_PER_SEC] [--latency SEC]
+
+import asyncio
+import logging
+import os
+import tty
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from src.core.airtime import time_on_air
+from src.core.protocol import MAX_PAYLOAD
+
+TERMINATOR = b'\r\n'
+SEND_PREFIX = b'AT+SEND='
+
+
+@dataclass
+class Settings:
+    """What the module reports for each query, as AT command text"""
+    ADDRESS: str = '0'
+    BAND: str = '915000000'
+    CRFOP: str = '22'
+    IPR: str = '115200'
+    MODE: str = '0'
+    NETWORKID: str = '18'
+    PARAMETER: str = '9,7,1,12'
+    UID: str = '000000000000000000000000'
+    VER: str = 'RYLR998_REYAX_V1.2.2'
+
+
+FACTORY_SETTINGS = Settings()
+
+QUERIES = frozenset(f.name for f in fields(Settings))
+READ_ONLY = frozenset({'UID', 'VER'})
+VALID_IPR = frozenset({'300', '1200', '4800', '9600', '19200', '28800', '38400',
+                       '57600', '115200'})
+VALID_NETID = frozenset({str(n) for n in range(3, 16)} | {'18'})
+
+
+def _in_range(value: str, low: int, high: int) -> bool:
+    return value.isdigit() and low <= int(value) <= high
+
+
+def _check_mode(value: str) -> Optional[int]:
+    fields = value.split(',')
+    if fields[0] in ('0', '1') and len(fields) == 1:
+        return None
+    if fields[0] == '2' and len(fields) == 3:
+        if all(_in_range(f, 30, 60000) for f in fields[1:]):
+            return None
+        return 20  # smart receiving power saving mode times not allowed
+    return 4
+
+
+def _check_parameter(value: str) -> Optional[int]:
+    fields = value.split(',')
+    if len(fields) != 4 or not all(f.isdigit() for f in fields):
+        return 4
+    sf, bw, cr, preamble = (int(f) for f in fields)
+    if not (5 <= sf <= 11 and 7 <= bw <= 9 and 1 <= cr <= 4):
+        return 4
+    if not 4 <= preamble <= 24:
+        return 18  # preamble value is not allowed
+    return None
+
+
+# Each settable parameter maps to a check that returns None when the
+# value is acceptable, or the +ERR code the module answers with.
+CHECKS: Dict[str, Callable[[str], Optional[int]]] = {
+    'ADDRESS': lambda v: None if _in_range(v, 0, 65535) else 4,
+    'BAND': lambda v: None if _in_range(v, 820000000, 960000000) else 4,
+    'CRFOP': lambda v: None if _in_range(v, 0, 22) else 4,
+    'IPR': lambda v: None if v in VALID_IPR else 4,
+    'MODE': _check_mode,
+    'NETWORKID': lambda v: None if v in VALID_NETID else 4,
+    'PARAMETER': _check_parameter,
+}
+
+
+class Air:
+    """The channel shared by emulators, and which of them hear each other"""
+
+    def __init__(self):
+        self.radios: List['RYLR998Emulator'] = []
+        self._links: Dict[Tuple[int, int], Tuple[int, int]] = {}  # ids -> rssi, snr
+
+    def link(self, a: 'RYLR998Emulator', b: 'RYLR998Emulator',
+             rssi: int = -80, snr: int = 8) -> None:
+        """Put two emulators in range of each other"""
+        self._links[id(a), id(b)] = self._links[id(b), id(a)] = (rssi, snr)
+
+    def cut(self, a: 'RYLR998Emulator', b: 'RYLR998Emulator') -> None:
+        """Take two emulators out of range of each other"""
+        self._links.pop((id(a), id(b)), None)
+        self._links.pop((id(b), id(a)), None)
+
+    def transmit(self, sender: 'RYLR998Emulator', addr: int, payload: bytes) -> None:
+        """Deliver a packet to every emulator in range that it is for"""
+        source = int(sender.settings.ADDRESS)
+        for radio in self.radios:
+            quality = self._links.get((id(sender), id(radio)))
+            if quality is None or radio.transmitting \
+                    or radio.settings.BAND != sender.settings.BAND \
+                    or radio.settings.NETWORKID != sender.settings.NETWORKID:
+                continue
+            if addr in (0, int(radio.settings.ADDRESS)):
+                radio.inject_rcv(payload, source, *quality)
+
+
+class RYLR998Emulator:
+    """Answers AT commands on a pty the way an RYLR998 does"""
+
+    def __init__(self, latency: float = 0.0, tx_time: Optional[float] = None,
+                 rate: float = 0.0, payload: bytes = b'HELLO', addr: int = 1,
+                 rssi: int = -42, snr: int = 11, air: Optional[Air] = None,
+                 lose_ok: int = 0, reject: int = 0):
+        """
+        Args:
+            latency: Seconds before each reply
+            tx_time: Seconds a SEND keeps the module busy after its +OK,
+                None for the packet's airtime at the current PARAMETER
+            rate: +RCV frames per second to inject once started, 0 for none
+            payload, addr, rssi, snr: What the injected frames carry
+            air: The channel to send on and receive from, if any
+            lose_ok: SENDs to come that go out without their +OK
+            reject: The +ERR code to answer the next SEND with, 0 for none
+        """
+        self.air = air
+        self.latency = latency
+        self.tx_time = tx_time
+        self.rate = rate
+        self.frame = (payload, addr, rssi, snr)
+        self.settings = replace(FACTORY_SETTINGS)
+        self.commands = 0   # command lines received
+        self.injected = 0   # +RCV frames written
+        self.sent: Deque[Tuple[int, bytes]] = deque(maxlen=1024)  # (addr, payload) per SEND
+        self.transmitting = False
+        self.lose_ok = lose_ok
+        self.reject = reject
+        self._master: Optional[int] = None
+        self._slave: Optional[int] = None
+        self._inbuf = bytearray()
+        self._outbuf = bytearray()
+        self._tasks = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.port: Optional[str] = None
+
+    async def __aenter__(self) -> 'RYLR998Emulator':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> str:
+        """Open the pty and begin answering. Returns the slave path"""
+        self._loop = asyncio.get_running_loop()
+        self._master, self._slave = os.openpty()
+        # no echo and no CR/LF translation; the slave stays open so the
+        # master never sees a hangup when a client closes the port
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._loop.add_reader(self._master, self._on_readable)
+        if self.air is not None:
+            self.air.radios.append(self)
+        if self.rate > 0:
+            self._spawn(self._traffic())
+        logging.info(f'Emulating an RYLR998 on {self.port}')
+        return self.port
+
+    def stop(self) -> None:
+        """Stop answering and close the pty"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self.air is not None and self in self.air.radios:
+            self.air.radios.remove(self)
+        if self._master is not None:
+            self._loop.remove_reader(self._master)
+            if self._outbuf:
+                self._loop.remove_writer(self._master)
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = self._slave = None
+
+    def inject_rcv(self, payload: bytes, addr: Optional[int] = None,
+                   rssi: Optional[int] = None, snr: Optional[int] = None) -> None:
+        """Write a +RCV frame as if payload had arrived over the air"""
+        _, d_addr, d_rssi, d_snr = self.frame
+        self._emit(b'+RCV=%d,%d,%s,%d,%d' % (
+            d_addr if addr is None else addr, len(payload), payload,
+            d_rssi if rssi is None else rssi, d_snr if snr is None else snr))
+        self.injected += 1
+
+    # The command side
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._master, 4096)
+        except (BlockingIOError, OSError):
+            return
+        self._inbuf += data
+        while True:
+            line = self._take_line()
+            if line is None:
+                break
+            self.commands += 1
+            self._spawn(self._answer(line))
+
+    def _take_line(self) -> Optional[bytes]:
+        """Remove and return the next command, or None if incomplete"""
+        buf = self._inbuf
+        if buf.startswith(SEND_PREFIX):
+            # the payload may hold anything, CR LF included: take it by
+            # length. A length too long is answered with +ERR, so the
+            # command ends at the next CR LF, as the module's would
+            header = buf.find(b',', buf.find(b',') + 1)
+            if header > 0:
+                length = buf[buf.find(b',') + 1:header]
+                if length.isdigit() and int(length) <= MAX_PAYLOAD:
+                    end = header + 1 + int(length)
+                    if len(buf) < end + len(TERMINATOR):
+                        return None
+                    if buf.startswith(TERMINATOR, end):
+                        line = bytes(buf[:end])
+                        del buf[:end + len(TERMINATOR)]
+                        return line
+        end = buf.find(TERMINATOR)
+        if end < 0:
+            return None
+        line = bytes(buf[:end])
+        del buf[:end + len(TERMINATOR)]
+        return line
+
+    async def _answer(self, line: bytes) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if line.startswith(SEND_PREFIX):
+            await self._send(line[len(SEND_PREFIX):])
+        else:
+            self._emit(self.respond(line))
+
+    def respond(self, line: bytes) -> bytes:
+        """The reply to every command but SEND, without the CR LF"""
+        if not line.startswith(b'AT'):
+            return b'+ERR=2'
+        if line == b'AT':
+            return b'+OK'
+        if not line.startswith(b'AT+'):
+            return b'+ERR=4'
+        cmd = str(line[3:], 'utf8', errors='replace')
+        if cmd == 'FACTORY':
+            self.settings = replace(FACTORY_SETTINGS, UID=self.settings.UID)
+            return b'+FACTORY'
+        if cmd == 'RESET':
+            self._loop.call_soon(self._emit, b'+READY')
+            return b'+RESET'
+        if cmd.endswith('?'):
+            name = cmd[:-1]
+            if name not in QUERIES:
+                return b'+ERR=4'
+            return b'+%s=%s' % (name.encode(), getattr(self.settings, name).encode())
+        name, eq, value = cmd.partition('=')
+        if not eq or name in READ_ONLY or name not in CHECKS:
+            return b'+ERR=4'
+        code = CHECKS[name](value)
+        if code is not None:
+            return b'+ERR=%d' % code
+        setattr(self.settings, name, value)
+        return b'+OK'
+
+    async def _send(self, args: bytes) -> None:
+        fields = args.split(b',', 2)
+        if len(fields) != 3 or not fields[0].isdigit() or not fields[1].isdigit():
+            self._emit(b'+ERR=4')
+            return
+        addr, length, payload = int(fields[0]), int(fields[1]), fields[2]
+        if length > MAX_PAYLOAD:
+            self._emit(b'+ERR=13')
+        elif length != len(payload):
+            self._emit(b'+ERR=5')
+        elif self.transmitting:
+            self._emit(b'+ERR=17')  # last TX was not completed
+        elif self.reject:
+            self._emit(b'+ERR=%d' % self.reject)
+            self.reject = 0
+        else:
+            # +OK at once, then the channel is busy for the airtime
+            self.transmitting = True
+            self.sent.append((addr, payload))
+            if self.lose_ok:
+                self.lose_ok -= 1  # on the air, but the reply is lost
+            else:
+                self._emit(b'+OK')
+            try:
+                await asyncio.sleep(self.airtime(length))
+            finally:
+                self.transmitting = False
+            if self.air is not None:
+                self.air.transmit(self, addr, payload)
+
+    def airtime(self, length: int) -> float:
+        """Seconds a SEND of length bytes keeps the module busy"""
+        if self.tx_time is not None:
+            return self.tx_time
+        sf, bw, cr, preamble = (int(f) for f in self.settings.PARAMETER.split(','))
+        return time_on_air(sf, bw, cr, preamble, length)
+
+    # The output side
+
+    async def _traffic(self) -> None:
+        """Inject the configured frame rate times a second, on schedule"""
+        payload = self.frame[0]
+        interval = 1.0 / self.rate
+        deadline = self._loop.time()
+        while True:
+            deadline += interval
+            await asyncio.sleep(max(0.0, deadline - self._loop.time()))
+            self.inject_rcv(payload)
+
+    def _emit(self, response: bytes) -> None:
+        if self._master is None:
+            return
+        pending = bool(self._outbuf)
+        self._outbuf += response + TERMINATOR
+        if not pending:
+            self._flush()
+
+    def _flush(self) -> None:
+        try:
+            written = os.write(self._master, self._outbuf)
+        except BlockingIOError:
+            written = 0
+        del self._outbuf[:written]
+        if self._outbuf:
+            # the client is not keeping up: wait until the pty drains
+            self._loop.add_writer(self._master, self._on_writable)
+
+    def _on_writable(self) -> None:
+        self._loop.remove_writer(self._master)
+        self._flush()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = self._loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+async def _serve(args) -> None:
+    emulator = RYLR998Emulator(latency=args.latency, tx_time=args.tx_time,
+                               rate=args.rate, payload=args.payload.encode('utf8'))
+    async with emulator:
+        print(f"python3 rylr998.py --port {emulator.port}", flush=True)
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='RYLR998 emulator on a pseudo-terminal')
+    parser.add_argument('--rate', type=float, default=0.0, help='+RCV frames per second')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each reply')
+    parser.add_argument('--tx-time', type=float, default=None, dest='tx_time',
+                        help='seconds each SEND takes, default its airtime')
+    parser.add_argument('--payload', default='HELLO', help='text of the injected frames')
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
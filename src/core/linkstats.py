@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Link quality over time.
+#
+# Each +RCV carries the RSSI and SNR of the packet. For each address we
+# hear, the last SIZE values of each go in a ring buffer, an array of
+# 16-bit integers that never grows, beside a histogram of the values in
+# the ring. Both change in O(1) per sample: the new value goes in and
+# the oldest comes out of each. The mean comes from a running sum, the
+# minimum and maximum are kept as values arrive and leave, and the
+# percentiles are read off the histogram, whose size is fixed by the
+# range the module reports (RSSI -164..0 dBm, SNR -20..+20 dB), not by
+# the number of samples.
+#
+# The number of addresses is bounded as well: the one heard least
+# recently makes way for a new one.
+
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+RSSI_RANGE = (-164, 0)   # dBm
+SNR_RANGE = (-20, 20)    # dB
+
+
+class Series:
+    """The last size samples of an integer in [low, high], and their statistics"""
+
+    def __init__(self, size: int, low: int, high: int):
+        self.size = size
+        self.low = low
+        self.high = high
+        self._ring = array('h', bytes(2 * size))
+        self._hist = array('I', bytes(4 * (high - low + 1)))
+        self._next = 0       # where the next sample goes
+        self._count = 0
+        self._sum = 0
+        self._min = high
+        self._max = low
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, value: int) -> None:
+        value = max(self.low, min(self.high, value))
+        if self._count == self.size:
+            self._drop(self._ring[self._next])
+        else:
+            self._count += 1
+        self._ring[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._hist[value - self.low] += 1
+        self._sum += value
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+
+    def _drop(self, value: int) -> None:
+        self._hist[value - self.low] -= 1
+        self._sum -= value
+        if self._count == 1:
+            self._min, self._max = self.high, self.low
+            return
+        # the extremes move inwards only past values no longer held
+        while not self._hist[self._min - self.low]:
+            self._min += 1
+        while not self._hist[self._max - self.low]:
+            self._max -= 1
+
+    @property
+    def last(self) -> Optional[int]:
+        return self._ring[self._next - 1] if self._count else None
+
+    @property
+    def min(self) -> Optional[int]:
+        return self._min if self._count else None
+
+    @property
+    def max(self) -> Optional[int]:
+        return self._max if self._count else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._sum / self._count if self._count else None
+
+    def percentile(self, p: float) -> Optional[int]:
+        """The smallest sample with at least p percent of the samples at or below it"""
+        if not self._count:
+            return None
+        rank = max(1, -(-self._count * p // 100))  # ceiling, at least the first
+        seen = 0
+        for offset in range(self._min - self.low, self._max - self.low + 1):
+            seen += self._hist[offset]
+            if seen >= rank:
+                return offset + self.low
+        return self._max
+
+    def values(self) -> List[int]:
+        """The samples, oldest first"""
+        start = (self._next - self._count) % self.size
+        return [self._ring[(start + n) % self.size] for n in range(self._count)]
+
+
+@dataclass
+class LinkSummary:
+    """How well we hear one address, over its last samples"""
+    addr: int
+    samples: int      # in the window
+    heard: int        # packets since it was first heard
+    age: float        # seconds since it was last heard
+    rssi: int
+    rssi_min: int
+    rssi_max: int
+    rssi_mean: float
+    rssi_p10: int
+    rssi_p50: int
+    rssi_p90: int
+    snr: int
+    snr_min: int
+    snr_max: int
+    snr_mean: float
+    snr_p10: int
+    snr_p50: int
+    snr_p90: int
+
+
+def format_link(summary: LinkSummary) -> str:
+    """e.g. '3: rssi -88 -95..-80 snr 8 5..9', the means and ranges, short
+    enough for a border"""
+    return (f"{summary.addr}: rssi {summary.rssi_mean:.0f} {summary.rssi_min}..{summary.rssi_max} "
+            f"snr {summary.snr_mean:.0f} {summary.snr_min}..{summary.snr_max}")
+
+
+class _Peer:
+    __slots__ = ('rssi', 'snr', 'heard', 'last_heard')
+
+    def __init__(self, size: int):
+        self.rssi = Series(size, *RSSI_RANGE)
+        self.snr = Series(size, *SNR_RANGE)
+        self.heard = 0
+        self.last_heard = 0.0
+
+
+class LinkStats:
+    """Rolling RSSI and SNR statistics for each address heard"""
+
+    SIZE = 128   # samples kept per address
+    PEERS = 64   # addresses kept
+
+    def __init__(self, size: int = SIZE, peers: int = PEERS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.size = size
+        self.peers = peers
+        self.clock = clock
+        self._peers: 'OrderedDict[int, _Peer]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._peers)
+
+    def __contains__(self, addr: int) -> bool:
+        return addr in self._peers
+
+    def add(self, addr: int, rssi: int, snr: int) -> None:
+        """Note a packet heard from addr"""
+        peer = self._peers.get(addr)
+        if peer is None:
+            if len(self._peers) >= self.peers:
+                self._peers.popitem(last=False)
+            peer = self._peers[addr] = _Peer(self.size)
+        else:
+            self._peers.move_to_end(addr)
+        peer.rssi.add(rssi)
+        peer.snr.add(snr)
+        peer.heard += 1
+        peer.last_heard = self.clock()
+
+    def series(self, addr: int) -> Optional[Dict[str, Series]]:
+        """The raw series for addr, oldest sample first in values()"""
+        peer = self._peers.get(addr)
+        return None if peer is None else {'rssi': peer.rssi, 'snr': peer.snr}
+
+    def summary(self, addr: int) -> Optional[LinkSummary]:
+        peer = self._peers.get(addr)
+        if peer is None:
+            return None
+        rssi, snr = peer.rssi, peer.snr
+        return LinkSummary(addr, len(rssi), peer.heard, self.clock() - peer.last_heard,
+                           rssi.last, rssi.min, rssi.max, rssi.mean,
+                           rssi.percentile(10), rssi.percentile(50), rssi.percentile(90),
+                           snr.last, snr.min, snr.max, snr.mean,
+                           snr.percentile(10), snr.percentile(50), snr.percentile(90))
+
+    def summaries(self) -> List[LinkSummary]:
+        """Every address heard, the most recently heard last"""
+        return [self.summary(addr) for addr in self._peers]
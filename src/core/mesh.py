@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Multi-hop routing between RYLR998 nodes.
+#
+# An RYLR998 reaches only the nodes that hear it. The mesh layer carries
+# a payload across several of them:
+#
+#   ROUTE | ttl | metric | destination, 2 bytes | origin, 2 bytes | id | payload
+#
+# Each node keeps a route table. Every +RCV it hears tells it about a
+# neighbor and the quality of the link to it, and every ROUTE frame
+# about a route back to the frame's origin. Nodes also broadcast what
+# they know now and then:
+#
+#   HELLO | destination, 2 bytes | metric | next hop, 2 bytes | ...
+#
+# so that routes spread before there is traffic. A route's metric adds
+# up the cost of its hops, which is 10 on a clean link and more as the
+# SNR nears the floor LoRa can demodulate, so two good hops may beat
+# one bad one. A node ignores routes whose next hop is itself.
+#
+# Frames go from hop to hop through the reliable delivery layer. When
+# there is no route to a destination, or the next hop stops answering,
+# frames wait in a bounded queue until a route turns up again. A frame
+# whose ACK was lost may then arrive twice, or come round a loop, so
+# each node drops frames whose origin and id it has seen lately.
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from src.core.payload import Buffer, PayloadType
+from src.core.protocol import MAX_PAYLOAD
+from src.core.reliable import MAX_DATA
+
+ROUTE_HEADER = 8
+MESH_DATA = MAX_DATA - ROUTE_HEADER  # payload that fits in a reliable ROUTE frame
+HELLO_ENTRY = 5
+MAX_ENTRIES = (MAX_PAYLOAD - 1) // HELLO_ENTRY
+
+INFINITY = 255   # metric of no route
+GOOD_SNR = 5     # dB; links at least this clean cost the least
+WEAK_RSSI = -110 # dBm; links below this cost more whatever the SNR
+HOP_COST = 10
+MAX_HOP_COST = 60
+
+
+def is_mesh(payload: Buffer) -> bool:
+    """True if payload belongs to the mesh layer"""
+    return len(payload) > 0 and payload[0] in (PayloadType.ROUTE, PayloadType.HELLO)
+
+
+def link_cost(rssi: float, snr: float) -> int:
+    """The metric of one hop, from HOP_COST on a clean link up to MAX_HOP_COST"""
+    cost = HOP_COST + 2 * max(0.0, GOOD_SNR - snr)
+    if rssi < WEAK_RSSI:
+        cost += HOP_COST
+    return min(int(cost), MAX_HOP_COST)
+
+
+@dataclass
+class Neighbor:
+    """A node heard directly, with smoothed link quality"""
+    rssi: float
+    snr: float
+    heard: float  # when, by the table's clock
+
+    @property
+    def cost(self) -> int:
+        return link_cost(self.rssi, self.snr)
+
+
+@dataclass
+class Route:
+    next_hop: int
+    metric: int
+    expires: float
+
+
+class RouteTable:
+    """Neighbors and the best known next hop to each destination"""
+
+    NEIGHBOR_TIMEOUT = 300.0  # seconds a neighbor is kept without being heard
+    ROUTE_TIMEOUT = 300.0     # seconds a route is kept without being refreshed
+    ALPHA = 0.25              # weight of the latest RSSI and SNR
+
+    def __init__(self, addr: int, neighbor_timeout: float = NEIGHBOR_TIMEOUT,
+                 route_timeout: float = ROUTE_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.addr = addr
+        self.neighbor_timeout = neighbor_timeout
+        self.route_timeout = route_timeout
+        self._clock = clock
+        self.neighbors: Dict[int, Neighbor] = {}
+        self.routes: Dict[int, Route] = {}
+
+    def heard(self, addr: int, rssi: float, snr: float) -> bool:
+        """
+        Note a frame heard from a neighbor.
+        Returns:
+            True if there was no route to it before
+        """
+        now = self._clock()
+        neighbor = self.neighbors.get(addr)
+        if neighbor is None:
+            neighbor = self.neighbors[addr] = Neighbor(rssi, snr, now)
+        else:
+            neighbor.rssi += self.ALPHA * (rssi - neighbor.rssi)
+            neighbor.snr += self.ALPHA * (snr - neighbor.snr)
+            neighbor.heard = now
+        return self._offer(addr, addr, neighbor.cost)
+
+    def learn(self, dest: int, via: int, metric: int) -> bool:
+        """
+        Consider a route to dest through the neighbor via.
+        Args:
+            dest: The destination
+            via: The neighbor that reported it
+            metric: The neighbor's own metric to dest
+        Returns:
+            True if there was no route to dest before
+        """
+        if dest == self.addr or via not in self.neighbors:
+            return False
+        return self._offer(dest, via, self.through(via, metric))
+
+    def through(self, via: int, metric: int) -> int:
+        """The metric of a route through a neighbor, given the neighbor's own"""
+        neighbor = self.neighbors.get(via)
+        return INFINITY if neighbor is None else min(INFINITY, metric + neighbor.cost)
+
+    def withdraw(self, via: int, keep: Set[int]) -> None:
+        """Forget the routes through a neighbor that it no longer reports"""
+        for dest in [d for d, r in self.routes.items()
+                     if r.next_hop == via and d != via and d not in keep]:
+            del self.routes[dest]
+
+    def lost(self, neighbor: int) -> None:
+        """Forget a neighbor that stopped answering, and the routes through it"""
+        self.neighbors.pop(neighbor, None)
+        for dest in [d for d, r in self.routes.items() if r.next_hop == neighbor]:
+            del self.routes[dest]
+
+    def next_hop(self, dest: int) -> Optional[int]:
+        """Where to send a frame for dest, or None if there is no route"""
+        self.expire()
+        route = self.routes.get(dest)
+        return None if route is None else route.next_hop
+
+    def advertisement(self) -> List[Tuple[int, int, int]]:
+        """(destination, metric, next hop) for the best routes, as many as fit a HELLO"""
+        self.expire()
+        best = sorted(self.routes.items(), key=lambda item: item[1].metric)
+        return [(dest, r.metric, r.next_hop) for dest, r in best[:MAX_ENTRIES]]
+
+    def expire(self) -> None:
+        now = self._clock()
+        for addr in [a for a, n in self.neighbors.items()
+                     if n.heard + self.neighbor_timeout <= now]:
+            logging.info(f"Neighbor {addr} not heard for {self.neighbor_timeout:.0f}s")
+            self.lost(addr)
+        for dest in [d for d, r in self.routes.items() if r.expires <= now]:
+            del self.routes[dest]
+
+    def _offer(self, dest: int, via: int, metric: int) -> bool:
+        route = self.routes.get(dest)
+        if route is None:
+            if metric >= INFINITY:
+                return False
+            self.routes[dest] = Route(via, metric, self._clock() + self.route_timeout)
+            return True
+        if route.next_hop == via:
+            # the next hop's word is the latest, good news or bad
+            if metric >= INFINITY:
+                del self.routes[dest]
+            else:
+                route.metric = metric
+                route.expires = self._clock() + self.route_timeout
+        elif metric < route.metric:
+            self.routes[dest] = Route(via, metric, self._clock() + self.route_timeout)
+        return False
+
+
+@dataclass
+class MeshMetrics:
+    """What the router has done with frames"""
+    originated: int = 0  # frames from this node
+    delivered: int = 0   # frames for this node
+    forwarded: int = 0   # frames passed on for others
+    held: int = 0        # frames queued for want of a route
+    expired: int = 0     # held frames that waited too long
+    dropped: int = 0     # frames out of hops, or pushed out of a full queue
+    duplicates: int = 0  # frames seen before
+    hellos: int = 0      # HELLOs sent
+
+
+class MeshRouter:
+    """Originates, forwards and delivers ROUTE frames; holds them when there is no route"""
+
+    TTL = 8              # hops a frame may take
+    HOLD = 16            # frames held per destination
+    MAX_HELD = 64        # frames held in all
+    HOLD_TIMEOUT = 600.0 # seconds a held frame may wait for a route
+    HELLO_INTERVAL = 60.0
+    RECENT = 256         # (origin, id) pairs remembered to drop repeats
+
+    def __init__(self, addr: int, send: Callable[[int, bytes], Awaitable[bool]],
+                 broadcast: Callable[[int, bytes], Awaitable[Any]],
+                 table: Optional[RouteTable] = None, ttl: int = TTL,
+                 hold: int = HOLD, max_held: int = MAX_HELD,
+                 hold_timeout: float = HOLD_TIMEOUT,
+                 hello_interval: float = HELLO_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            addr: This node's address
+            send: Coroutine function that sends a frame to a neighbor and
+                returns whether it arrived, e.g. ReliableLink.send
+            broadcast: Coroutine function that sends a frame to an address
+                without acknowledgement, e.g. TxScheduler.send
+            table: The route table, by default a new one
+            ttl: Hops a frame may take
+            hold: Frames held per destination while there is no route
+            max_held: Frames held in all
+            hold_timeout: Seconds a held frame may wait
+            hello_interval: Seconds between HELLOs, 0 for none
+            clock: Monotonic seconds; replaceable for tests
+        """
+        self.addr = addr
+        self.table = table if table is not None else RouteTable(addr, clock=clock)
+        self.ttl = ttl
+        self.hold = hold
+        self.max_held = max_held
+        self.hold_timeout = hold_timeout
+        self.hello_interval = hello_interval
+        self.metrics = MeshMetrics()
+        self._send = send
+        self._broadcast = broadcast
+        self._clock = clock
+        self._held: 'OrderedDict[int, Deque[Tuple[bytes, float]]]' = OrderedDict()
+        self._next_id = 0
+        self._recent: 'OrderedDict[Tuple[int, int], None]' = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._hello: Optional[asyncio.Task] = None
+
+    @property
+    def held(self) -> int:
+        """Frames waiting for a route"""
+        return sum(len(q) for q in self._held.values())
+
+    def start(self) -> None:
+        """Begin sending HELLOs"""
+        if self._hello is None and self.hello_interval > 0:
+            self._hello = asyncio.create_task(self._hellos())
+
+    def close(self) -> None:
+        """Stop; held frames are dropped"""
+        if self._hello is not None:
+            self._hello.cancel()
+            self._hello = None
+        for task in self._tasks:
+            task.cancel()
+        self._held.clear()
+
+    async def send(self, dest: int, payload: bytes) -> bool:
+        """
+        Send a payload to any node in the mesh.
+        Args:
+            dest: The destination's address, not 0
+            payload: At most MESH_DATA bytes
+        Returns:
+            True once the first hop has it; False if it is held for want of a route
+        Raises:
+            ValueError if the payload is too long
+        """
+        if len(payload) > MESH_DATA:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds {MESH_DATA}")
+        self.metrics.originated += 1
+        frame = bytes((PayloadType.ROUTE, self.ttl, 0)) + dest.to_bytes(2, 'big') \
+            + self.addr.to_bytes(2, 'big') + bytes((self._next_id,)) + payload
+        self._seen(self.addr, self._next_id)
+        self._next_id = (self._next_id + 1) & 0xFF
+        return await self._forward(dest, frame)
+
+    def heard(self, addr: int, rssi: float, snr: float) -> None:
+        """Note any frame heard, of whatever kind"""
+        if self.table.heard(addr, rssi, snr):
+            self._release()
+
+    def feed(self, addr: int, payload: Buffer) -> Optional[Tuple[int, bytes]]:
+        """
+        Take a mesh frame received from a neighbor.
+        Args:
+            addr: The neighbor it came from
+            payload: The ROUTE or HELLO frame
+        Returns:
+            (origin, payload) if it is a ROUTE frame for this node, else None
+        """
+        if payload[0] == PayloadType.HELLO:
+            new = False
+            reported = set()
+            for i in range(1, len(payload) - HELLO_ENTRY + 1, HELLO_ENTRY):
+                dest = int.from_bytes(payload[i:i + 2], 'big')
+                next_hop = int.from_bytes(payload[i + 3:i + 5], 'big')
+                reported.add(dest)
+                if next_hop != self.addr:  # split horizon
+                    new |= self.table.learn(dest, addr, payload[i + 2])
+            if len(reported) < MAX_ENTRIES:  # the whole table: what is missing is gone
+                self.table.withdraw(addr, reported)
+            if new:
+                self._release()
+            return None
+        if len(payload) < ROUTE_HEADER:
+            logging.info(f"Discarding a {len(payload)} byte ROUTE frame from {addr}")
+            return None
+
+        ttl, metric = payload[1], payload[2]
+        dest = int.from_bytes(payload[3:5], 'big')
+        origin = int.from_bytes(payload[5:7], 'big')
+        if self.table.learn(origin, addr, metric):
+            self._release()
+        if self._seen(origin, payload[7]):
+            self.metrics.duplicates += 1
+            return None
+        if dest == self.addr:
+            self.metrics.delivered += 1
+            return origin, bytes(payload[ROUTE_HEADER:])
+        if ttl <= 1:
+            logging.info(f"Dropping a frame from {origin} for {dest}: out of hops")
+            self.metrics.dropped += 1
+            return None
+        # pass it on with one hop fewer and the cost of the hop it came over
+        frame = bytes((PayloadType.ROUTE, ttl - 1, self.table.through(addr, metric))) \
+            + bytes(payload[3:])
+        self.metrics.forwarded += 1
+        self._spawn(self._forward(dest, frame))
+        return None
+
+    def hello(self) -> bytes:
+        """The HELLO frame for the current route table"""
+        return bytes((PayloadType.HELLO,)) + b''.join(
+            dest.to_bytes(2, 'big') + bytes((metric,)) + next_hop.to_bytes(2, 'big')
+            for dest, metric, next_hop in self.table.advertisement())
+
+    def _seen(self, origin: int, msg_id: int) -> bool:
+        key = (origin, msg_id)
+        if key in self._recent:
+            return True
+        self._recent[key] = None
+        if len(self._recent) > self.RECENT:
+            self._recent.popitem(last=False)
+        return False
+
+    async def _forward(self, dest: int, frame: bytes) -> bool:
+        next_hop = self.table.next_hop(dest)
+        if next_hop is not None:
+            if await self._send(next_hop, frame):
+                return True
+            logging.info(f"Next hop {next_hop} for {dest} is not answering")
+            self.table.lost(next_hop)
+        self._hold(dest, frame, self._clock() + self.hold_timeout)
+        return False
+
+    def _hold(self, dest: int, frame: bytes, deadline: float) -> None:
+        queue = self._held.setdefault(dest, deque())
+        queue.append((frame, deadline))
+        self.metrics.held += 1
+        if len(queue) > self.hold:
+            queue.popleft()
+            self.metrics.dropped += 1
+        while self.held > self.max_held:
+            oldest = next(iter(self._held.values()))
+            oldest.popleft()
+            self.metrics.dropped += 1
+            self._prune()
+
+    def _release(self) -> None:
+        """Send on the held frames that have a route now"""
+        now = self._clock()
+        for dest in list(self._held):
+            if self.table.next_hop(dest) is None:
+                continue
+            for frame, deadline in self._held.pop(dest):
+                if deadline <= now:
+                    self.metrics.expired += 1
+                else:
+                    self._spawn(self._forward(dest, frame))
+        self._expire()
+
+    def _expire(self) -> None:
+        now = self._clock()
+        for queue in self._held.values():
+            while queue and queue[0][1] <= now:
+                queue.popleft()
+                self.metrics.expired += 1
+        self._prune()
+
+    def _prune(self) -> None:
+        for dest in [d for d, q in self._held.items() if not q]:
+            del self._held[dest]
+
+    async def _hellos(self) -> None:
+        while True:
+            # jitter keeps neighbors that started together from colliding
+            await asyncio.sleep(self.hello_interval * random.uniform(0.9, 1.1))
+            self._expire()
+            try:
+                await self._broadcast(0, self.hello())
+                self.metrics.hellos += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.info(f"HELLO not sent: {e!r}")
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Metrics, in the Prometheus text format.
+#
+# A Counter or a Gauge is one attribute, and updating it on the receive
+# path is one attribute increment; a Histogram adds a bisect into a short
+# tuple of bucket bounds. Nothing is formatted, locked or allocated until
+# someone asks for the metrics. Much of what is worth knowing is counted
+# already, in the metrics dataclasses of the engine, the scheduler and
+# the rest: a metric may instead be given a function, which is called
+# only when the metrics are rendered, at no cost to the hot path at all.
+#
+# The Registry keeps the metrics in families of one name, told apart by
+# their labels, and renders them for a scrape. serve() answers
+# GET /metrics over HTTP from the running event loop, and watch_loop()
+# measures how late that loop wakes a task that asked to sleep: the time
+# every callback on it, the curses display included, waits its turn.
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# seconds; an AT command takes a few ms, a SEND waits for its airtime
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class Counter:
+    """A count that only goes up"""
+    __slots__ = ('value', 'fn')
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self.value = 0
+        self.fn = fn  # read at render time instead of value
+
+    def inc(self, n: float = 1) -> None:
+        self.value += n
+
+    def get(self) -> float:
+        return self.value if self.fn is None else self.fn()
+
+
+class Gauge(Counter):
+    """A value that goes up and down"""
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def dec(self, n: float = 1) -> None:
+        self.value -= n
+
+
+class Histogram:
+    """Observations counted into buckets, with their sum"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Family:
+    __slots__ = ('name', 'kind', 'help', 'metrics')
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.metrics: Dict[Labels, object] = {}
+
+
+class Registry:
+    """The metrics of a process, by name and labels"""
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+
+    def counter(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+                fn: Optional[Callable[[], float]] = None) -> Counter:
+        return self._add(name, 'counter', help, labels, Counter(fn))
+
+    def gauge(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+              fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._add(name, 'gauge', help, labels, Gauge(fn))
+
+    def histogram(self, name: str, help: str, labels: Optional[Dict[str, str]] = None,
+                  bounds: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(name, 'histogram', help, labels, Histogram(bounds))
+
+    def register(self, name: str, kind: str, help: str, metric,
+                 labels: Optional[Dict[str, str]] = None):
+        """
+        Add a metric made elsewhere, e.g. a Histogram an engine keeps.
+        Raises:
+            ValueError if the name has another kind, or the labels are taken
+        """
+        return self._add(name, kind, help, labels, metric)
+
+    def _add(self, name, kind, help, labels, metric):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = _Family(name, kind, help)
+        elif family.kind != kind:
+            raise ValueError(f"{name} is a {family.kind}")
+        key = tuple(sorted((labels or {}).items()))
+        if key in family.metrics:
+            raise ValueError(f"{name}{_format_labels(key)} is registered already")
+        family.metrics[key] = metric
+        return metric
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None):
+        """The metric of that name and labels, None if there is none"""
+        family = self._families.get(name)
+        return None if family is None else \
+            family.metrics.get(tuple(sorted((labels or {}).items())))
+
+    def render(self) -> str:
+        """Every metric, in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for family in self._families.values():
+            lines.append(f"# HELP {family.name} {_escape_help(family.help)}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, metric in family.metrics.items():
+                if family.kind == 'histogram':
+                    lines += _histogram_lines(family.name, labels, metric)
+                else:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(metric.get())}")
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(name: str, labels: Labels, histogram: Histogram) -> List[str]:
+    lines = []
+    total = 0
+    for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+        total += count
+        le = labels + (('le', '+Inf' if bound == float('inf') else _format_value(bound)),)
+        lines.append(f"{name}_bucket{_format_labels(le)} {total}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = (f'{key}="{_escape_value(str(value))}"' for key, value in labels)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_value(text: str) -> str:
+    return _escape_help(text).replace('"', '\\"')
+
+
+async def serve(registry: Registry, host: str = '127.0.0.1', port: int = 9998) -> asyncio.AbstractServer:
+    """
+    Answer GET /metrics with the registry's metrics, from the running
+    event loop. Anything else gets a 404.
+    Returns:
+        The server; close() it to stop
+    Raises:
+        OSError if the address cannot be bound
+    """
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass # the headers say nothing we need
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b'GET' and parts[1].split(b'?')[0] == b'/metrics':
+                status, body = '200 OK', registry.render().encode()
+                kind = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                status, body, kind = '404 Not Found', b'Not found\n', 'text/plain'
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {kind}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            logging.info(f"Metrics request failed: {e!r}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(answer, host, port)
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+async def watch_loop(registry: Registry, interval: float = 0.5,
+                     clock: Callable[[], float] = time.monotonic) -> None:
+    """
+    Sleep interval seconds at a time, for ever, and note how late the
+    loop is in waking up, and how many tasks it has.
+    """
+    lag = registry.histogram('rylr998_loop_lag_seconds',
+                             'How late the event loop runs a task after its sleep',
+                             bounds=LAG_BUCKETS)
+    registry.gauge('rylr998_loop_tasks', 'Tasks on the event loop',
+                   fn=lambda: len(asyncio.all_tasks()))
+    while True:
+        start = clock()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, clock() - start - interval))
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Payload framing above AT+SEND.
+#
+# A payload that starts with a printable byte is plain text, exactly as
+# typed, so stock RYLR998 users can talk to us and we to them. A payload
+# that starts with a control byte carries one of the PayloadType markers
+# below and a header that depends on the type.
+#
+# A message becomes a body (plain text, or COMPRESSED, see compress.py),
+# and a body that does not fit in one payload travels in fragments.
+#
+# Batches: short bodies for the same destination may share a payload,
+#
+#   BATCH | length | body | length | body ...
+#
+# Fragments: messages longer than one 240 byte payload are split into
+#
+#   FRAGMENT | message id | index | count | up to 236 bytes of data
+#
+# and put back together on the receiving side. A message is limited to
+# 255 fragments.
+#
+# RELIABLE and ACK frames belong to the delivery layer, see reliable.py.
+# A RELIABLE frame carries one of the payloads above.
+#
+# Relays: a repeater passes a payload on as
+#
+#   RELAY | hops left | origin address, 2 bytes big-endian | payload
+#
+# so it reaches no further than the hop limit, and a receiver knows who
+# sent it first. Only payloads of up to 236 bytes can be relayed.
+#
+# ROUTE and HELLO frames belong to the mesh layer, see mesh.py.
+
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from src.core.protocol import MAX_PAYLOAD
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class PayloadType(IntEnum):
+    """Marker bytes. Printable text never starts with one"""
+    FRAGMENT = 0x01
+    COMPRESSED = 0x02
+    BATCH = 0x03
+    RELIABLE = 0x04
+    ACK = 0x05
+    RELAY = 0x06
+    ROUTE = 0x07
+    HELLO = 0x08
+
+
+PLAIN_MIN = 0x20  # payloads from here up are plain text
+BODY_TYPES = frozenset({PayloadType.COMPRESSED, PayloadType.BATCH})
+
+RELAY_HEADER = 4
+RELAY_DATA = MAX_PAYLOAD - RELAY_HEADER
+
+FRAGMENT_HEADER = 4
+FRAGMENT_DATA = MAX_PAYLOAD - FRAGMENT_HEADER
+MAX_FRAGMENTS = 255
+MAX_MESSAGE = FRAGMENT_DATA * MAX_FRAGMENTS
+
+
+def is_plain(payload: Buffer) -> bool:
+    """True if payload is text as typed, with no marker"""
+    return len(payload) == 0 or payload[0] >= PLAIN_MIN
+
+
+def is_body(payload: Buffer) -> bool:
+    """True if payload is a whole body: plain, or marked but not a fragment"""
+    return is_plain(payload) or payload[0] in BODY_TYPES
+
+
+def fragment(data: bytes, msg_id: int, size: int = MAX_PAYLOAD) -> List[bytes]:
+    """
+    Split a body into payloads of at most size bytes.
+    Args:
+        data: The body
+        msg_id: 0..255, distinguishes this body's fragments from others
+        size: Payload limit, less than 240 if another header goes in front
+    Returns:
+        [data] if it fits and is a body, otherwise FRAGMENT payloads
+    Raises:
+        ValueError if the message needs more than 255 fragments
+    """
+    if len(data) <= size and is_body(data):
+        return [data]
+    chunk = size - FRAGMENT_HEADER
+    count = max(1, -(-len(data) // chunk))
+    if count > MAX_FRAGMENTS:
+        raise ValueError(f"Message of {len(data)} bytes exceeds {chunk * MAX_FRAGMENTS}")
+    return [bytes((PayloadType.FRAGMENT, msg_id & 0xFF, index, count))
+            + data[index * chunk:(index + 1) * chunk]
+            for index in range(count)]
+
+
+def can_batch(payload: Buffer) -> bool:
+    """True if payload is a body that may go in a batch"""
+    return len(payload) <= MAX_PAYLOAD - 2 and (is_plain(payload)
+                                                or payload[0] == PayloadType.COMPRESSED)
+
+
+def batch(bodies: List[bytes]) -> bytes:
+    """
+    Pack bodies into one payload.
+    Args:
+        bodies: Bodies for which can_batch() holds
+    Returns:
+        The BATCH payload, or the only body if there is one
+    Raises:
+        ValueError if they do not fit in 240 bytes
+    """
+    if len(bodies) == 1:
+        return bodies[0]
+    payload = bytes((PayloadType.BATCH,)) + b''.join(
+        bytes((len(body),)) + body for body in bodies)
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Batch of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return payload
+
+
+def unbatch(body: bytes) -> List[bytes]:
+    """The bodies in a BATCH, or [body] if it is not one; [] if malformed"""
+    if is_plain(body) or body[0] != PayloadType.BATCH:
+        return [body]
+    bodies = []
+    pos = 1
+    while pos < len(body):
+        end = pos + 1 + body[pos]
+        if end > len(body):
+            logging.info(f"Discarding a malformed batch of {len(body)} bytes")
+            return []
+        bodies.append(body[pos + 1:end])
+        pos = end
+    return bodies
+
+
+def relay(payload: bytes, origin: int, hops: int) -> bytes:
+    """
+    Wrap a payload for a repeater to pass on.
+    Args:
+        payload: At most 236 bytes
+        origin: Address of the node the payload came from first
+        hops: Further repeats allowed, 0..255
+    Returns:
+        The RELAY payload
+    Raises:
+        ValueError if the payload is too long
+    """
+    if len(payload) > RELAY_DATA:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds {RELAY_DATA}")
+    return bytes((PayloadType.RELAY, hops)) + origin.to_bytes(2, 'big') + payload
+
+
+def unrelay(addr: int, payload: Buffer) -> Tuple[int, Optional[int], Buffer]:
+    """
+    Unwrap a received payload.
+    Args:
+        addr: The address it was received from
+        payload: As received
+    Returns:
+        (origin, hops left, inner payload) for a RELAY payload, else
+        (addr, None, payload)
+    """
+    if len(payload) < RELAY_HEADER or payload[0] != PayloadType.RELAY:
+        return addr, None, payload
+    return int.from_bytes(payload[2:4], 'big'), payload[1], payload[RELAY_HEADER:]
+
+
+class Fragmenter:
+    """Numbers outgoing messages and splits them"""
+
+    def __init__(self, size: int = MAX_PAYLOAD):
+        self.size = size
+        # not 0: a receiver remembers the ids of the messages it completed
+        # in the last Reassembler.TIMEOUT seconds, and would take the first
+        # messages of a sender just restarted for duplicates of them
+        self._next_id = random.randrange(256)
+
+    def split(self, data: bytes) -> List[bytes]:
+        """fragment() with the next message id"""
+        payloads = fragment(data, self._next_id, self.size)
+        if payloads[0][:1] == bytes((PayloadType.FRAGMENT,)):
+            self._next_id = (self._next_id + 1) & 0xFF
+        return payloads
+
+
+@dataclass
+class ReassemblyMetrics:
+    """Counts of what became of fragmented messages"""
+    fragments: int = 0   # fragments received, duplicates included
+    completed: int = 0   # messages put back together
+    expired: int = 0     # messages abandoned for lack of a fragment
+    evicted: int = 0     # messages pushed out by newer ones
+    malformed: int = 0   # fragments with an impossible header
+
+
+class _Partial:
+    __slots__ = ('parts', 'count', 'size', 'deadline')
+
+    def __init__(self, count: int, deadline: float):
+        self.parts: Dict[int, bytes] = {}
+        self.count = count
+        self.size = 0
+        self.deadline = deadline
+
+
+class Reassembler:
+    """Collects fragments per sender and message id until a message is whole"""
+
+    MAX_MESSAGES = 16   # partial messages held at once
+    MAX_BYTES = 64 * 1024  # bytes held across them
+    TIMEOUT = 30.0      # seconds a partial message may wait for its next fragment
+    RECENT = 64         # completed messages remembered to ignore duplicates
+
+    def __init__(self, max_messages: int = MAX_MESSAGES, max_bytes: int = MAX_BYTES,
+                 timeout: float = TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.metrics = ReassemblyMetrics()
+        self._clock = clock
+        self._partial: 'OrderedDict[Tuple[int, int], _Partial]' = OrderedDict()
+        self._bytes = 0
+        # messages just completed, so that late duplicates of their
+        # fragments do not start them over: key -> deadline
+        self._recent: 'OrderedDict[Tuple[int, int], float]' = OrderedDict()
+
+    @property
+    def pending(self) -> int:
+        """Partial messages held"""
+        return len(self._partial)
+
+    def feed(self, addr: int, payload: Buffer) -> Optional[bytes]:
+        """
+        Take a received payload.
+        Args:
+            addr: The sender's address
+            payload: The payload, which may be a view into the parser's buffer
+        Returns:
+            A body as is; the whole body once its last fragment arrives;
+            None while a body is incomplete or if the payload is neither
+        """
+        if is_body(payload):
+            return bytes(payload)
+        if payload[0] != PayloadType.FRAGMENT:
+            return None
+        self.expire()
+        if len(payload) < FRAGMENT_HEADER:
+            self.metrics.malformed += 1
+            return None
+        msg_id, index, count = payload[1], payload[2], payload[3]
+        if count == 0 or index >= count:
+            self.metrics.malformed += 1
+            return None
+        self.metrics.fragments += 1
+        if count == 1:
+            self.metrics.completed += 1
+            return bytes(payload[FRAGMENT_HEADER:])
+
+        key = (addr, msg_id)
+        if key in self._recent:
+            return None  # a duplicate
+        partial = self._partial.get(key)
+        if partial is None or partial.count != count:
+            if partial is not None:  # the id came round again: start over
+                self._drop(key)
+            partial = self._partial[key] = _Partial(count, 0.0)
+        partial.deadline = self._clock() + self.timeout
+        if index not in partial.parts:
+            data = bytes(payload[FRAGMENT_HEADER:])
+            partial.parts[index] = data
+            partial.size += len(data)
+            self._bytes += len(data)
+        self._partial.move_to_end(key)
+
+        if len(partial.parts) == count:
+            self._drop(key)
+            self._recent[key] = partial.deadline
+            if len(self._recent) > self.RECENT:
+                self._recent.popitem(last=False)
+            self.metrics.completed += 1
+            return b''.join(partial.parts[i] for i in range(count))
+
+        while len(self._partial) > self.max_messages or self._bytes > self.max_bytes:
+            oldest = next(iter(self._partial))
+            logging.info(f"Dropping message {oldest[1]} from {oldest[0]}: reassembly buffer full")
+            self._drop(oldest)
+            self.metrics.evicted += 1
+        return None
+
+    def expire(self) -> None:
+        """Abandon partial messages whose next fragment is overdue"""
+        now = self._clock()
+        while self._recent and next(iter(self._recent.values())) <= now:
+            self._recent.popitem(last=False)
+        for key in [k for k, p in self._partial.items() if p.deadline <= now]:
+            logging.info(f"Message {key[1]} from {key[0]} timed out incomplete")
+            self._drop(key)
+            self.metrics.expired += 1
+
+    def _drop(self, key: Tuple[int, int]) -> None:
+        self._bytes -= self._partial.pop(key).size
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Sans-I/O parser for the RYLR998 response protocol.
+#
+# Feed it bytes from anywhere (a serial port, a file, a fuzzer) and it
+# returns typed events. No curses, asyncio or serial dependencies.
+#
+# Responses are parsed in place in one preallocated buffer. A +RCV
+# payload is handed out as a memoryview into that buffer rather than
+# copied, so it is only valid until the next call to feed(): decode it
+# or copy it with bytes() before then.
+
+import logging
+from dataclasses import dataclass
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Union
+
+
+@dataclass(frozen=True, slots=True)
+class Ok:
+    """+OK: the module accepted the last AT command"""
+
+
+@dataclass(frozen=True, slots=True)
+class Err:
+    """+ERR=code: the module rejected the last AT command"""
+    code: int
+
+
+@dataclass(frozen=True, slots=True)
+class ParamReport:
+    """+NAME=value: the reply to a query such as AT+BAND?"""
+    name: str   # ADDRESS, BAND, CRFOP, IPR, MODE, NETWORKID, PARAMETER, UID or VER
+    value: str
+
+
+@dataclass(frozen=True, slots=True)
+class RcvFrame:
+    """+RCV=addr,len,payload,rssi,snr: a packet from another module"""
+    addr: int
+    length: int
+    payload: memoryview  # exactly length bytes, any values. Valid until the next feed()
+    rssi: int
+    snr: int
+
+
+@dataclass(frozen=True, slots=True)
+class Factory:
+    """+FACTORY: factory defaults restored"""
+
+
+@dataclass(frozen=True, slots=True)
+class Reset:
+    """+RESET: the module is restarting. +READY follows"""
+
+
+@dataclass(frozen=True, slots=True)
+class Ready:
+    """+READY: the module has restarted"""
+
+
+Event = Union[Ok, Err, ParamReport, RcvFrame, Factory, Reset, Ready]
+
+PARAM_NAMES = ('ADDRESS', 'BAND', 'CRFOP', 'IPR', 'MODE',
+               'NETWORKID', 'PARAMETER', 'UID', 'VER')
+
+
+MAX_PAYLOAD = 240  # bytes, per the AT command guide
+
+RCV_PREFIX = b'+RCV='
+# +RCV=65535,240, is the longest header: the payload starts within this
+RCV_HEADER_MAX = len(RCV_PREFIX) + 5 + 1 + 3 + 1
+
+
+# Decoders take the buffer holding a response, a memoryview of it and
+# the bounds of the value after the '=' sign. They slice, they do not
+# copy, and raise ValueError if the value is garbled.
+
+Buffer = Union[bytes, bytearray]
+Decoder = Callable[[Buffer, memoryview, int, int], Event]
+
+
+def _decode_rcv(buf: Buffer, view: memoryview, start: int, end: int) -> RcvFrame:
+    """Split addr,len,payload,rssi,snr. The payload may contain commas"""
+    comma1 = buf.find(b',', start, end)
+    comma2 = buf.find(b',', comma1 + 1, end) if comma1 >= 0 else -1
+    if comma2 < 0:
+        raise ValueError("+RCV header incomplete")
+    n = int(buf[comma1+1:comma2])
+    payload_start = comma2 + 1
+    payload_end = payload_start + n
+    if not 0 <= n <= MAX_PAYLOAD or payload_end >= end or buf[payload_end] != 0x2C:
+        raise ValueError(f"payload length {n} does not match")
+    comma3 = buf.find(b',', payload_end + 1, end)
+    if comma3 < 0:
+        raise ValueError("+RCV trailer incomplete")
+    return RcvFrame(int(buf[start:comma1]), n, view[payload_start:payload_end],
+                    int(buf[payload_end+1:comma3]), int(buf[comma3+1:end]))
+
+
+def _decode_param(name: str) -> Decoder:
+    def decode(buf: Buffer, view: memoryview, start: int, end: int) -> ParamReport:
+        return ParamReport(name, str(view[start:end], 'utf8', errors='replace'))
+    return decode
+
+
+# Decoders keyed on the token between '+' and '=' (or the whole
+# response, for those without a value). Built once, at import time.
+DECODERS: Dict[bytes, Decoder] = {
+    b'OK':      lambda buf, view, start, end: Ok(),
+    b'ERR':     lambda buf, view, start, end: Err(int(buf[start:end])),
+    b'RCV':     _decode_rcv,
+    b'FACTORY': lambda buf, view, start, end: Factory(),
+    b'RESET':   lambda buf, view, start, end: Reset(),
+    b'READY':   lambda buf, view, start, end: Ready(),
+    **{name.encode(): _decode_param(name) for name in PARAM_NAMES},
+}
+
+
+def _parse(buf: Buffer, view: memoryview, start: int, end: int) -> Optional[Event]:
+    """Classify the response in buf[start:end], which begins with '+'"""
+    if buf.startswith(RCV_PREFIX, start, end):
+        # most responses are +RCV: no need to copy the token to look it up
+        decode, eq = _decode_rcv, start + len(RCV_PREFIX) - 1
+    else:
+        eq = buf.find(b'=', start, end)
+        decode = DECODERS.get(bytes(buf[start+1:eq if eq >= 0 else end]))
+        if decode is None:
+            return None
+    try:
+        return decode(buf, view, eq + 1 if eq >= 0 else end, end)
+    except ValueError:
+        return None  # a known token with a garbled value
+
+
+def detach(event: Event) -> Event:
+    """Return event with a payload of its own, safe to keep past feed()"""
+    if isinstance(event, RcvFrame):
+        return replace(event, payload=memoryview(bytes(event.payload)))
+    return event
+
+
+def parse_line(line: bytes) -> Optional[Event]:
+    """
+    Classify one complete response line.
+    Args:
+        line: A response without its CRLF terminator
+    Returns:
+        The event, or None if the line is not a well-formed response.
+        Anything before the '+' is line noise and is skipped.
+    """
+    start = line.find(b'+')
+    if start < 0:
+        return None
+    return _parse(line, memoryview(line), start, len(line))
+
+
+class ResponseParser:
+    """
+    Turns a byte stream from the module into events.
+
+    Responses are CRLF-terminated lines, except that a +RCV payload is
+    taken by its announced length: the parser reads +RCV=addr,len, and
+    then exactly len bytes, so payloads may hold any byte values,
+    CR LF included, and are never scanned.
+
+    Incoming bytes are copied once, into a buffer allocated up front,
+    and parsed where they lie. The buffer never grows: unparsed bytes
+    are moved to the front to make room.
+    """
+
+    MAX_LINE = 512  # a +RCV line with a 240 byte payload is about 270 bytes
+    BUFFER_SIZE = 8192  # more than a Linux tty holds, so one read fits
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        """
+        Args:
+            size: Bytes in the buffer, more than MAX_LINE
+        Raises:
+            ValueError if size is too small to hold the longest response
+        """
+        if size <= self.MAX_LINE:
+            # an unfinished response could fill the buffer, leaving no
+            # room for the bytes that finish it
+            raise ValueError(f"Buffer of {size} bytes, not more than MAX_LINE ({self.MAX_LINE})")
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # first unparsed byte
+        self._end = 0    # one past the last byte received
+        self._rcv_at = -1  # where the +RCV whose payload is awaited starts
+        self._payload_end = 0  # and where its payload ends
+        self.discarded = 0  # lines that were not well-formed responses
+        self.resets = 0     # times the buffer was emptied with a response unfinished
+
+    def feed(self, data: bytes) -> List[Event]:
+        """
+        Consume data and return the events it completes.
+        Args:
+            data: Bytes from the module, any amount, split anywhere
+        Returns:
+            Events in arrival order. A partial response is kept for next
+            time. RcvFrame payloads are valid until the next feed().
+        """
+        events: List[Event] = []
+        size = len(self._buf)
+        if self._start and self._end + len(data) > size:
+            self._compact()
+        if self._end + len(data) <= size:
+            # the usual case: one copy into the buffer, one scan
+            self._buf[self._end:self._end + len(data)] = data
+            self._end += len(data)
+            self._scan(events)
+            return events
+        data = memoryview(data)
+        while data:
+            if self._end == size:
+                if events:
+                    # compacting overwrites the payloads handed out so far
+                    events = [detach(event) for event in events]
+                self._compact()
+            n = min(len(data), size - self._end)
+            self._view[self._end:self._end + n] = data[:n]
+            self._end += n
+            data = data[n:]
+            self._scan(events)
+        return events
+
+    def _scan(self, events: List[Event]) -> None:
+        """Parse every complete response between _start and _end"""
+        buf, view = self._buf, self._view
+        pos, end = self._start, self._end
+        while pos < end:
+            if buf[pos] != 0x2B:  # '+'
+                # line noise: skip to the next response or past the line
+                plus = buf.find(b'+', pos, end)
+                crlf = buf.find(b'\r\n', pos, end)
+                if crlf >= 0 and (plus < 0 or crlf < plus):
+                    self._discard(view[pos:crlf])
+                    pos = crlf + 2
+                    continue
+                if plus < 0:
+                    break
+                pos = plus
+            if buf.startswith(RCV_PREFIX, pos, end):
+                stop = self._rcv_end(pos)
+            else:
+                stop = buf.find(b'\r\n', pos, end)
+            if stop < 0:
+                break  # incomplete: wait for more
+            event = _parse(buf, view, pos, stop)
+            if event is None:
+                self._discard(view[pos:stop])
+            else:
+                events.append(event)
+            pos = stop + 2
+        self._start = pos
+        if end - pos > self.MAX_LINE:
+            # no terminator in sight: line noise or a baud rate mismatch.
+            # What comes next goes to the front of the buffer, over the
+            # payloads handed out so far
+            self._discard(view[pos:end])
+            events[:] = [detach(event) for event in events]
+            self._start = self._end = 0
+            self._rcv_at = -1
+            self.resets += 1
+
+    def _compact(self) -> None:
+        """Move the unparsed bytes to the front of the buffer"""
+        n = self._end - self._start
+        self._view[:n] = self._view[self._start:self._end]
+        self._start, self._end = 0, n
+        self._rcv_at = -1
+
+    def _rcv_end(self, pos: int) -> int:
+        """
+        Find the CRLF that ends the +RCV response at pos, skipping over
+        the payload by its length. Returns -1 if the response is not all
+        here yet. A garbled header ends at the next CRLF, so the decoder
+        rejects it and the parser resynchronizes.
+        """
+        buf, end = self._buf, self._end
+        if pos != self._rcv_at:
+            # a payload arrives over several reads: read its header once
+            start = pos + len(RCV_PREFIX)
+            header_end = min(pos + RCV_HEADER_MAX, end)
+            comma1 = buf.find(b',', start, header_end)
+            comma2 = buf.find(b',', comma1 + 1, header_end) if comma1 >= 0 else -1
+            length = buf[comma1+1:comma2] if comma2 >= 0 else b''
+            if not length.isdigit() or int(length) > MAX_PAYLOAD:
+                # the header is garbled, or not all here yet
+                return buf.find(b'\r\n', pos, end)
+            self._rcv_at, self._payload_end = pos, comma2 + 1 + int(length)
+        if self._payload_end > end:
+            return -1
+        return buf.find(b'\r\n', self._payload_end, end)
+
+    def _discard(self, line) -> None:
+        self.discarded += 1
+        logging.debug(f"Discarded {bytes(line)!r}")
+
+    @property
+    def receiving(self) -> bool:
+        """True if a +RCV response has started arriving but is not complete"""
+        return self._buf.startswith(b'+RCV', self._start, self._end)
+
+    def reset(self) -> None:
+        """Forget any partial response"""
+        if self._end > self._start:
+            self.resets += 1
+        self._start = self._end = 0
+        self._rcv_at = -1
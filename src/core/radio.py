@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# One RYLR998 module and the stack above it.
+#
+# A module needs its own serial port, its own parser (a response may
+# arrive in pieces, and the pieces of two modules must not mix), its own
+# command engine (each module answers one command at a time) and its own
+# transmit scheduler, delivery and routing state. A Radio holds all of
+# that, and the settings the module reports, so that one process and one
+# event loop can drive several modules: each Radio registers a readiness
+# callback on its port, and whoever is awake reads the Radios that have
+# something to say.
+#
+# A Radio also knows the layers a message goes through: on the way out,
+# compression, fragments and then the mesh, the delivery layer or the
+# scheduler; on the way in, the same in reverse, with repeats dropped.
+# Nothing here draws on the screen; the front end, curses or the
+# daemon's clients, decides what the results mean to the user.
+#
+# register() puts what a Radio counts in a metrics registry. Reading
+# the port adds to three counters, and the rest is read from the
+# metrics the layers keep anyway, when someone asks for it.
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from src.core.at_engine import ATCommandEngine, CommandTimeout
+from src.core.compress import decode, encode
+from src.core.dedup import DuplicateCache
+from src.core.linkstats import LinkStats
+from src.core.mesh import MESH_DATA, MeshRouter, is_mesh
+from src.core.metrics import Counter, Registry
+from src.core.payload import Fragmenter, Reassembler, RELAY_DATA, relay, unbatch, unrelay
+from src.core.protocol import Err, Event, ParamReport, RcvFrame, ResponseParser
+from src.core.reliable import ReliableLink, is_reliable
+from src.core.scheduler import TxScheduler
+from src.core.serial import SerialManager
+from src.core.trace import Tracer
+
+
+class Outcome(Enum):
+    """What became of a message"""
+    SENT = 'sent'              # on the air, or with the first hop
+    DELIVERED = 'delivered'    # acknowledged, every fragment
+    HELD = 'held'              # no route yet: waiting for one
+    LOST = 'lost'              # not acknowledged, retries spent
+    QUEUE_FULL = 'queue full'  # not sent, or not all of it
+    NO_REPLY = 'no reply'      # the module did not answer AT+SEND
+    REJECTED = 'rejected'      # the module answered AT+SEND with +ERR
+
+
+@dataclass
+class Received:
+    """A +RCV after the layers above the module have had their say"""
+    addr: int             # who we heard
+    rssi: int
+    snr: int
+    origin: int           # who wrote it, if it was relayed or routed
+    hops: Optional[int]   # repeats it may still take, None if not relayed
+    payload: Optional[bytes]  # as it came, None if a repeat, an ACK or another's
+    routed: bool          # a --mesh frame: the router handles the forwarding
+    messages: List[bytes] = field(default_factory=list)  # complete, decoded
+
+
+class Radio:
+    """A module on one serial port, with its parser, engine and queues"""
+
+    def __init__(self, port: str, baudrate: str, addr: str, band: str, netid: str,
+                 parameter: str, pwr: Optional[str] = None, mode: str = '0',
+                 duty_cycle: float = 1.0, coalesce: Optional[int] = None,
+                 mesh: bool = False, hops: int = 3, echo: bool = False,
+                 number: int = 1, debug: bool = False):
+        """
+        Open the port and build the stack. Nothing is sent to the module.
+        Args:
+            port: Serial port device name
+            baudrate: Serial port baudrate, as a string
+            addr, band, netid, parameter, pwr, mode: Settings to configure,
+                as the AT commands take them; pwr None leaves CRFOP alone
+            duty_cycle: Fraction of the time the module may transmit
+            coalesce: ms a short message may wait to share a packet,
+                None not to share packets
+            mesh: Route messages through other nodes
+            hops: Times a message we echo may be repeated on its way
+            echo: The front end repeats what is heard: drop the repeats
+                of what was heard before, as well as of relayed frames
+            number: How the front end tells this radio from the others
+            debug: Log what is read from the port
+        Raises:
+            Whatever SerialManager raises if the port cannot be opened
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.number = number
+        self.hops = hops
+        self.echo = echo
+        self.debug = debug
+
+        # the settings to configure; the handlers of the replies update
+        # them with what the module reports
+        self.addr = addr
+        self.band = band
+        self.netid = netid
+        self.pwr = pwr
+        self.mode = mode
+        self.spreading_factor, self.bandwidth, self.coding_rate, self.preamble = parameter.split(',')
+        self.version = ''
+        self.uid = ''
+        self.tx_flag = False  # True if and only if transmitting
+        self.rejected: Optional[int] = None  # +ERR code of the last SEND refused
+
+        self.serial = SerialManager(port, baudrate)
+        self.parser = ResponseParser()
+        self.engine = ATCommandEngine(self.serial.write)
+        self.scheduler = TxScheduler(self.engine, parameter,
+                                     duty_cycle=duty_cycle,
+                                     coalesce=coalesce is not None,
+                                     linger=(coalesce or 0) / 1000)
+        self.link = ReliableLink(self.scheduler.send)
+        self.router = MeshRouter(int(addr), self.link.send, self.scheduler.send) \
+            if mesh else None
+        # short enough for a RELIABLE or a RELAY header to go in front,
+        # or a RELIABLE and a ROUTE header
+        self.fragmenter = Fragmenter(MESH_DATA if mesh else RELAY_DATA)
+        self.reassembler = Reassembler()
+        self.dedup = DuplicateCache()
+        self.links = LinkStats() # RSSI and SNR of each address heard
+
+        self.bytes_read = Counter()
+        self.frames = Counter()    # +RCVs parsed
+        self.errors: Dict[int, Counter] = {}  # +ERRs, by code
+        self._registry: Optional[Registry] = None
+        self.trace: Optional[Tracer] = None # --trace: where read() and parsing time go
+
+    # replies to queries, and the settings they update
+    REPORTED = {
+        'ADDRESS': 'addr',
+        'BAND': 'band',
+        'CRFOP': 'pwr',
+        'IPR': 'baudrate',
+        'MODE': 'mode',
+        'NETWORKID': 'netid',
+        'UID': 'uid',
+        'VER': 'version',
+    }
+
+    @property
+    def parameter(self) -> str:
+        return f"{self.spreading_factor},{self.bandwidth},{self.coding_rate},{self.preamble}"
+
+    def commands(self) -> List[str]:
+        """The AT commands that configure the module, then query it"""
+        commands = [
+            f"IPR={self.baudrate}", #  chicken and egg
+            f"ADDRESS={self.addr}",
+            f"NETWORKID={self.netid}",
+            f"BAND={self.band}",
+        ]
+        if self.pwr:
+            commands.append(f"CRFOP={self.pwr}") # the next is needed to receive again!
+        return commands + [
+            f"PARAMETER={self.parameter}",
+            'ADDRESS?',
+            'BAND?',
+            'CRFOP?',
+            f"MODE={self.mode}",
+            'PARAMETER?',
+            'UID?',
+            'VER?',
+            'NETWORKID?',
+        ]
+
+    def add_reader(self, callback: Callable[[], None]) -> bool:
+        """Have the event loop call callback when the port has bytes waiting"""
+        if self.trace is not None:
+            trace = self.trace
+            def traced():
+                # a callback queued before the loop read the bytes anyway
+                # would start the clock on bytes yet to come
+                if self.serial.has_data():
+                    trace.arrived()
+                callback()
+            return self.serial.add_reader(traced)
+        return self.serial.add_reader(callback)
+
+    def has_data(self) -> bool:
+        return self.serial.has_data()
+
+    @property
+    def receiving(self) -> bool:
+        """True if a +RCV is partly read"""
+        return self.parser.receiving
+
+    def read(self) -> List[Event]:
+        """
+        Read what is waiting and parse it. Replies to AT commands go to
+        the engine as well. RcvFrame payloads point into the parser's
+        buffer: use them before the next read().
+        Returns:
+            The complete responses, in order
+        """
+        trace = self.trace
+        if trace is not None:
+            start = trace.woken()
+        data = self.serial.read_available()
+        if self.debug:
+            logging.info(f"{self.port} read:{data}")
+        self.bytes_read.value += len(data)
+        if trace is not None:
+            start = trace.lap('read', start)
+        events = self.parser.feed(data)
+        if trace is not None:
+            trace.lap('parse', start)
+        for event in events:
+            self.engine.on_event(event) # answers a command, perhaps
+            if isinstance(event, RcvFrame):
+                self.frames.value += 1
+            elif isinstance(event, ParamReport):
+                self._report(event)
+            elif isinstance(event, Err):
+                self._error(event.code).value += 1
+        return events
+
+    def _error(self, code: int) -> Counter:
+        counter = self.errors.get(code)
+        if counter is None:
+            counter = self.errors[code] = Counter()
+            if self._registry is not None:
+                self._register_error(code, counter)
+        return counter
+
+    def _report(self, event: ParamReport) -> None:
+        if event.name == 'PARAMETER':
+            try:
+                self.spreading_factor, self.bandwidth, self.coding_rate, self.preamble = \
+                    event.value.split(',', 3)
+            except ValueError:
+                return
+            self.scheduler.parameter = event.value # SENDs are paced by the airtime at these settings
+        elif event.name in self.REPORTED:
+            setattr(self, self.REPORTED[event.name], event.value)
+
+    def receive(self, event: RcvFrame) -> Received:
+        """
+        Take a +RCV through the layers: relay, delivery or duplicates,
+        mesh, fragments, batch and compression.
+        Returns:
+            What was heard, and the messages it completed, if any
+        """
+        # a relayed payload counts as its origin's. A payload that could
+        # be repeated, relayed or heard in echo mode, is dropped if seen
+        # before, which stops repeaters passing it back and forth; a
+        # direct one is always shown, so that a peer may say "ok" twice,
+        # and is remembered so that a relayed copy of it is not. The
+        # delivery layer spots its own repeats, and must, since a lost ACK
+        # means a frame is sent again and acknowledged again.
+        self.links.add(event.addr, event.rssi, event.snr)
+        origin, hops, payload = unrelay(event.addr, event.payload)
+        if self.router is not None:
+            self.router.heard(event.addr, event.rssi, event.snr)
+        if is_reliable(payload):
+            payload = self.link.feed(origin, payload)
+        elif not is_mesh(payload):
+            if not self.echo and hops is None:
+                self.dedup.add(origin, payload)
+            elif self.dedup.seen(origin, payload):
+                logging.info(f"Duplicate from {origin} via {event.addr} dropped, "
+                             f"{self.dedup.metrics.suppressed} so far")
+                payload = None
+        # the router passes on frames for others, learns routes from
+        # HELLOs, and hands over the frames for us with their origin
+        routed = payload is not None and is_mesh(payload)
+        if routed:
+            delivered = None if self.router is None else self.router.feed(origin, payload)
+            origin, payload = (origin, None) if delivered is None else delivered
+        payload = None if payload is None else bytes(payload) # the parser reuses its buffer
+
+        # a fragment completes nothing until its message is complete; a
+        # batch holds several messages
+        body = None if payload is None else self.reassembler.feed(origin, payload)
+        bodies = [] if body is None else unbatch(body)
+        messages = [data for data in map(decode, bodies) if data is not None]
+        return Received(event.addr, event.rssi, event.snr, origin, hops,
+                        payload, routed, messages)
+
+    def split(self, data: bytes, compress: bool = False) -> List[bytes]:
+        """
+        The payloads of a message: compressed if that saves airtime, and
+        in fragments if longer than one payload.
+        Raises:
+            ValueError if the message is too long
+        """
+        payloads = self.fragmenter.split(encode(data, compress))
+        # in echo mode, a repeater passing our own message back is not news
+        if self.echo:
+            for payload in payloads:
+                self.dedup.add(int(self.addr), payload)
+        return payloads
+
+    async def send(self, addr: int, payloads: List[bytes], reliable: bool = False) -> Outcome:
+        """
+        Send the payloads of one message to addr, 0 for everyone.
+        Args:
+            reliable: Have each fragment acknowledged, resending the lost
+        Returns:
+            What became of the message
+        """
+        # with --mesh, a message to one address may go through other
+        # nodes, or wait for a route to it
+        if self.router is not None and addr != 0:
+            forwarded = await asyncio.gather(*(self.router.send(addr, payload)
+                                               for payload in payloads))
+            return Outcome.SENT if all(forwarded) else Outcome.HELD
+
+        # with --reliable, a message to one address is acknowledged
+        # fragment by fragment, and the lost ones are sent again
+        if reliable and addr != 0:
+            delivered = await asyncio.gather(*(self.link.send(addr, payload)
+                                               for payload in payloads))
+            return Outcome.DELIVERED if all(delivered) else Outcome.LOST
+
+        # the scheduler paces SENDs by airtime and duty cycle; when too
+        # many are waiting, the rest of the message is dropped rather
+        # than queued forever. One fragment at a time keeps room for others.
+        for payload in payloads:
+            try:
+                reply = await self.scheduler.submit(addr, payload)
+            except asyncio.QueueFull:
+                return Outcome.QUEUE_FULL
+            except CommandTimeout:
+                return Outcome.NO_REPLY
+            if isinstance(reply, Err):
+                self.rejected = reply.code
+                logging.warning(f"AT+SEND to {addr} rejected: +ERR={reply.code}")
+                return Outcome.REJECTED
+        return Outcome.SENT
+
+    # Echo mode makes a digipeater: a payload heard for the first time
+    # goes out again, as it came, to everyone, until its hops run out.
+
+    def repeats(self, received: Received) -> Optional[bytes]:
+        """The frame that repeats what was heard, None if it should not be"""
+        if received.payload is None or received.routed:
+            return None # a repeat, an ACK, or the router's business
+        hops = self.hops if received.hops is None else received.hops # None: heard from the origin
+        if hops == 0:
+            logging.info(f"Not repeating for {received.origin}: hop limit reached")
+            return None
+        try:
+            return relay(received.payload, received.origin, hops - 1)
+        except ValueError as e:
+            logging.info(f"Not repeating for {received.origin}: {str(e)}")
+            return None
+
+    async def repeat(self, frame: bytes) -> bool:
+        """Send a frame from repeats() to everyone; False if it could not go"""
+        try:
+            await self.scheduler.submit(0, frame)
+        except (asyncio.QueueFull, CommandTimeout) as e:
+            logging.info(f"Not repeating: {e!r}")
+            return False
+        return True
+
+    def register(self, registry: Registry) -> None:
+        """Add this radio's metrics to registry, labelled with its number"""
+        self._registry = registry
+        radio = {'radio': str(self.number)}
+        engine, scheduler, link = self.engine, self.scheduler, self.link
+
+        def delivered(field: str) -> Callable[[], int]:
+            return lambda: sum(getattr(peer.stats, field) for peer in link.peers.values())
+
+        registry.register('rylr998_read_bytes_total', 'counter',
+                          'Bytes read from the serial port', self.bytes_read, radio)
+        registry.register('rylr998_received_frames_total', 'counter',
+                          '+RCV responses parsed', self.frames, radio)
+        registry.counter('rylr998_parser_discarded_total',
+                         'Lines that were not well-formed responses', radio,
+                         lambda: self.parser.discarded)
+        registry.counter('rylr998_parser_resets_total',
+                         'Times the receive buffer was emptied with a response unfinished',
+                         radio, lambda: self.parser.resets)
+        for code, counter in self.errors.items():
+            self._register_error(code, counter)
+
+        registry.counter('rylr998_commands_total', 'AT commands answered or given up on',
+                         radio, lambda: engine.metrics.sent)
+        registry.counter('rylr998_command_retries_total', 'AT commands written again',
+                         radio, lambda: engine.metrics.retries)
+        registry.counter('rylr998_command_timeouts_total', 'AT commands given up on for lack of a reply',
+                         radio, lambda: engine.metrics.timeouts)
+        registry.register('rylr998_command_latency_seconds', 'histogram',
+                          'Time from writing an AT command to its reply', engine.latency, radio)
+        registry.gauge('rylr998_command_queue_depth', 'AT commands waiting for their turn',
+                       radio, lambda: engine.depth)
+
+        registry.gauge('rylr998_tx_queue_depth', 'Packets waiting for airtime',
+                       radio, lambda: scheduler.depth)
+        registry.counter('rylr998_tx_sent_total', 'SENDs written, a batch counting once',
+                         radio, lambda: scheduler.metrics.sent)
+        registry.counter('rylr998_tx_dropped_total', 'Packets refused because the queue was full',
+                         radio, lambda: scheduler.metrics.dropped)
+        registry.counter('rylr998_tx_coalesced_total', 'Packets that went in another packet\'s batch',
+                         radio, lambda: scheduler.metrics.coalesced)
+        registry.counter('rylr998_tx_airtime_seconds_total', 'Time on the air',
+                         radio, lambda: scheduler.metrics.airtime)
+
+        registry.counter('rylr998_delivered_total', 'Frames acknowledged',
+                         radio, delivered('delivered'))
+        registry.counter('rylr998_lost_total', 'Frames given up on, retries spent',
+                         radio, delivered('lost'))
+        registry.counter('rylr998_retransmits_total', 'Frames sent again for want of an ACK',
+                         radio, delivered('retransmits'))
+        registry.counter('rylr998_duplicates_total', 'Payloads heard before and dropped',
+                         radio, lambda: self.dedup.metrics.suppressed)
+        registry.gauge('rylr998_peers', 'Addresses heard recently',
+                       radio, lambda: len(self.links))
+        if self.router is not None:
+            registry.gauge('rylr998_mesh_held', 'Frames waiting for a route',
+                           radio, lambda: self.router.held)
+
+    def _register_error(self, code: int, counter: Counter) -> None:
+        self._registry.register('rylr998_command_errors_total', 'counter',
+                                'AT commands answered with +ERR, by code', counter,
+                                {'radio': str(self.number), 'code': str(code)})
+
+    def start(self) -> None:
+        """Start the tasks that run on their own, the HELLOs of --mesh"""
+        if self.router is not None:
+            self.router.start()
+
+    def close(self) -> None:
+        """Stop the queues and the timers, and close the port"""
+        if self.router is not None:
+            self.router.close()
+        self.link.close()
+        self.scheduler.close()
+        self.engine.close()
+        self.serial.close()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Reliable delivery above AT+SEND.
+#
+# The module's +OK to a SEND means only that the frame was accepted,
+# not that anyone heard it. The delivery layer numbers the payloads it
+# sends to each peer and has the peer acknowledge them:
+#
+#   RELIABLE | session | seq | payload
+#   ACK      | session | next | bitmap
+#
+# next is the first seq not yet received and bit i of the bitmap says
+# whether next + 1 + i was, so one ACK reports the whole window and only
+# the missing frames are sent again. Up to WINDOW frames per peer are in
+# flight at once. A frame is sent again when its retransmission timeout,
+# estimated from round-trip times as in RFC 6298, runs out, or at once
+# when a later frame is acknowledged before it. After RETRIES resends it
+# is given up on.
+#
+# The session byte is picked at random when a peer is first sent to, so
+# a receiver can tell that the sender has restarted and its sequence
+# numbers with it; every session starts at seq 0. A receiver delivers each payload once, in the order
+# it arrives; fragments and batches do not need more.
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from src.core.payload import Buffer, PayloadType
+from src.core.protocol import MAX_PAYLOAD
+
+HEADER = 3
+MAX_DATA = MAX_PAYLOAD - HEADER  # payload that fits in a RELIABLE frame
+WINDOW = 8  # frames in flight per peer; the ACK bitmap has one bit each
+
+
+def is_reliable(payload: Buffer) -> bool:
+    """True if payload belongs to the delivery layer"""
+    return len(payload) > 0 and payload[0] in (PayloadType.RELIABLE, PayloadType.ACK)
+
+
+@dataclass
+class DeliveryStats:
+    """What became of the frames sent to, and received from, one peer"""
+    sent: int = 0         # frames handed to the delivery layer
+    delivered: int = 0    # frames acknowledged
+    lost: int = 0         # frames given up on
+    retransmits: int = 0
+    received: int = 0     # frames from the peer, each counted once
+    duplicates: int = 0   # frames from the peer seen before
+    srtt: float = 0.0     # smoothed round-trip time, seconds; 0 until measured
+    rto: float = 0.0      # retransmission timeout, seconds
+
+    @property
+    def pending(self) -> int:
+        return self.sent - self.delivered - self.lost
+
+
+def format_stats(addr: int, stats: DeliveryStats) -> str:
+    """A status line, e.g. 'to 5: 12/13 ok 2 lost 3 resent rtt 1.4s'"""
+    line = f"to {addr}: {stats.delivered}/{stats.sent} ok"
+    if stats.lost:
+        line += f" {stats.lost} lost"
+    if stats.retransmits:
+        line += f" {stats.retransmits} resent"
+    if stats.srtt:
+        line += f" rtt {stats.srtt:.1f}s"
+    return line
+
+
+class _Frame:
+    __slots__ = ('payload', 'done', 'tries', 'sent', 'deadline')
+
+    def __init__(self, payload: bytes, done: asyncio.Future):
+        self.payload = payload
+        self.done = done
+        self.tries = 0          # transmissions so far
+        self.sent = 0.0         # when the last one was accepted by the module
+        self.deadline: Optional[float] = None  # None while being sent
+
+
+class _Peer:
+    def __init__(self, session: int, rto: float):
+        self.stats = DeliveryStats(rto=rto)
+        # sending
+        self.session = session
+        self.next_seq = 0
+        self.frames: Dict[int, _Frame] = {}
+        self.room = asyncio.Event()
+        self.rttvar = 0.0
+        # receiving
+        self.rx_session: Optional[int] = None
+        self.expected = 0       # first seq not received
+        self.seen: Set[int] = set()  # offsets from expected received out of order
+        self.ack: Optional[asyncio.TimerHandle] = None
+
+    def in_flight(self) -> int:
+        if not self.frames:
+            return 0
+        return max((self.next_seq - seq) & 0xFF for seq in self.frames)
+
+
+class ReliableLink:
+    """Numbers, acknowledges and retransmits payloads, per peer"""
+
+    RETRIES = 4        # resends before a frame is given up on
+    RTO = 3.0          # seconds, before the first round trip is measured
+    MIN_RTO = 1.0
+    MAX_RTO = 60.0
+    ACK_DELAY = 0.05   # seconds to wait so one ACK covers a burst
+
+    def __init__(self, send: Callable[[int, bytes], Awaitable[Any]],
+                 window: int = WINDOW, retries: int = RETRIES, rto: float = RTO,
+                 min_rto: float = MIN_RTO, max_rto: float = MAX_RTO,
+                 ack_delay: float = ACK_DELAY,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            send: Coroutine function that transmits a payload to an address,
+                e.g. TxScheduler.send
+            window: Frames in flight per peer, at most 8
+            retries: Resends before a frame is given up on
+            rto: Initial retransmission timeout, seconds
+            min_rto: Lower bound of the timeout once round trips are measured
+            max_rto: Upper bound of the timeout, backoff included
+            ack_delay: Seconds to hold an ACK for more frames to arrive
+            clock: Monotonic seconds; replaceable for tests
+        """
+        if not 0 < window <= WINDOW:
+            raise ValueError(f"Window must be in 1..{WINDOW}, not {window}")
+        self._send = send
+        self.window = window
+        self.retries = retries
+        self.rto = rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.ack_delay = ack_delay
+        self._clock = clock
+        self.peers: Dict[int, _Peer] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._kick = asyncio.Event()
+        self._timer: Optional[asyncio.Task] = None
+
+    def stats(self, addr: int) -> DeliveryStats:
+        """Delivery counters for one peer"""
+        return self._peer(addr).stats
+
+    async def send(self, addr: int, payload: bytes) -> bool:
+        """
+        Send a payload and wait until it is acknowledged or given up on.
+        Args:
+            addr: The peer's address; not 0, since a broadcast has no one ACK
+            payload: At most MAX_DATA bytes
+        Returns:
+            True if the peer acknowledged it
+        Raises:
+            ValueError if the payload is too long
+        """
+        if len(payload) > MAX_DATA:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_DATA}")
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run())
+        peer = self._peer(addr)
+        while peer.in_flight() >= self.window:
+            peer.room.clear()
+            await peer.room.wait()
+        seq = peer.next_seq
+        peer.next_seq = (seq + 1) & 0xFF
+        frame = peer.frames[seq] = _Frame(
+            bytes((PayloadType.RELIABLE, peer.session, seq)) + payload,
+            asyncio.get_running_loop().create_future())
+        peer.stats.sent += 1
+        self._spawn(self._transmit(addr, peer, frame))
+        return await asyncio.shield(frame.done)
+
+    def feed(self, addr: int, payload: Buffer) -> Optional[Buffer]:
+        """
+        Take a received payload.
+        Args:
+            addr: The sender's address
+            payload: The payload as received
+        Returns:
+            The payload a RELIABLE frame carries, the first time it arrives;
+            None for ACKs, duplicates and malformed frames; any other
+            payload as is
+        """
+        if not is_reliable(payload):
+            return payload
+        if len(payload) < (HEADER + 1 if payload[0] == PayloadType.ACK else HEADER):
+            logging.info(f"Discarding a {len(payload)} byte delivery frame from {addr}")
+            return None
+        peer = self._peer(addr)
+        if payload[0] == PayloadType.ACK:
+            self._on_ack(peer, payload[1], payload[2], payload[3])
+            return None
+
+        session, seq = payload[1], payload[2]
+        if session != peer.rx_session:  # first contact, or the sender restarted
+            # a session starts at seq 0, whichever frame of it arrives first:
+            # starting at this one would acknowledge the ones lost before it
+            peer.rx_session, peer.expected, peer.seen = session, 0, set()
+        self._schedule_ack(addr, peer)
+        offset = (seq - peer.expected) & 0xFF
+        if offset >= 0x80 or offset in peer.seen:
+            peer.stats.duplicates += 1
+            return None
+        if offset >= WINDOW:
+            # the sender gave up on what we are missing: slide up to it
+            shift = offset - WINDOW + 1
+            peer.expected = (peer.expected + shift) & 0xFF
+            peer.seen = {o - shift for o in peer.seen if o >= shift}
+            offset -= shift
+        peer.seen.add(offset)
+        while 0 in peer.seen:
+            peer.expected = (peer.expected + 1) & 0xFF
+            peer.seen = {o - 1 for o in peer.seen if o}
+        peer.stats.received += 1
+        return payload[HEADER:]
+
+    def close(self) -> None:
+        """Stop retransmitting. Frames not yet acknowledged count as lost"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._tasks:
+            task.cancel()
+        for peer in self.peers.values():
+            if peer.ack is not None:
+                peer.ack.cancel()
+            for seq in list(peer.frames):
+                self._finish(peer, seq, False)
+
+    def _peer(self, addr: int) -> _Peer:
+        peer = self.peers.get(addr)
+        if peer is None:
+            peer = self.peers[addr] = _Peer(random.randrange(256), self.rto)
+        return peer
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _transmit(self, addr: int, peer: _Peer, frame: _Frame) -> None:
+        frame.tries += 1
+        if frame.tries > 1:
+            peer.stats.retransmits += 1
+        try:
+            await self._send(addr, frame.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # the module did not take it: that costs a try like a loss
+            logging.info(f"Frame {frame.payload[2]} to {addr} not sent: {e!r}")
+        frame.sent = self._clock()
+        backoff = 2 ** (frame.tries - 1)
+        frame.deadline = frame.sent + min(peer.stats.rto * backoff, self.max_rto)
+        self._kick.set()
+
+    def _on_ack(self, peer: _Peer, session: int, next_seq: int, bitmap: int) -> None:
+        if session != peer.session:
+            return  # for an earlier run of ours
+        def acked(seq: int) -> bool:
+            behind = (next_seq - seq) & 0xFF
+            ahead = (seq - next_seq - 1) & 0xFF
+            return 0 < behind <= WINDOW or ahead < WINDOW and bitmap >> ahead & 1
+
+        latest = 0.0
+        for seq in [seq for seq in peer.frames if acked(seq)]:
+            frame = peer.frames[seq]
+            if frame.deadline is not None:  # not being sent again right now
+                if frame.tries == 1:  # Karn: a resent frame's RTT is ambiguous
+                    self._measure(peer, self._clock() - frame.sent)
+                latest = max(latest, frame.sent)
+            self._finish(peer, seq, True)
+        # a frame sent before one the peer has had is probably lost
+        for frame in peer.frames.values():
+            if frame.deadline is not None and frame.sent < latest:
+                frame.deadline = min(frame.deadline, self._clock())
+                self._kick.set()
+
+    def _measure(self, peer: _Peer, rtt: float) -> None:
+        stats = peer.stats
+        if not stats.srtt:
+            stats.srtt, peer.rttvar = rtt, rtt / 2
+        else:
+            peer.rttvar = 0.75 * peer.rttvar + 0.25 * abs(stats.srtt - rtt)
+            stats.srtt = 0.875 * stats.srtt + 0.125 * rtt
+        stats.rto = min(max(stats.srtt + 4 * peer.rttvar, self.min_rto), self.max_rto)
+
+    def _finish(self, peer: _Peer, seq: int, delivered: bool) -> None:
+        frame = peer.frames.pop(seq)
+        if delivered:
+            peer.stats.delivered += 1
+        else:
+            peer.stats.lost += 1
+        if not frame.done.done():
+            frame.done.set_result(delivered)
+        peer.room.set()
+
+    def _schedule_ack(self, addr: int, peer: _Peer) -> None:
+        if peer.ack is None:
+            peer.ack = asyncio.get_running_loop().call_later(
+                self.ack_delay, self._send_ack, addr, peer)
+
+    def _send_ack(self, addr: int, peer: _Peer) -> None:
+        peer.ack = None
+        bitmap = sum(1 << (o - 1) for o in peer.seen if o)
+        self._spawn(self._send(addr, bytes(
+            (PayloadType.ACK, peer.rx_session, peer.expected, bitmap))))
+
+    async def _run(self) -> None:
+        while True:
+            now = self._clock()
+            deadlines = []
+            for addr, peer in self.peers.items():
+                for seq, frame in list(peer.frames.items()):
+                    if frame.deadline is None:
+                        continue
+                    if frame.deadline > now:
+                        deadlines.append(frame.deadline)
+                    elif frame.tries > self.retries:
+                        logging.info(f"Frame {seq} to {addr} lost after {frame.tries} tries")
+                        self._finish(peer, seq, False)
+                    else:
+                        frame.deadline = None
+                        self._spawn(self._transmit(addr, peer, frame))
+            self._kick.clear()
+            try:
+                await asyncio.wait_for(self._kick.wait(),
+                                       min(deadlines) - now if deadlines else None)
+            except asyncio.TimeoutError:
+                pass
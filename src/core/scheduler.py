@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Airtime-aware transmit scheduler.
+#
+# The RYLR998 answers AT+SEND with +OK and then spends the packet's
+# airtime on the channel. A SEND written before that is over gets
+# +ERR=17, "Last TX was not completed". The scheduler holds outgoing
+# packets in a bounded queue and releases each one when the previous
+# packet is off the air and the duty-cycle budget can pay for it.
+#
+# The budget is a token bucket measured in seconds of airtime. It
+# refills at duty_cycle seconds per second and holds at most
+# duty_cycle * window seconds, so a quiet radio may burst up to that
+# much and a busy one settles at the duty cycle. A SEND the module
+# answers with +ERR never went on the air and costs nothing; one it does
+# not answer at all may have, and is paid for.
+#
+# Packets go to the AT command engine at DATA priority, so configuration
+# commands and queries are never stuck behind them.
+#
+# With coalescing on, short bodies queued for the same destination share
+# one BATCH payload, and so one preamble and header. The packet at the
+# head of the queue may linger a little to collect company; whatever
+# queued up while the channel was busy rides along for free.
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, List, Optional, Tuple
+
+from src.core.airtime import parameter_airtime
+from src.core.at_engine import ATCommandEngine
+from src.core.payload import batch, can_batch
+from src.core.protocol import Event, MAX_PAYLOAD, Ok
+
+# addr, payload, future for the reply, when it was queued
+Packet = Tuple[int, bytes, asyncio.Future, float]
+
+
+@dataclass
+class SchedulerMetrics:
+    """What the scheduler has sent, dropped, and how long packets waited"""
+    queued: int = 0       # packets accepted
+    sent: int = 0         # SENDs written, a BATCH counting once
+    dropped: int = 0      # packets refused because the queue was full
+    coalesced: int = 0    # packets that went in another packet's BATCH
+    airtime: float = 0.0  # seconds on air, total, not counting SENDs refused
+    wait_last: float = 0.0  # seconds from submit() to the SEND
+    wait_max: float = 0.0
+    wait_total: float = 0.0
+
+    @property
+    def wait_mean(self) -> float:
+        return self.wait_total / self.sent if self.sent else 0.0
+
+
+class TxScheduler:
+    """Releases SENDs no faster than the channel and the duty cycle allow"""
+
+    QUEUE_SIZE = 16       # packets waiting for the air
+    WINDOW = 60.0         # seconds over which the duty cycle is averaged
+    GUARD = 0.02          # seconds between one packet's end and the next SEND
+
+    def __init__(self, engine: ATCommandEngine, parameter: str,
+                 duty_cycle: float = 1.0, window: float = WINDOW,
+                 queue_size: int = QUEUE_SIZE, coalesce: bool = False,
+                 linger: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            engine: The AT command engine that writes the SENDs
+            parameter: The current AT+PARAMETER value, e.g. '9,7,1,12'
+            duty_cycle: Fraction of time the radio may transmit, 0 < d <= 1
+            window: Seconds of full-rate burst the bucket holds, times duty_cycle
+            queue_size: Packets that may wait before submit() refuses more
+            coalesce: Pack queued bodies for the same address into a BATCH
+            linger: Seconds a batchable packet waits for company
+            clock: Monotonic seconds; replaceable for tests
+        """
+        if not 0 < duty_cycle <= 1:
+            raise ValueError(f"Duty cycle must be in (0, 1], not {duty_cycle}")
+        self.engine = engine
+        self.parameter = parameter
+        self.rate = duty_cycle
+        self.capacity = duty_cycle * window
+        self.metrics = SchedulerMetrics()
+        self._clock = clock
+        self._tokens = self.capacity
+        self._filled = clock()
+        self._busy_until = 0.0  # when the module finishes the last packet
+        self.coalesce = coalesce
+        self.linger = linger
+        self._queue_size = queue_size
+        self._queue: Deque[Packet] = deque()
+        self._ready = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, addr: int, payload: bytes) -> asyncio.Future:
+        """
+        Queue a packet for transmission.
+        Args:
+            addr: Destination address, 0 for broadcast
+            payload: At most 240 bytes
+        Returns:
+            A future for the module's reply to the SEND
+        Raises:
+            asyncio.QueueFull if queue_size packets are already waiting
+            ValueError if the payload is too long
+        """
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+        if len(self._queue) >= self._queue_size:
+            self.metrics.dropped += 1
+            raise asyncio.QueueFull()
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        done = asyncio.get_running_loop().create_future()
+        self._queue.append((addr, payload, done, self._clock()))
+        self._ready.set()
+        self.metrics.queued += 1
+        return done
+
+    async def send(self, addr: int, payload: bytes) -> Event:
+        """submit() and wait for the reply"""
+        return await self.submit(addr, payload)
+
+    @property
+    def depth(self) -> int:
+        """Packets waiting for their turn"""
+        return len(self._queue)
+
+    @property
+    def tokens(self) -> float:
+        """Seconds of airtime the budget can pay for right now"""
+        self._refill()
+        return self._tokens
+
+    def close(self) -> None:
+        """Stop the worker. Packets still queued are cancelled"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while self._queue:
+            _, _, done, _ = self._queue.popleft()
+            done.cancel()
+
+    def delay(self, airtime: float) -> float:
+        """Seconds until a packet of this airtime may be sent"""
+        now = self._clock()
+        self._refill()
+        need = min(airtime, self.capacity) - self._tokens
+        return max(self._busy_until + self.GUARD - now, need / self.rate, 0.0)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._filled) * self.rate)
+        self._filled = now
+
+    def _airtime(self, length: int) -> float:
+        try:
+            return parameter_airtime(self.parameter, length)
+        except ValueError as e:
+            logging.error(str(e))
+            return 0.0
+
+    def _gather(self, addr: int, bodies: List[bytes], riders: List[Packet]) -> None:
+        """Move queued bodies for addr that still fit from the queue into the batch"""
+        size = 1 + sum(1 + len(body) for body in bodies)  # the BATCH it would be
+        kept: Deque[Packet] = deque()
+        for packet in self._queue:
+            p_addr, payload, done, _ = packet
+            if done.cancelled():
+                continue
+            if p_addr == addr and can_batch(payload) and size + 1 + len(payload) <= MAX_PAYLOAD:
+                size += 1 + len(payload)
+                bodies.append(payload)
+                riders.append(packet)
+            else:
+                kept.append(packet)
+        self._queue = kept
+
+    async def _run(self) -> None:
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            addr, payload, done, queued = head = self._queue.popleft()
+            if done.cancelled():
+                continue
+            bodies, riders = [payload], [head]
+            batching = self.coalesce and can_batch(payload)
+            if batching and self.linger:
+                await asyncio.sleep(max(0.0, queued + self.linger - self._clock()))
+
+            # wait for the channel; more may queue up meanwhile and join
+            # the batch, which makes it longer, so wait again if need be
+            while True:
+                if batching:
+                    self._gather(addr, bodies, riders)
+                    payload = batch(bodies)
+                airtime = self._airtime(len(payload))
+                wait = self.delay(airtime)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            self._record_wait(self._clock() - queued)
+            self.metrics.coalesced += len(riders) - 1
+            try:
+                reply = await self.engine.send(
+                    b'SEND=%d,%d,%s' % (addr, len(payload), payload),
+                    timeout=self.engine.timeout + airtime,
+                    priority=ATCommandEngine.DATA)
+            except asyncio.CancelledError:
+                for _, _, done, _ in riders:
+                    done.cancel()
+                raise
+            except Exception as e:
+                self._charge(airtime)  # no reply, but perhaps on the air
+                for _, _, done, _ in riders:
+                    if not done.cancelled():
+                        done.set_exception(e)
+                continue
+            if isinstance(reply, Ok):
+                # the module is on the air from its +OK on
+                self._charge(airtime)
+                self._busy_until = self._clock() + airtime
+            for _, _, done, _ in riders:
+                if not done.cancelled():
+                    done.set_result(reply)
+
+    def _charge(self, airtime: float) -> None:
+        self._tokens -= airtime
+        self.metrics.airtime += airtime
+
+    def _record_wait(self, wait: float) -> None:
+        m = self.metrics
+        m.sent += 1
+        m.wait_last = wait
+        m.wait_total += wait
+        m.wait_max = max(m.wait_max, wait)
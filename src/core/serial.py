@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf8 -*-
 
+import asyncio
 import logging
-from typing import Optional
+from typing import Callable, Optional
 import aioserial
 from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
 
@@ -14,6 +15,7 @@ class SerialManager:
         self.port = port
         self.baudrate = baudrate
         self._serial: Optional[aioserial.AioSerial] = None
+        self._reader_fd: Optional[int] = None
         self._open()  # Open port during initialization
 
     def _open(self) -> None:
@@ -34,6 +36,7 @@ class SerialManager:
 
     def close(self) -> None:
         """Close serial port if open"""
+        self.remove_reader()
         if self._serial:
             try:
                 self._serial.close()
@@ -55,10 +58,60 @@ class SerialManager:
             raise RuntimeError("Serial port not opened")
         return await self._serial.read_async(size=1)
 
+    def read_available(self) -> bytes:
+        """
+        Read everything waiting in the input buffer in one call.
+        Never blocks: returns b'' if nothing is waiting.
+        """
+        if not self._serial:
+            raise RuntimeError("Serial port not opened")
+        waiting = self._serial.in_waiting
+        if waiting == 0:
+            return b''
+        # the bytes are already buffered, so a plain read returns at once
+        # and skips the executor round trip of read_async()
+        return self._serial.read(waiting)
+
     async def write(self, data: bytes) -> int:
         """Write data to serial port"""
         if not self._serial:
             raise RuntimeError("Serial port not opened")
         return await self._serial.write_async(data)
-    
-    
\ No newline at end of file
+
+    @property
+    def event_driven(self) -> bool:
+        """True if a readiness callback is registered on the port"""
+        return self._reader_fd is not None
+
+    def add_reader(self, callback: Callable[[], None]) -> bool:
+        """
+        Register a readiness callback on the serial port file descriptor.
+        The running event loop calls callback whenever bytes are waiting,
+        so the caller can sleep until then instead of polling has_data().
+        Args:
+            callback: Called with no arguments from the event loop
+        Returns:
+            True if registered, False if the loop cannot watch the port
+            (e.g. the Windows proactor loop), in which case poll as before
+        """
+        if not self._serial:
+            raise RuntimeError("Serial port not opened")
+        self.remove_reader()
+        try:
+            fd = self._serial.fileno()
+            asyncio.get_running_loop().add_reader(fd, callback)
+        except (AttributeError, NotImplementedError, OSError) as e:
+            logging.info(f"Event-driven serial I/O unavailable: {str(e)}")
+            return False
+        self._reader_fd = fd
+        return True
+
+    def remove_reader(self) -> None:
+        """Unregister the readiness callback, if any"""
+        if self._reader_fd is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._reader_fd)
+        except RuntimeError:
+            pass  # the event loop is gone and took the callback with it
+        self._reader_fd = None
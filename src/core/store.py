@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Message history on disk.
+#
+# Messages sent and received are appended to a log file, and the offset
+# of each record to an index file beside it, <log>.idx, 8 bytes per
+# record. The index is memory-mapped for reading, so record n is found
+# with one lookup at n * 8 whatever the size of the log: paging back
+# through history, or showing the last screenful at startup, costs the
+# same for a log of a hundred records as for one of a hundred million.
+#
+# A log record is
+#
+#   length(4) crc32(4) time(8, float) flags(1) radio(1) addr(2) rssi(2) snr(1) text
+#
+# little-endian, where length counts from time to the end of the text and
+# the CRC covers the same bytes. addr is who sent a message we received,
+# or where we sent one; rssi and snr are 0 for those.
+#
+# Records reach the OS as they are appended, but fsync, which waits for
+# the disk, runs once per SYNC_EVERY records or SYNC_INTERVAL seconds.
+# A crash may lose the last few records, or leave one torn in half; on
+# opening, the index is brought into line with the log and a torn record
+# at the end is cut off. Only the records after the last indexed one are
+# read to do that.
+
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+PREFIX = struct.Struct('<II')       # length, crc32
+FIELDS = struct.Struct('<dBBHhb')   # time, flags, radio, addr, rssi, snr
+OFFSET = struct.Struct('<Q')
+
+SENT = 0x01  # flags: we sent it; otherwise we received it
+
+
+@dataclass
+class Message:
+    """One message, sent or received"""
+    time: float     # seconds since the epoch
+    sent: bool
+    radio: int      # which radio, numbered from 1
+    addr: int       # the other end
+    text: str
+    rssi: int = 0
+    snr: int = 0
+
+
+class MessageStore:
+    """Append-only message log with a memory-mapped offset index"""
+
+    SYNC_EVERY = 32       # records between fsyncs, at most
+    SYNC_INTERVAL = 1.0   # seconds between fsyncs, at most, while appending
+
+    def __init__(self, path: str, sync_every: int = SYNC_EVERY,
+                 sync_interval: float = SYNC_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Open the log at path and its index, creating them if need be.
+        Raises:
+            OSError if the files cannot be opened
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self._log = open(path, 'a+b')
+        self._idx = open(path + '.idx', 'a+b')
+        self._map: Optional[mmap.mmap] = None
+        self._mapped = 0      # records the map covers
+        self._unsynced = 0
+        self._synced_at = clock()
+        self._count = self._recover()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, n: int) -> Message:
+        """Record n, counting from 0; negative n counts from the end"""
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError(n)
+        self._log.seek(self._offset(n))
+        message = self._read()
+        if message is None:
+            raise ValueError(f"{self.path}: record {n} is damaged")
+        return message
+
+    def last(self, count: int) -> List[Message]:
+        """The last count records, oldest first"""
+        return self.range(max(0, self._count - count), self._count)
+
+    def range(self, start: int, stop: int) -> List[Message]:
+        """Records start to stop - 1, oldest first"""
+        return [self[n] for n in range(max(0, start), min(stop, self._count))]
+
+    def append(self, message: Message) -> int:
+        """
+        Add a message at the end.
+        Returns:
+            Its record number
+        """
+        text = message.text.encode('utf8')
+        body = FIELDS.pack(message.time, SENT if message.sent else 0, message.radio & 0xFF,
+                           message.addr & 0xFFFF, _clamp(message.rssi, 0x7FFF),
+                           _clamp(message.snr, 0x7F)) + text
+        self._log.seek(0, os.SEEK_END)
+        offset = self._log.tell()
+        self._log.write(PREFIX.pack(len(body), zlib.crc32(body)) + body)
+        self._log.flush()
+        # the index entry after the record, so that it never points past the log
+        self._idx.write(OFFSET.pack(offset))
+        self._idx.flush()
+        self._count += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every \
+                or self.clock() - self._synced_at >= self.sync_interval:
+            self.sync()
+        return self._count - 1
+
+    def sync(self) -> None:
+        """Wait until everything appended is on the disk"""
+        if self._unsynced:
+            os.fsync(self._log.fileno())
+            os.fsync(self._idx.fileno())
+            self._unsynced = 0
+        self._synced_at = self.clock()
+
+    def close(self) -> None:
+        if self._log.closed:
+            return
+        self.sync()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._log.close()
+        self._idx.close()
+
+    def _offset(self, n: int) -> int:
+        if n >= self._mapped:
+            # the index has grown since it was mapped
+            if self._map is not None:
+                self._map.close()
+            self._mapped = self._count
+            self._map = mmap.mmap(self._idx.fileno(), self._mapped * OFFSET.size,
+                                  access=mmap.ACCESS_READ)
+        return OFFSET.unpack_from(self._map, n * OFFSET.size)[0]
+
+    def _read(self) -> Optional[Message]:
+        """The record at the log's position, None if it is torn or damaged"""
+        prefix = self._log.read(PREFIX.size)
+        if len(prefix) < PREFIX.size:
+            return None
+        length, crc = PREFIX.unpack(prefix)
+        body = self._log.read(length)
+        if length < FIELDS.size or len(body) < length or zlib.crc32(body) != crc:
+            return None
+        t, flags, radio, addr, rssi, snr = FIELDS.unpack_from(body)
+        return Message(t, bool(flags & SENT), radio, addr,
+                       str(body[FIELDS.size:], 'utf8', errors='replace'), rssi, snr)
+
+    def _recover(self) -> int:
+        """Bring the index into line with the log; returns the count"""
+        log_size = self._log.seek(0, os.SEEK_END)
+        idx_size = self._idx.seek(0, os.SEEK_END)
+        count = idx_size // OFFSET.size
+        if idx_size % OFFSET.size:
+            self._idx.truncate(count * OFFSET.size) # a torn entry
+        # entries for records the log lost go
+        end = 0
+        while count:
+            self._idx.seek((count - 1) * OFFSET.size)
+            offset, = OFFSET.unpack(self._idx.read(OFFSET.size))
+            self._log.seek(offset)
+            if offset < log_size and self._read() is not None:
+                end = self._log.tell()
+                break
+            count -= 1
+        self._idx.truncate(count * OFFSET.size)
+        self._idx.seek(0, os.SEEK_END)
+        # records the index missed are indexed; a torn one is cut off
+        self._log.seek(end)
+        while end < log_size:
+            if self._read() is None:
+                logging.info(f"{self.path}: {log_size - end} bytes of a torn record cut off")
+                self._log.truncate(end)
+                break
+            self._idx.write(OFFSET.pack(end))
+            count += 1
+            end = self._log.tell()
+        self._idx.flush()
+        return count
+
+
+def _clamp(value: int, limit: int) -> int:
+    return max(-limit - 1, min(limit, value))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Where the time goes between a byte arriving and the screen showing it.
+#
+# A received message passes through stages, each timed with
+# perf_counter_ns:
+#
+#   wake      the port becomes readable, until the loop gets round to it
+#   read      the read from the port
+#   parse     the parser turning bytes into responses
+#   dispatch  the handlers acting on the responses
+#   render    the display flushing the changes to the terminal
+#   total     from the first byte waiting to the flush that shows it
+#
+# Each stage has a histogram of power-of-two buckets: a duration of n ns
+# goes in bucket n.bit_length(), which takes no search and no division,
+# and 64 buckets cover any duration. A percentile is known to within a
+# factor of two, which is what telling a 50 µs parse from a 5 ms
+# doupdate() needs.
+#
+# Tracing is off unless a front end makes a Tracer and hands it out; off,
+# the cost on the hot path is a test for None at each stage.
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+BUCKETS = 64
+
+
+class StageHistogram:
+    """Durations in ns, in power-of-two buckets"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns: int) -> None:
+        self.counts[min(ns.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p: float) -> int:
+        """The upper bound of the bucket holding the p-th percentile, ns"""
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(1 << bucket, self.max) # the bound may overstate a lone maximum
+        return self.max
+
+
+class Tracer:
+    """Per-stage latency histograms for the receive path"""
+
+    STAGES = ('wake', 'read', 'parse', 'dispatch', 'render', 'total')
+
+    def __init__(self, clock: Callable[[], int] = time.perf_counter_ns):
+        self.clock = clock
+        self.stages: Dict[str, StageHistogram] = {stage: StageHistogram() for stage in self.STAGES}
+        self.arrival = 0  # ns when the first byte not yet on screen was seen, 0 if none
+        self.pending = 0  # ns when the port became readable, 0 once read
+
+    def arrived(self) -> None:
+        """A port has bytes waiting: call from the readiness callback"""
+        if not self.pending:
+            self.pending = self.clock()
+            if not self.arrival:
+                self.arrival = self.pending
+
+    def lap(self, stage: str, start: int) -> int:
+        """Add the time from start to now to stage; returns now"""
+        now = self.clock()
+        self.stages[stage].add(now - start)
+        return now
+
+    def woken(self) -> int:
+        """The loop is about to read: note how long it took to get here; returns now"""
+        if not self.pending:
+            self.arrived() # polled, not called back: it arrived just now
+        start = self.lap('wake', self.pending)
+        self.pending = 0
+        return start
+
+    def shown(self) -> None:
+        """What arrived is on screen, or handled if there is no screen"""
+        if self.arrival:
+            self.lap('total', self.arrival)
+            self.arrival = 0
+
+    def report(self) -> str:
+        """A table of the stages, in µs"""
+        lines: List[str] = [f"{'stage':<9} {'count':>8} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+        for stage, h in self.stages.items():
+            if not h.count:
+                lines.append(f"{stage:<9} {0:>8}")
+                continue
+            lines.append(f"{stage:<9} {h.count:>8} {h.total / h.count / 1000:>9.1f} "
+                         f"{h.percentile(50) / 1000:>9.1f} {h.percentile(90) / 1000:>9.1f} "
+                         f"{h.percentile(99) / 1000:>9.1f} {h.max / 1000:>9.1f}")
+        return '\n'.join(lines)
+
+    def dump(self, path: str) -> None:
+        """
+        Append the report to path, with the time.
+        Raises:
+            OSError if path cannot be written
+        """
+        with open(path, 'a') as f:
+            f.write(f"# {datetime.now().isoformat(timespec='seconds')} latency in µs, "
+                    f"percentiles to within a factor of 2\n{self.report()}\n\n")
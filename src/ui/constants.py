@@ -28,6 +28,8 @@ class RadioLimits:
     MIN_PREAMBLE: Final[int] = 4
     MAX_PREAMBLE: Final[int] = 25
     DEFAULT_PREAMBLE: Final[int] = 12
+    MIN_DUTY: Final[int] = 0      # percent, exclusive
+    MAX_DUTY: Final[int] = 100
 
 @dataclass(frozen=True)
 class WindowSize:
@@ -75,9 +77,9 @@ class StatusLabels:
     SNR_VAL_COL: Final[int] = 36
 
     # Row 2: Settings display and formats
-    STATUS_ROW2_VFO: Final[int] = 20    # Space for "VFO 915000000"
+    STATUS_ROW2_VFO: Final[int] = 19    # Space for "VFO 915000000"
     STATUS_ROW2_PWR: Final[int] = 8     # Space for "PWR 22"
-    STATUS_ROW2_NETID: Final[int] = 12  # Space for "NETWORK ID 18"
+    STATUS_ROW2_NETID: Final[int] = 13  # Space for "NETWORK ID 18"
     
     VFO_FULL_LABEL: Final[str] = "VFO {}"       # For formatting with frequency
     PWR_FULL_LABEL: Final[str] = "PWR {}"       # For formatting with power
@@ -145,6 +147,7 @@ class RadioDefaults:
     BW: Final[str] = '7'      # Bandwidth (7=125kHz, 8=250kHz, 9=500kHz)
     CR: Final[str] = '1'      # Coding rate
     PREAMBLE: Final[str] = '12'
+    DUTY: Final[str] = '100'  # percent of the time the radio may transmit
 
 @dataclass(frozen=True)
 class SerialDefaults:
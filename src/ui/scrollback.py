@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+#
+# Scrollback for the receive window.
+#
+# The receive window is 20 rows of 40 columns, and curses forgets what
+# scrolls off the top. Scrollback keeps the rows instead, the last SIZE
+# of them, in a ring of fixed size, so memory stays bounded however long
+# the program runs. A row is numbered from the first ever appended, and
+# row n lives in slot n % SIZE: any row, and so any page, is found in
+# O(1), and drawing a page touches only the rows on it.
+#
+# A message longer than a row is wrapped into several, as curses wraps
+# it. The view is an offset back from the newest row; 0 follows what
+# arrives. Scrolled back, the view stays on its rows as others arrive.
+#
+# Search goes through a trigram index: each row's lowercased text is cut
+# into the three-character strings it contains, and each trigram has an
+# array of the rows that hold it, in order. Looking for "fox jump" reads
+# the array of its rarest trigram, from the starting row backwards, and
+# checks only those rows, rather than every row held. The arrays name
+# rows that have left the ring as well; a search skips them with a
+# bisect, and they are trimmed each time another half SIZE rows go by.
+# A match must lie within one row.
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+Row = Tuple[str, int]  # text, color pair
+
+
+def trigrams(text: str) -> set:
+    return {text[n:n + 3] for n in range(len(text) - 2)}
+
+
+class Scrollback:
+    """The last rows of the receive window, a view onto them, and search"""
+
+    SIZE = 100_000  # rows kept
+    ROWS = 20       # rows in view
+    WIDTH = 40      # columns in a row
+
+    def __init__(self, size: int = SIZE, rows: int = ROWS, width: int = WIDTH):
+        self.size = size
+        self.rows = rows
+        self.width = width
+        self._text: List[str] = [''] * size
+        self._color = array('B', bytes(size))
+        self.appended = 0  # rows ever appended
+        self.offset = 0    # rows the view is scrolled back from the newest
+        self._index: Dict[str, array] = {}
+        self._trimmed = 0  # the oldest row held when the index was last trimmed
+
+    def __len__(self) -> int:
+        return min(self.appended, self.size)
+
+    @property
+    def oldest(self) -> int:
+        """The number of the oldest row held"""
+        return self.appended - len(self)
+
+    @property
+    def following(self) -> bool:
+        """True if the view shows the newest rows"""
+        return self.offset == 0
+
+    def row(self, n: int) -> Row:
+        """
+        Row n, numbered from the first appended.
+        Raises:
+            IndexError if row n is not held
+        """
+        if not self.oldest <= n < self.appended:
+            raise IndexError(n)
+        return self._text[n % self.size], self._color[n % self.size]
+
+    def append(self, text: str, color: int = 0) -> int:
+        """
+        Add a message, wrapped into rows.
+        Returns:
+            The number of rows it took
+        """
+        pieces = [text[n:n + self.width] for n in range(0, len(text), self.width)] or ['']
+        for piece in pieces:
+            n = self.appended
+            self._text[n % self.size] = piece
+            self._color[n % self.size] = color
+            for trigram in trigrams(piece.lower()):
+                rows = self._index.get(trigram)
+                if rows is None:
+                    rows = self._index[trigram] = array('I')
+                rows.append(n)
+            self.appended += 1
+        if self.offset:
+            # scrolled back: keep the same rows in view, while they last
+            self.offset = min(self.offset + len(pieces), self._bottom_limit())
+        if self.oldest - self._trimmed >= self.size // 2:
+            self._trim()
+        return len(pieces)
+
+    def _bottom_limit(self) -> int:
+        return max(0, len(self) - self.rows)
+
+    def _trim(self) -> None:
+        """Drop the rows that have left the ring from the index"""
+        oldest = self.oldest
+        for trigram in list(self._index):
+            rows = self._index[trigram]
+            start = bisect_left(rows, oldest)
+            if start == len(rows):
+                del self._index[trigram]
+            elif start:
+                del rows[:start]
+        self._trimmed = oldest
+
+    def page(self) -> List[Row]:
+        """The rows in view, oldest first"""
+        stop = self.appended - self.offset
+        start = max(self.oldest, stop - self.rows)
+        return [self.row(n) for n in range(start, stop)]
+
+    @property
+    def first(self) -> int:
+        """The number of the top row in view"""
+        return max(self.oldest, self.appended - self.offset - self.rows)
+
+    def scroll(self, rows: int) -> bool:
+        """Scroll back rows, forward if negative. Returns True if the view moved"""
+        offset = max(0, min(self.offset + rows, self._bottom_limit()))
+        moved = offset != self.offset
+        self.offset = offset
+        return moved
+
+    def page_up(self) -> bool:
+        return self.scroll(self.rows - 1) # one row of the page before stays, for context
+
+    def page_down(self) -> bool:
+        return self.scroll(1 - self.rows)
+
+    def bottom(self) -> bool:
+        return self.scroll(-self.offset)
+
+    def show(self, n: int) -> None:
+        """Scroll so that row n is in view, in the middle if it can be"""
+        self.offset = 0
+        self.scroll(self.appended - 1 - n - self.rows // 2)
+
+    def search(self, query: str, before: Optional[int] = None) -> Optional[int]:
+        """
+        Find the newest row before row before, or before the end, holding
+        query, whatever the case.
+        Returns:
+            The row number, None if no row held has it
+        """
+        query = query.lower()
+        stop = self.appended if before is None else min(before, self.appended)
+        if not query or stop <= self.oldest:
+            return None
+        if len(query) < 3:
+            candidates = range(stop - 1, self.oldest - 1, -1)
+        else:
+            postings = []
+            for trigram in trigrams(query):
+                rows = self._index.get(trigram)
+                if rows is None:
+                    return None
+                postings.append(rows)
+            rows = min(postings, key=len)
+            low = bisect_left(rows, self.oldest)
+            candidates = (rows[k] for k in range(bisect_left(rows, stop) - 1, low - 1, -1))
+        for n in candidates:
+            if query in self._text[n % self.size].lower():
+                return n
+        return None
@@ -1,154 +1,180 @@
 #!/usr/bin/env python3
 # -*- coding: utf8 -*-
+#
+# The widgets of the urwid front end, urwid998.py.
+#
+# The frame is the three boxes the curses UI draws: the messages, the
+# status and the line being typed. Nothing here polls or draws:
+#
+#   - a message is a Text appended to the receive box's SimpleListWalker.
+#     The ListBox renders only the rows in view, however many the walker
+#     holds, and follows the newest unless scrolled back. The walker
+#     keeps the last MAX_LINES.
+#   - what the status box shows lives in a Status, which emits 'change'
+#     with the field and its value when a field changes. The frame is
+#     connected to it and sets the one Text the field is shown in; a
+#     field set to the value it has emits nothing, so a burst of frames
+#     from the same address leaves the ADDR widget alone.
+#
+# urwid draws the screen after a key by itself; the front end calls
+# MainLoop.draw_screen() for the rest, and urwid renders again only the
+# widgets that changed.
 
 import urwid
-from src.ui.constants import (
-    WindowSize, StatusLabels, WindowPosition, ColorPair, BorderPos, RadioDefaults
-)
-
-def create_frame():
-    """Create the main application frame with three panels"""
-    
-    # Create receive area
-    receive_content = urwid.Text("Receive Area")
-    receive_area = urwid.Filler(receive_content, 'top', top=WindowPosition.RX_START_ROW)
-    receive_box = urwid.LineBox(
-        receive_area,
-        title="Messages",
-        tline='═',
-        bline='═',
-        lline='║',
-        rline='║',
-        tlcorner='╔',
-        trcorner='╗',
-        blcorner='╚',
-        brcorner='╝'
-    )
-    
-    # Status window with proper layout
-    status_row1 = urwid.Columns([
-        ('fixed', StatusLabels.TXRX_LEN, urwid.Text(StatusLabels.TXRX_LABEL)),
-        ('fixed', 1, urwid.Text("│")),
-        ('fixed', StatusLabels.ADDR_LEN + 7, urwid.Text(StatusLabels.ADDR_LABEL)),
-        ('fixed', 1, urwid.Text("│")),
-        ('fixed', StatusLabels.RSSI_LEN + 6, urwid.Text(StatusLabels.RSSI_LABEL)),
-        ('fixed', 1, urwid.Text("│")),
-        ('fixed', StatusLabels.SNR_LEN + 5, urwid.Text(StatusLabels.SNR_LABEL))
-    ])
-
-    divider = urwid.Divider('─')
-
-    # Use the format strings from StatusLabels
-    status_row2 = urwid.Columns([
-        ('fixed', StatusLabels.STATUS_ROW2_VFO, 
-            urwid.Text(StatusLabels.VFO_FULL_LABEL.format(RadioDefaults.FREQ))),
-        ('fixed', StatusLabels.STATUS_ROW2_PWR,
-            urwid.Text(StatusLabels.PWR_FULL_LABEL.format(RadioDefaults.POWER))),
-        ('fixed', StatusLabels.STATUS_ROW2_NETID,
-            urwid.Text(StatusLabels.NETID_FULL_LABEL.format(RadioDefaults.NETID)))
-    ])
-
-    status_pile = urwid.Pile([
-        status_row1,
-        divider,
-        status_row2
-    ])
-
-    status_box = urwid.LineBox(
-        urwid.Filler(status_pile, 'middle'),
-        title="Status",
-        tline='═',
-        bline='═',
-        lline='║',
-        rline='║',
-        tlcorner='╔',
-        trcorner='╗',
-        blcorner='╚',
-        brcorner='╝'
-    )
-    
-    # Transmit area
-    transmit_edit = urwid.Edit("")
-    transmit_area = urwid.Filler(transmit_edit)
-    transmit_box = urwid.LineBox(
-        transmit_area,
-        title="Transmit",
-        tline='═',
-        bline='═',
-        lline='║',
-        rline='║',
-        tlcorner='╔',
-        trcorner='╗',
-        blcorner='╚',
-        brcorner='╝'
-    )
+from typing import Callable, Dict, Optional
+from src.ui.constants import WindowSize, StatusLabels
 
-    # Create the main pile with spacing
-    main_pile = urwid.Pile([
-        # Messages window
-        ('fixed', WindowSize.RX_HEIGHT, receive_box),
-        # Space between receive and status
-        ('fixed', 1, urwid.Filler(urwid.Divider())),
-        # Status window with proper height
-        ('fixed', WindowSize.ST_HEIGHT, status_box),
-        # Space between status and transmit
-        ('fixed', 1, urwid.Filler(urwid.Divider())),
-        # Transmit window
-        ('fixed', WindowSize.TX_HEIGHT, transmit_box)
-    ])
-
-    # Wrap pile in Columns for fixed width
-    main_cols = urwid.Columns([
-        ('fixed', WindowSize.MAX_COL, main_pile)
-    ])
-
-    # Create final frame
-    frame = urwid.Frame(
-        body=main_cols,
-        header=None,
-        footer=None,
-        focus_part='body'
-    )
+LINES = dict(tline='═', bline='═', lline='║', rline='║',
+             tlcorner='╔', trcorner='╗', blcorner='╚', brcorner='╝')
+
+PALETTE = [
+    ('default',    'light gray', 'black'),
+    ('status',     'white',      'dark blue'),
+    ('receive',    'light cyan', 'black'),
+    ('transmit',   'yellow',     'black'),
+    ('error',      'light red',  'black'),
+    ('border',     'white',      'black'),
+    ('lora_tx',    'white',      'dark red'),
+    ('lora_rx',    'white',      'dark green')
+]
+
+
+class Status(metaclass=urwid.MetaSignals):
+    """What the status box shows; emits 'change' with the field and value"""
+
+    signals = ['change']
+    FIELDS = ('txrx', 'addr', 'rssi', 'snr', 'band', 'pwr', 'netid')
+
+    def __init__(self):
+        self.values: Dict[str, str] = dict.fromkeys(self.FIELDS, '')
+
+    def set(self, **fields: str) -> None:
+        """
+        Update fields, announcing those whose value changed.
+        Args:
+            fields: Values by field name; txrx is '', 'tx' or 'rx'
+        Raises:
+            KeyError if a name is not in FIELDS
+        """
+        for name, value in fields.items():
+            if self.values[name] != value:
+                self.values[name] = value
+                urwid.emit_signal(self, 'change', name, value)
+
+
+class RadioFrame:
+    """The frame's widgets, showing the messages added and a Status"""
+
+    MAX_LINES = 1000  # messages the receive box keeps
+
+    # how each status field is shown
+    LABELS = {
+        'addr':  StatusLabels.ADDR_LABEL,
+        'rssi':  StatusLabels.RSSI_LABEL,
+        'snr':   StatusLabels.SNR_LABEL,
+        'band':  StatusLabels.VFO_LABEL,
+        'pwr':   StatusLabels.PWR_LABEL,
+        'netid': StatusLabels.NETID_LABEL,
+    }
+    TXRX = {'': 'default', 'tx': 'lora_tx', 'rx': 'lora_rx'}
 
-    return frame
-
-def initialize_display(event_loop):
-    """Initialize the urwid display with our frame"""
-    
-    # Define color palette based on ColorPair enum
-    palette = [
-        ('default',    'light gray', 'black'),
-        ('status',     'white',      'dark blue'),
-        ('receive',    'light cyan', 'black'),
-        ('transmit',   'yellow',     'black'),
-        ('border',     'white',      'black'),
-        ('lora_tx',    'white',      'dark red'),
-        ('lora_rx',    'white',      'dark green')
-    ]
-
-    # Create frame with fixed dimensions
-    frame = create_frame()
-    
-    # Handle input (temporary)
-    def handle_input(key):
-        if key in ('q', 'Q'):
-            raise urwid.ExitMainLoop()
-        return True
+    def __init__(self, status: Status, max_lines: int = MAX_LINES):
+        self.status = status
+        self.max_lines = max_lines
+        self.messages = urwid.SimpleListWalker([])
+        self.listbox = urwid.ListBox(self.messages)
+        self.fields = {name: urwid.Text(self.LABELS.get(name, StatusLabels.TXRX_LABEL), wrap='clip')
+                       for name in Status.FIELDS}
+        self.edit = urwid.Edit('')
+        self.widget = self.create_frame()
+        urwid.connect_signal(status, 'change', self.on_change)
+
+    @property
+    def following(self) -> bool:
+        """True if the receive box shows the newest message"""
+        return self.messages.focus is None or self.messages.focus == len(self.messages) - 1
+
+    def add(self, text: str, attr: str = 'default') -> None:
+        """Add a message to the receive box, dropping the oldest past max_lines"""
+        following = self.following
+        self.messages.append(urwid.Text((attr, text)))
+        excess = len(self.messages) - self.max_lines
+        if excess > 0:
+            del self.messages[:excess]
+        if following:
+            self.bottom()
+
+    def bottom(self) -> None:
+        """Show the newest messages"""
+        if self.messages:
+            self.listbox.set_focus(len(self.messages) - 1, coming_from='above')
+
+    def scroll(self, key: str) -> None:
+        """Page the receive box: key is 'page up' or 'page down'"""
+        self.listbox.keypress((WindowSize.RX_WIDTH, WindowSize.RX_HEIGHT - 2), key)
+
+    def on_change(self, name: str, value: str) -> None:
+        if name == 'txrx':
+            self.fields[name].set_text((self.TXRX[value], StatusLabels.TXRX_LABEL))
+        else:
+            self.fields[name].set_text([f"{self.LABELS[name]} ", ('receive', value)])
+
+    def create_frame(self) -> urwid.Frame:
+        """Lay the widgets out in the three panels"""
+        receive_box = urwid.LineBox(self.listbox, title="Messages", **LINES)
+
+        fields = self.fields
+        status_row1 = urwid.Columns([
+            ('fixed', StatusLabels.TXRX_LEN, fields['txrx']),
+            ('fixed', 1, urwid.Text("│")),
+            ('fixed', StatusLabels.ADDR_LEN + 7, fields['addr']),
+            ('fixed', 1, urwid.Text("│")),
+            ('fixed', StatusLabels.RSSI_LEN + 6, fields['rssi']),
+            ('fixed', 1, urwid.Text("│")),
+            ('fixed', StatusLabels.SNR_LEN + 5, fields['snr'])
+        ])
+        divider = urwid.Divider('─')
+        status_row2 = urwid.Columns([
+            ('fixed', StatusLabels.STATUS_ROW2_VFO, fields['band']),
+            ('fixed', StatusLabels.STATUS_ROW2_PWR, fields['pwr']),
+            ('fixed', StatusLabels.STATUS_ROW2_NETID, fields['netid'])
+        ])
+        status_pile = urwid.Pile([status_row1, divider, status_row2])
+        status_box = urwid.LineBox(urwid.Filler(status_pile, 'middle'), title="Status", **LINES)
+
+        transmit_box = urwid.LineBox(urwid.Filler(self.edit), title="Transmit", **LINES)
+
+        # the boxes with their borders fill the MAX_ROW rows; typing goes
+        # to the transmit box
+        main_pile = urwid.Pile([
+            ('fixed', WindowSize.RX_HEIGHT, receive_box),
+            ('fixed', WindowSize.ST_HEIGHT + 1, status_box),
+            ('fixed', WindowSize.TX_HEIGHT + 2, transmit_box)
+        ], focus_item=2)
+
+        # Wrap pile in Columns for fixed width
+        main_cols = urwid.Columns([
+            ('fixed', WindowSize.MAX_COL, main_pile)
+        ])
+        return urwid.Frame(body=main_cols, header=None, footer=None, focus_part='body')
+
+
+def initialize_display(widget: urwid.Widget, event_loop: urwid.EventLoop,
+                       unhandled_input: Optional[Callable[[str], Optional[bool]]] = None) -> urwid.MainLoop:
+    """The MainLoop showing widget, on event_loop"""
 
     # Initialize the screen and handle unsupported color depths
     screen = urwid.raw_display.Screen()
-    
+
     try:
         screen.set_terminal_properties(colors=256)
     except KeyError as e:
         print(f"Unsupported terminal color depth. Using default colors: {e}")
 
-    main_loop = urwid.MainLoop(
-        widget=frame,
-        palette=palette,
+    return urwid.MainLoop(
+        widget=widget,
+        palette=PALETTE,
         event_loop=event_loop,
-        unhandled_input=handle_input,
+        unhandled_input=unhandled_input,
         screen=screen
     )
-
-    return main_loop
\ No newline at end of file
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import random
+
+import pytest
+
+from src.core.airtime import airtime, parameter_airtime, time_on_air
+
+
+def test_known_values():
+    # SF7, 125 kHz, 4/5, preamble 8, 10 bytes: the figure Semtech's calculator gives
+    assert time_on_air(7, 7, 1, 8, 10) == pytest.approx(0.041216)
+    # the RYLR998 default, 9,7,1,12
+    assert time_on_air(9, 7, 1, 12, 10) == pytest.approx(0.160768)
+    # SF11 at 125 kHz has 16.384 ms symbols: low data rate optimization
+    assert time_on_air(11, 7, 1, 12, 0) == pytest.approx(0.397312)
+
+def test_table_matches_formula():
+    rng = random.Random(998)
+    for _ in range(2000):
+        args = (rng.randint(7, 11), rng.randint(7, 9), rng.randint(1, 4),
+                rng.randint(4, 25), rng.randint(0, 240))
+        assert airtime(*args) == pytest.approx(time_on_air(*args), abs=1e-12)
+
+def test_longer_is_slower():
+    assert airtime(9, 7, 1, 12, 240) > airtime(9, 7, 1, 12, 40) > airtime(9, 8, 1, 12, 40)
+    assert parameter_airtime('9,7,1,12', 10) == airtime(9, 7, 1, 12, 10)
+
+def test_out_of_range():
+    with pytest.raises(ValueError):
+        airtime(12, 7, 1, 12, 10)
+    with pytest.raises(ValueError):
+        airtime(9, 7, 1, 12, 241)
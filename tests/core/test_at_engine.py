@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+import pytest
+
+from src.core.at_engine import ATCommandEngine, CommandTimeout, format_command
+from src.core.protocol import Err, Ok, ParamReport, RcvFrame, parse_line
+
+
+class Module:
+    """Answers each write with the next canned reply, or not at all"""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.written = []
+        self.engine = ATCommandEngine(self.write, timeout=0.05)
+
+    async def write(self, data: bytes) -> int:
+        self.written.append(data)
+        reply = self.replies.pop(0)
+        if reply is not None:
+            asyncio.get_running_loop().call_soon(self.engine.on_event, parse_line(reply))
+        return len(data)
+
+
+def test_format_command():
+    assert format_command('BAND=915000000') == b'AT+BAND=915000000\r\n'
+    assert format_command(b'SEND=0,1,\xff') == b'AT+SEND=0,1,\xff\r\n'
+    assert format_command('') == b'AT\r\n'
+
+def test_replies_in_order():
+    """Concurrent senders each get the reply to their own command"""
+    module = Module([b'+OK', b'+BAND=915000000', b'+ERR=4'])
+    async def run():
+        return await asyncio.gather(module.engine.send('ADDRESS=1'),
+                                    module.engine.send('BAND?'),
+                                    module.engine.send('NONSENSE'))
+    assert asyncio.run(run()) == [Ok(), ParamReport('BAND', '915000000'), Err(4)]
+    assert module.written == [b'AT+ADDRESS=1\r\n', b'AT+BAND?\r\n', b'AT+NONSENSE\r\n']
+    assert module.engine.metrics.replies == 3
+    assert module.engine.metrics.errors == 1
+
+def test_retry_busy_and_lost():
+    """+ERR=17 and a lost reply are retried"""
+    module = Module([b'+ERR=17', None, b'+OK'])
+    module.engine.RETRY_DELAY = 0
+    assert asyncio.run(module.engine.send('ADDRESS=1')) == Ok()
+    assert len(module.written) == 3
+    assert module.engine.metrics.retries == 2
+
+def test_send_retried_only_when_busy():
+    """A SEND is sent again after +ERR=17, not after a lost +OK"""
+    module = Module([b'+ERR=17', b'+OK'])
+    module.engine.RETRY_DELAY = 0
+    assert asyncio.run(module.engine.send('SEND=0,2,hi', priority=ATCommandEngine.DATA)) == Ok()
+    assert len(module.written) == 2
+    module = Module([None, b'+OK'])
+    with pytest.raises(CommandTimeout):
+        asyncio.run(module.engine.send('SEND=0,2,hi'))
+    assert len(module.written) == 1 and module.engine.metrics.timeouts == 1
+
+def test_timeout():
+    module = Module([None, None])
+    with pytest.raises(CommandTimeout):
+        asyncio.run(module.engine.send('VER?', retries=1))
+    assert module.engine.metrics.timeouts == 1
+
+def test_cancelled_caller_leaves_the_engine_working():
+    """A caller giving up while its command is in flight does not stop the engine"""
+    async def run():
+        loop = asyncio.get_running_loop()
+        replies = [b'+VER=RYLR998_REYAX_V1.2.2', None, b'+ADDRESS=7']
+        async def write(data: bytes) -> int:
+            reply = replies.pop(0)
+            if reply is not None:
+                loop.call_later(0.02, engine.on_event, parse_line(reply))  # answered late
+            return len(data)
+        engine = ATCommandEngine(write, timeout=0.05)
+        caller = asyncio.create_task(engine.send('VER?'))
+        await asyncio.sleep(0.01)  # written, not yet answered
+        caller.cancel()
+        await asyncio.sleep(0.03)  # the answer comes all the same
+        timed_out = asyncio.create_task(engine.send('ADDRESS=7', timeout=0.005, retries=0))
+        await asyncio.sleep(0.001)
+        timed_out.cancel()  # and a timeout for a caller gone
+        result = await asyncio.wait_for(engine.send('ADDRESS?'), 1.0)
+        engine.close()
+        return caller, result
+    caller, result = asyncio.run(run())
+    assert caller.cancelled()
+    assert result == ParamReport('ADDRESS', '7')
+
+def test_received_packets_are_not_replies():
+    engine = ATCommandEngine(None)
+    assert not engine.on_event(RcvFrame(1, 0, memoryview(b''), -40, 11))
+    assert not engine.on_event(Ok())  # nothing in flight
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import random
+
+from src.core.compress import decode, encode
+from src.core.payload import Fragmenter, PayloadType, Reassembler
+
+
+def test_short_text_stays_plain():
+    assert encode(b'hi') == b'hi'
+    assert encode(b'hello there, how are you?', compress=False) == b'hello there, how are you?'
+
+def test_chat_compresses():
+    msg = b'CQ CQ CQ DE N0CALL N0CALL K'
+    body = encode(msg)
+    assert body[0] == PayloadType.COMPRESSED
+    assert len(body) < len(msg)
+    assert decode(body) == msg
+
+def test_control_bytes_always_marked():
+    msg = b'\x02not compressed, honest'
+    body = encode(msg, compress=False)
+    assert body[0] == PayloadType.COMPRESSED
+    assert decode(body) == msg
+
+def test_garbage_is_refused():
+    assert decode(bytes((PayloadType.COMPRESSED,)) + b'\xff\xff\xff') is None
+    assert decode(encode(b'good morning good morning good morning')[:-2]) is None
+    assert decode(b'\x07bell') is None
+
+def test_long_compressed_message_round_trip():
+    rng = random.Random(12)
+    msg = ' '.join(f'station {rng.randrange(10**6)} reports 59 from grid FN{rng.randrange(100):02d}'
+                   for _ in range(40)).encode()
+    body = encode(msg)
+    assert len(body) < len(msg)
+    payloads = Fragmenter().split(body)
+    assert 1 < len(payloads) < len(msg) // 236
+    reassembler = Reassembler()
+    bodies = [reassembler.feed(1, p) for p in payloads]
+    assert decode(bodies[-1]) == msg
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+import json
+
+from src.core.daemon import RadioDaemon
+from src.core.emulator import RYLR998Emulator
+from src.core.radio import Radio
+from src.core.store import MessageStore
+
+PARAMETER = '7,9,1,4'  # the fastest setting
+
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await asyncio.wait_for(reader.readline(), 2))
+
+
+def test_send_subscribe_status(tmp_path):
+    path = str(tmp_path / 'rylr998.sock')
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            radio = Radio(emulator.port, '115200', '7', '915000000', '18', PARAMETER)
+            daemon = RadioDaemon([radio], path)
+            await daemon.start()
+            try:
+                for _ in range(100):
+                    if radio.version:  # VER? is answered
+                        break
+                    await asyncio.sleep(0.01)
+                reader, writer = await asyncio.open_unix_connection(path)
+                reply = await request(reader, writer, {'op': 'send', 'addr': 3, 'text': 'hello', 'id': 1})
+                assert reply == {'ok': True, 'outcome': 'sent', 'id': 1}
+                assert list(emulator.sent) == [(3, b'hello')]
+                assert emulator.settings.ADDRESS == '7'  # configured first
+
+                assert await request(reader, writer, {'op': 'subscribe'}) == {'ok': True}
+                emulator.inject_rcv(b'hi there', addr=5)
+                event = json.loads(await asyncio.wait_for(reader.readline(), 2))
+                assert (event['event'], event['addr'], event['text']) == ('rcv', 5, 'hi there')
+
+                links = (await request(reader, writer, {'op': 'links'}))['links']
+                assert [(link['addr'], link['samples'], link['rssi']) for link in links] == \
+                    [(5, 1, event['rssi'])]
+
+                status = await request(reader, writer, {'op': 'status'})
+                assert status['radios'][0]['addr'] == '7'
+                assert status['radios'][0]['version'] == emulator.settings.VER
+                assert status['radios'][0]['sent'] == 1
+
+                emulator.reject = 5
+                reply = await request(reader, writer, {'op': 'send', 'addr': 3, 'text': 'no'})
+                assert reply == {'ok': True, 'outcome': 'rejected', 'code': 5}
+                assert list(emulator.sent) == [(3, b'hello')]
+
+                reply = await request(reader, writer, {'op': 'send', 'addr': 3, 'radio': 2, 'text': 'x'})
+                assert reply == {'ok': False, 'error': 'radio is 1..1'}
+                reply = await request(reader, writer, {'op': 'jump'})
+                assert not reply['ok']
+                writer.write(b'not json\n')
+                assert not json.loads(await reader.readline())['ok']
+                writer.close()
+                await asyncio.sleep(0.01)
+            finally:
+                daemon.close()
+    asyncio.run(run())
+
+def test_history(tmp_path):
+    path = str(tmp_path / 'rylr998.sock')
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            radio = Radio(emulator.port, '115200', '7', '915000000', '18', PARAMETER)
+            store = MessageStore(str(tmp_path / 'messages.log'))
+            daemon = RadioDaemon([radio], path, store=store)
+            await daemon.start()
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                for n in range(3):
+                    await request(reader, writer, {'op': 'send', 'addr': 3, 'text': f"m{n}"})
+                emulator.inject_rcv(b'reply', addr=3)
+                for _ in range(100):
+                    if len(store) == 4:
+                        break
+                    await asyncio.sleep(0.01)
+                reply = await request(reader, writer, {'op': 'history', 'count': 2})
+                assert reply['total'] == 4
+                assert [(m['index'], m['sent'], m['text']) for m in reply['messages']] == \
+                    [(2, True, 'm2'), (3, False, 'reply')]
+                reply = await request(reader, writer, {'op': 'history', 'count': 5, 'before': 2})
+                assert [m['text'] for m in reply['messages']] == ['m0', 'm1']
+                writer.close()
+                await asyncio.sleep(0.01)
+            finally:
+                daemon.close()
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import pytest
+
+from src.core.dedup import DuplicateCache
+from src.core.payload import PayloadType, relay, unrelay
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def test_repeat_suppressed_until_ttl():
+    clock = Clock()
+    cache = DuplicateCache(ttl=10, clock=clock)
+    assert not cache.seen(1, b'hello')
+    assert cache.seen(1, memoryview(b'hello'))
+    assert not cache.seen(2, b'hello')  # another origin
+    clock.now = 11
+    assert not cache.seen(1, b'hello')
+    assert (cache.metrics.checked, cache.metrics.suppressed) == (4, 1)
+
+def test_bounded():
+    cache = DuplicateCache(size=100)
+    for n in range(1000):
+        cache.seen(1, b'%d' % n)
+    assert len(cache) == 100
+    assert cache.metrics.evicted == 900
+    assert cache.seen(1, b'999') and not cache.seen(1, b'0')
+
+def test_own_messages():
+    cache = DuplicateCache()
+    cache.add(5, b'mine')
+    assert cache.seen(5, b'mine')
+    assert cache.metrics.checked == 1
+
+def test_ping_pong_stops():
+    """Two echoing nodes pass a message back once, not for ever"""
+    a, b = DuplicateCache(), DuplicateCache()
+    a.add(1, b'hi')             # node 1 sends
+    assert not b.seen(1, b'hi')  # node 2 hears it and repeats it
+    origin, hops, payload = unrelay(2, relay(b'hi', 1, 2))
+    assert (origin, hops, payload) == (1, 2, b'hi')
+    assert a.seen(origin, payload)  # node 1 drops it
+
+def test_relay_header():
+    frame = relay(b'x', 65535, 0)
+    assert frame == bytes((PayloadType.RELAY, 0, 0xFF, 0xFF)) + b'x'
+    assert unrelay(3, b'plain') == (3, None, b'plain')
+    with pytest.raises(ValueError):
+        relay(bytes(237), 1, 1)
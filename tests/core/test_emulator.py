@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+import pytest
+
+from src.config.validators import uartcheck
+from src.core.at_engine import ATCommandEngine, CommandTimeout
+from src.core.emulator import RYLR998Emulator
+from src.core.protocol import Err, Factory, Ok, ParamReport, RcvFrame, ResponseParser
+from src.core.serial import SerialManager
+
+
+async def exchange(emulator: RYLR998Emulator, commands, frames: int = 0, inject=()):
+    """Send commands through a SerialManager; collect replies and +RCV frames"""
+    serial = SerialManager(emulator.port, '115200')  # opening flushes input
+    for payload in inject:
+        emulator.inject_rcv(payload, addr=9)
+    parser = ResponseParser()
+    engine = ATCommandEngine(serial.write, timeout=1.0)
+    received = []
+    def on_readable():
+        for event in parser.feed(serial.read_available()):
+            if not engine.on_event(event) and isinstance(event, RcvFrame):
+                received.append(bytes(event.payload))
+    serial.add_reader(on_readable)
+    try:
+        replies = [await engine.send(cmd) for cmd in commands]
+        while len(received) < frames:
+            await asyncio.sleep(0.01)
+    finally:
+        engine.close()
+        serial.close()
+    return replies, received
+
+
+def test_uartcheck_accepts_pty():
+    assert uartcheck('/dev/pts/3') == '/dev/pts/3'
+    assert uartcheck('/dev/ttyUSB0') == '/dev/ttyUSB0'
+
+def test_configure_and_query():
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            return await exchange(emulator, [
+                'ADDRESS=7', 'ADDRESS?', 'PARAMETER=11,9,4,24', 'PARAMETER?',
+                'NETWORKID=19', 'PARAMETER=9,7,1,3', 'MODE=2,10,100', 'UID=1',
+                'FACTORY', 'ADDRESS?', 'VER?', '__class__?', 'lose_ok?'])
+    replies, _ = asyncio.run(run())
+    assert replies == [Ok(), ParamReport('ADDRESS', '7'),
+                       Ok(), ParamReport('PARAMETER', '11,9,4,24'),
+                       Err(4), Err(18), Err(20), Err(4),
+                       Factory(), ParamReport('ADDRESS', '0'),
+                       ParamReport('VER', 'RYLR998_REYAX_V1.2.2'), Err(4), Err(4)]
+
+def test_send():
+    """SEND takes its payload by length, CR LF and all, and checks it"""
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            replies, _ = await exchange(emulator, [b'SEND=3,4,a\r\nb', 'SEND=3,2,short',
+                                                   'SEND=3,241,long', 'ADDRESS?'])
+            return replies, list(emulator.sent)
+    replies, sent = asyncio.run(run())
+    assert replies == [Ok(), Err(5), Err(13), ParamReport('ADDRESS', '0')]
+    assert sent == [(3, b'a\r\nb')]
+
+def test_busy_while_transmitting():
+    async def run():
+        async with RYLR998Emulator(tx_time=0.1) as emulator:
+            serial = SerialManager(emulator.port, '115200')
+            await serial.write(b'AT+SEND=0,1,a\r\nAT+SEND=0,1,b\r\n')
+            await asyncio.sleep(0.2)
+            events = ResponseParser().feed(serial.read_available())
+            serial.close()
+            return events
+    assert asyncio.run(run()) == [Ok(), Err(17)]
+
+def test_injected_frames():
+    async def run():
+        async with RYLR998Emulator(rate=200, payload=b'x,y') as emulator:
+            _, received = await exchange(emulator, ['BAND?'], frames=5, inject=[b'first'])
+            return received
+    received = asyncio.run(run())
+    assert received[0] == b'first'
+    assert received[1:5] == [b'x,y'] * 4
+
+def test_send_with_lost_ok_goes_once():
+    """A SEND whose +OK never comes is not put on the air again"""
+    async def run():
+        async with RYLR998Emulator(tx_time=0.01, lose_ok=1) as emulator:
+            serial = SerialManager(emulator.port, '115200')
+            parser = ResponseParser()
+            engine = ATCommandEngine(serial.write, timeout=0.1)
+            serial.add_reader(lambda: [engine.on_event(event)
+                                       for event in parser.feed(serial.read_available())])
+            try:
+                with pytest.raises(CommandTimeout):
+                    await engine.send('SEND=0,2,hi', priority=ATCommandEngine.DATA)
+                reply = await engine.send('SEND=0,5,again', priority=ATCommandEngine.DATA)
+            finally:
+                engine.close()
+                serial.close()
+            return reply, list(emulator.sent)
+    reply, sent = asyncio.run(run())
+    assert reply == Ok()
+    assert sent == [(0, b'hi'), (0, b'again')]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import random
+
+from src.core.linkstats import LinkStats, Series, format_link
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def test_series_matches_the_window():
+    rng = random.Random(998)
+    series = Series(16, -164, 0)
+    window = []
+    for _ in range(500):
+        value = rng.randint(-130, -40)
+        series.add(value)
+        window = (window + [value])[-16:]
+        assert series.values() == window
+        assert (series.min, series.max, series.last) == (min(window), max(window), value)
+        assert abs(series.mean - sum(window) / len(window)) < 1e-9
+        ranked = sorted(window)
+        assert series.percentile(50) == ranked[(len(ranked) + 1) // 2 - 1]
+        assert series.percentile(100) == ranked[-1]
+        assert series.percentile(0) == ranked[0]
+
+def test_series_clamps_and_starts_empty():
+    series = Series(4, -20, 20)
+    assert (len(series), series.min, series.mean, series.percentile(50)) == (0, None, None, None)
+    series.add(35)
+    series.add(-99)
+    assert series.values() == [20, -20]
+
+def test_peers_bounded_least_recent_first():
+    clock = Clock()
+    links = LinkStats(size=8, peers=2, clock=clock)
+    links.add(1, -80, 5)
+    links.add(2, -90, 2)
+    links.add(1, -70, 7)
+    links.add(3, -100, -3)  # 2 was heard least recently
+    assert 2 not in links and 1 in links and 3 in links
+    clock.now = 5
+    summary = links.summary(1)
+    assert (summary.samples, summary.heard, summary.age) == (2, 2, 5)
+    assert (summary.rssi, summary.rssi_min, summary.rssi_max, summary.rssi_mean) == (-70, -80, -70, -75)
+    assert format_link(summary) == "1: rssi -75 -80..-70 snr 6 5..7"
+    assert [s.addr for s in links.summaries()] == [1, 3]
+    assert links.summary(2) is None
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+from src.core.at_engine import ATCommandEngine
+from src.core.emulator import Air, RYLR998Emulator
+from src.core.mesh import HOP_COST, MeshRouter, RouteTable, is_mesh, link_cost
+from src.core.protocol import RcvFrame, ResponseParser
+from src.core.reliable import ReliableLink
+from src.core.scheduler import TxScheduler
+from src.core.serial import SerialManager
+
+PARAMETER = '7,9,1,4'  # the fastest setting
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+class Node:
+    """An emulated module on the air and the stack above it"""
+
+    def __init__(self, air, addr):
+        self.addr = addr
+        self.emulator = RYLR998Emulator(air=air)
+        self.received = []
+
+    def start(self):
+        self.emulator.start()
+        self.emulator.settings.ADDRESS = str(self.addr)
+        self.emulator.settings.PARAMETER = PARAMETER
+        self.serial = SerialManager(self.emulator.port, '115200')
+        self.parser = ResponseParser()
+        self.engine = ATCommandEngine(self.serial.write)
+        self.scheduler = TxScheduler(self.engine, PARAMETER)
+        self.link = ReliableLink(self.scheduler.send, rto=0.3, min_rto=0.1,
+                                 retries=2, ack_delay=0.01)
+        self.router = MeshRouter(self.addr, self.link.send, self.scheduler.send,
+                                 hello_interval=0)
+        self.serial.add_reader(self.on_readable)
+        return self
+
+    def on_readable(self):
+        for event in self.parser.feed(self.serial.read_available()):
+            if not isinstance(event, RcvFrame):
+                self.engine.on_event(event)
+                continue
+            self.router.heard(event.addr, event.rssi, event.snr)
+            payload = self.link.feed(event.addr, event.payload)
+            if payload is not None and is_mesh(payload):
+                delivered = self.router.feed(event.addr, payload)
+                if delivered is not None:
+                    self.received.append(delivered)
+
+    async def hello(self):
+        await self.scheduler.send(0, self.router.hello())
+        await asyncio.sleep(0.05)  # +OK comes first, then the airtime
+
+    def stop(self):
+        self.router.close()
+        self.link.close()
+        self.scheduler.close()
+        self.engine.close()
+        self.serial.close()
+        self.emulator.stop()
+
+
+def test_link_cost():
+    assert link_cost(-60, 10) == HOP_COST
+    assert link_cost(-60, -5) > 2 * HOP_COST  # two clean hops beat it
+    assert link_cost(-120, 10) == 2 * HOP_COST
+
+def test_prefers_two_clean_hops_to_one_poor_one():
+    table = RouteTable(1)
+    table.heard(3, -118, -8)   # poor direct link
+    table.heard(2, -60, 10)
+    assert table.next_hop(3) == 3
+    table.learn(3, 2, HOP_COST)  # 2 hears 3 well
+    assert table.next_hop(3) == 2
+    assert table.routes[3].metric == 2 * HOP_COST
+
+def test_withdrawn_and_expired_routes():
+    clock = Clock()
+    table = RouteTable(1, neighbor_timeout=10, clock=clock)
+    table.heard(2, -60, 10)
+    table.learn(4, 2, 20)
+    table.learn(5, 2, 20)
+    table.withdraw(2, {4})
+    assert table.next_hop(4) == 2 and table.next_hop(5) is None
+    clock.now = 11
+    assert table.next_hop(2) is None and table.next_hop(4) is None
+
+def test_repeats_dropped():
+    async def run():
+        sent = []
+        async def send(addr, payload):
+            sent.append(payload)
+            return True
+        router = MeshRouter(2, send, None, hello_interval=0)
+        router.heard(3, -60, 10)
+        origin = MeshRouter(1, send, None, hello_interval=0)
+        origin.heard(2, -60, 10)
+        origin.table.learn(3, 2, 10)
+        await origin.send(3, b'once')
+        router.heard(1, -60, 10)
+        assert router.feed(1, sent[0]) is None
+        assert router.feed(1, sent[0]) is None  # its ACK was lost
+        await asyncio.sleep(0)
+        return router.metrics, sent
+    metrics, sent = asyncio.run(run())
+    assert (metrics.forwarded, metrics.duplicates) == (1, 1)
+    assert len(sent) == 2 and sent[1][1] == sent[0][1] - 1  # one hop fewer
+
+def test_split_horizon():
+    """A neighbor's route through us is no route for us"""
+    async def run():
+        router = MeshRouter(1, None, None, hello_interval=0)
+        router.heard(2, -60, 10)
+        neighbor = MeshRouter(2, None, None, hello_interval=0)
+        neighbor.heard(1, -60, 10)
+        neighbor.table.learn(7, 1, 10)  # 2 reaches 7 through 1
+        router.feed(2, neighbor.hello())
+        return router.table.next_hop(7)
+    assert asyncio.run(run()) is None
+
+def test_store_and_forward_across_three_nodes():
+    """1 and 3 are out of range of each other; 2 hears both"""
+    async def run():
+        air = Air()
+        a, b, c = (Node(air, addr) for addr in (1, 2, 3))
+        air.link(a.emulator, b.emulator, rssi=-90, snr=5)
+        air.link(b.emulator, c.emulator, rssi=-90, snr=5)
+        for node in (a, b, c):
+            node.start()
+        try:
+            # no route yet: held
+            assert not await a.router.send(3, b'first')
+            assert a.router.held == 1
+            # routes spread, and the held frame goes
+            await c.hello()
+            await b.hello()
+            for _ in range(100):
+                if c.received:
+                    break
+                await asyncio.sleep(0.01)
+            assert a.router.held == 0
+            assert c.received == [(1, b'first')]
+            assert a.router.table.next_hop(3) == 2
+            for _ in range(100):
+                if not b.link.stats(3).pending:  # 3's ACK is in
+                    break
+                await asyncio.sleep(0.01)
+
+            # 2 loses 3: the frame waits at 2 until 3 is heard again
+            air.cut(b.emulator, c.emulator)
+            assert await a.router.send(3, b'second')
+            for _ in range(300):
+                if b.router.held:
+                    break
+                await asyncio.sleep(0.01)
+            assert b.router.held == 1
+            air.link(b.emulator, c.emulator, rssi=-90, snr=5)
+            await c.hello()
+            for _ in range(100):
+                if len(c.received) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            assert c.received == [(1, b'first'), (1, b'second')]
+            assert b.router.metrics.forwarded == 2
+            # and the way back is known from the frames that came
+            assert c.router.table.next_hop(1) == 2
+        finally:
+            for node in (a, b, c):
+                node.stop()
+    asyncio.run(run())
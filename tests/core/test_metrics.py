@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+import pytest
+
+from src.config.validators import metricscheck
+from src.core.emulator import RYLR998Emulator
+from src.core.metrics import Histogram, Registry, serve
+from src.core.protocol import ResponseParser
+from src.core.radio import Radio
+
+
+def test_render_text_format():
+    registry = Registry()
+    sent = registry.counter('sent_total', 'Packets sent', {'radio': '1'})
+    registry.counter('sent_total', 'Packets sent', {'radio': '2'}, fn=lambda: 7)
+    depth = registry.gauge('depth', 'Queue "depth"\nnow')
+    latency = registry.histogram('latency_seconds', 'Round trips', {'radio': '1'},
+                                 bounds=(0.1, 0.5))
+    sent.inc()
+    sent.inc(2)
+    depth.set(4)
+    depth.dec()
+    for rtt in (0.05, 0.1, 0.3, 2.0):
+        latency.observe(rtt)
+    assert registry.render() == (
+        '# HELP sent_total Packets sent\n'
+        '# TYPE sent_total counter\n'
+        'sent_total{radio="1"} 3\n'
+        'sent_total{radio="2"} 7\n'
+        '# HELP depth Queue "depth"\\nnow\n'
+        '# TYPE depth gauge\n'
+        'depth 3\n'
+        '# HELP latency_seconds Round trips\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{radio="1",le="0.1"} 2\n'
+        'latency_seconds_bucket{radio="1",le="0.5"} 3\n'
+        'latency_seconds_bucket{radio="1",le="+Inf"} 4\n'
+        'latency_seconds_sum{radio="1"} 2.45\n'
+        'latency_seconds_count{radio="1"} 4\n')
+
+
+def test_registration_conflicts():
+    registry = Registry()
+    registry.counter('x', 'help', {'radio': '1'})
+    with pytest.raises(ValueError):
+        registry.counter('x', 'help', {'radio': '1'})
+    with pytest.raises(ValueError):
+        registry.gauge('x', 'help', {'radio': '2'})
+    histogram = Histogram((1.0,))
+    assert registry.register('h', 'histogram', 'help', histogram) is histogram
+    assert registry.get('h') is histogram
+    assert registry.get('x', {'radio': '2'}) is None
+
+
+def test_metricscheck():
+    assert metricscheck('9998') == ('127.0.0.1', 9998)
+    assert metricscheck('0.0.0.0:9100') == ('0.0.0.0', 9100)
+    assert metricscheck('[::1]:9100') == ('::1', 9100)
+    for bad in ('', 'host:', 'host:0', '70000'):
+        with pytest.raises(Exception):
+            metricscheck(bad)
+
+
+def test_parser_counts_resets():
+    parser = ResponseParser()
+    parser.feed(b'+OK' + b'x' * (parser.MAX_LINE + 1))  # no terminator in sight
+    assert parser.resets == 1
+    parser.feed(b'+RCV=1,5')
+    parser.reset()
+    parser.reset()  # nothing to forget
+    assert parser.resets == 2
+
+
+def test_radio_metrics_served():
+    """The counters of a radio talking to an emulator, over HTTP"""
+    async def run():
+        emulator = RYLR998Emulator()
+        emulator.start()
+        radio = Radio(emulator.port, '115200', '1', '915000000', '18', '9,7,1,12')
+        registry = Registry()
+        radio.register(registry)
+        server = await serve(registry, '127.0.0.1', 0)
+        try:
+            wakeup = asyncio.Event()
+            radio.add_reader(wakeup.set)
+
+            async def loop():
+                while True:
+                    await wakeup.wait()
+                    wakeup.clear()
+                    if radio.has_data():
+                        radio.read()
+            reader = asyncio.create_task(loop())
+            await radio.engine.send('ADDRESS?')
+            await radio.engine.send('BAND=1')  # out of range: +ERR
+            reader.cancel()
+
+            port = server.sockets[0].getsockname()[1]
+            replies = []
+            for path in ('/metrics', '/'):
+                r, w = await asyncio.open_connection('127.0.0.1', port)
+                w.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+                replies.append(await r.read())
+                w.close()
+            return replies
+        finally:
+            server.close()
+            radio.close()
+            emulator.stop()
+    metrics, other = asyncio.run(run())
+    assert metrics.startswith(b'HTTP/1.0 200 OK\r\n')
+    assert other.startswith(b'HTTP/1.0 404')
+    text = metrics.decode()
+    assert 'rylr998_commands_total{radio="1"} 2\n' in text
+    assert 'rylr998_command_latency_seconds_count{radio="1"} 2\n' in text
+    assert 'rylr998_command_errors_total{code="' in text
+    assert 'rylr998_received_frames_total{radio="1"} 0\n' in text
+    assert 'rylr998_read_bytes_total{radio="1"} 0\n' not in text
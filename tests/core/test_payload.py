@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import random
+
+import pytest
+
+from src.core.payload import (
+    FRAGMENT_DATA, MAX_MESSAGE, Fragmenter, PayloadType, Reassembler, batch, can_batch,
+    fragment, unbatch
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def test_plain_text_is_untouched():
+    assert fragment(b'hello', 7) == [b'hello']
+    assert fragment(b'x' * 240, 7) == [b'x' * 240]
+    assert Reassembler().feed(1, memoryview(b'hello')) == b'hello'
+
+def test_control_byte_is_wrapped():
+    """A short payload that looks like a marker still goes as a fragment"""
+    payloads = fragment(b'\x01abc', 7)
+    assert payloads == [bytes((PayloadType.FRAGMENT, 7, 0, 1)) + b'\x01abc']
+    assert Reassembler().feed(1, payloads[0]) == b'\x01abc'
+
+def test_split_and_reassemble_any_order():
+    data = bytes(random.Random(11).randrange(256) for _ in range(1000))
+    payloads = Fragmenter().split(data)
+    assert len(payloads) == 5 and all(len(p) <= 240 for p in payloads)
+    reassembler = Reassembler()
+    random.Random(3).shuffle(payloads)
+    results = [reassembler.feed(4, p) for p in payloads + payloads[:1]]  # and a duplicate
+    assert results[:4] == [None] * 4
+    assert results[4] == data
+    assert reassembler.pending == 0
+    assert reassembler.metrics.completed == 1
+
+def test_senders_and_ids_kept_apart():
+    a, b = b'A' * 500, b'B' * 500
+    fa, fb = fragment(a, 1), fragment(b, 1)
+    reassembler = Reassembler()
+    assert reassembler.feed(1, fa[0]) is None
+    assert reassembler.feed(2, fb[0]) is None
+    assert reassembler.feed(2, fb[1]) is None
+    assert reassembler.feed(1, fa[1]) is None
+    assert reassembler.feed(1, fa[2]) == a
+    assert reassembler.feed(2, fb[2]) == b
+
+def test_sender_restart():
+    """A sender started again is not taken for repeating its last messages"""
+    random.seed(7)
+    reassembler = Reassembler()
+    for run in range(3):
+        sender = Fragmenter()  # a new process
+        for n in range(2):
+            data = b'%d:%d ' % (run, n) * 100
+            assert [reassembler.feed(1, p) for p in sender.split(data)][-1] == data
+
+def test_timeout_and_bound():
+    clock = Clock()
+    reassembler = Reassembler(max_messages=2, timeout=5, clock=clock)
+    for msg_id in range(3):
+        reassembler.feed(1, fragment(b'x' * 300, msg_id)[0])
+    assert reassembler.pending == 2
+    assert reassembler.metrics.evicted == 1
+    clock.now = 6
+    reassembler.expire()
+    assert reassembler.pending == 0
+    assert reassembler.metrics.expired == 2
+
+def test_too_long():
+    assert len(fragment(bytes(MAX_MESSAGE), 0)) == 255
+    with pytest.raises(ValueError):
+        fragment(bytes(MAX_MESSAGE + 1), 0)
+    assert len(fragment(bytes(FRAGMENT_DATA + 1), 0)) == 2
+
+def test_batch_round_trip():
+    bodies = [b'hi', bytes((PayloadType.COMPRESSED,)) + b'\xff\x00', b'']
+    payload = batch(bodies)
+    assert payload[0] == PayloadType.BATCH
+    assert unbatch(Reassembler().feed(1, payload)) == bodies
+    assert batch([b'hi']) == b'hi' and unbatch(b'hi') == [b'hi']
+    assert unbatch(payload[:-3]) == []  # truncated
+    assert not can_batch(fragment(b'x' * 300, 0)[0]) and not can_batch(b'x' * 239)
+    with pytest.raises(ValueError):
+        batch([b'x' * 200, b'y' * 40])
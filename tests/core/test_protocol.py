@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import random
+
+import pytest
+
+from src.core.protocol import (
+    ResponseParser, parse_line, detach, Ok, Err, ParamReport, RcvFrame, Factory, Reset, Ready
+)
+
+def test_parse_line():
+    """Each response is classified into its event"""
+    assert parse_line(b'+OK') == Ok()
+    assert parse_line(b'+ERR=17') == Err(17)
+    assert parse_line(b'+BAND=915000000') == ParamReport('BAND', '915000000')
+    assert parse_line(b'+PARAMETER=9,7,1,12') == ParamReport('PARAMETER', '9,7,1,12')
+    assert parse_line(b'+FACTORY') == Factory()
+    assert parse_line(b'+RESET') == Reset()
+    assert parse_line(b'+READY') == Ready()
+    assert parse_line(b'+RCV=5,5,HELLO,-99,40') == RcvFrame(5, 5, b'HELLO', -99, 40)
+
+def test_rcv_payload_with_commas_and_utf8():
+    """The payload is cut by its length, so commas and UTF-8 survive"""
+    payload = 'a,b,ü'.encode()
+    line = b'+RCV=65535,%d,%s,-7,-3' % (len(payload), payload)
+    assert parse_line(line) == RcvFrame(65535, len(payload), payload, -7, -3)
+
+def test_noise_and_garbage():
+    """Line noise before the '+' is skipped, malformed lines are dropped"""
+    assert parse_line(b'\x00\xff+OK') == Ok()
+    assert parse_line(b'hello') is None
+    assert parse_line(b'+NOSUCH=1') is None
+    assert parse_line(b'+ERR=x') is None
+    assert parse_line(b'+RCV=1,zz,abc,1,2') is None
+
+def test_feed_split_anywhere():
+    """Events come out the same however the stream is chopped up"""
+    stream = b'+OK\r\n+RCV=1,3,abc,-40,11\r\n+ERR=4\r\n'
+    expected = [Ok(), RcvFrame(1, 3, b'abc', -40, 11), Err(4)]
+    for cut in range(len(stream)):
+        parser = ResponseParser()
+        assert parser.feed(stream[:cut]) + parser.feed(stream[cut:]) == expected
+
+def test_receiving():
+    parser = ResponseParser()
+    parser.feed(b'+RCV=1,3,a')
+    assert parser.receiving
+    parser.feed(b'bc,-40,11\r\n')
+    assert not parser.receiving
+
+def test_buffer_holds_the_longest_response():
+    with pytest.raises(ValueError):
+        ResponseParser(size=ResponseParser.MAX_LINE)
+
+def test_overrun_keeps_payloads():
+    """Noise that overruns MAX_LINE does not overwrite the payloads before it"""
+    parser = ResponseParser(size=2 * ResponseParser.MAX_LINE)
+    noise = b'x' * (2 * ResponseParser.MAX_LINE)  # to the end of the buffer and on
+    events = parser.feed(b'+RCV=1,5,hello,-40,11\r\n' + noise + b'\r\n+RCV=2,5,world,-40,11\r\n')
+    assert [bytes(event.payload) for event in events] == [b'hello', b'world']
+    assert parser.resets == 1
+
+def test_reset_forgets_the_rcv_header():
+    """A frame cut short by reset() does not decide where the next one ends"""
+    parser = ResponseParser()
+    assert parser.feed(b'+RCV=1,1,') == []
+    parser.reset()
+    assert parser.feed(b'+RCV=2,5,') == []
+    assert parser.feed(b'x\r\nyz,-40,11\r\n') == [RcvFrame(2, 5, b'x\r\nyz', -40, 11)]
+
+def test_fuzz():
+    """Random bytes never raise and never produce an event by accident"""
+    rng = random.Random(998)
+    parser = ResponseParser()
+    for _ in range(200):
+        data = bytes(rng.randrange(256) for _ in range(rng.randrange(64)))
+        for event in parser.feed(data.replace(b'+', b'')):
+            assert False, event
+
+def test_binary_payload():
+    """A +RCV payload is taken by length: CR LF and any byte survive"""
+    payload = bytes(range(256))[:240].replace(b'+', b'\r\n')[:240]
+    stream = b'+RCV=3,240,' + payload + b',-80,5\r\n+OK\r\n'
+    for cut in (1, 7, 20, 100, 251, len(stream) - 1):
+        parser = ResponseParser()
+        events = parser.feed(stream[:cut]) + parser.feed(stream[cut:])
+        assert events == [RcvFrame(3, 240, payload, -80, 5), Ok()]
+        assert parser.discarded == 0
+
+def test_multibyte_utf8_payload():
+    """A payload arriving in pieces decodes as a whole"""
+    payload = 'héllo wörld ✓'.encode()
+    stream = b'+RCV=9,%d,%s,-40,11\r\n' % (len(payload), payload)
+    parser = ResponseParser()
+    events = []
+    for i in range(len(stream)):
+        events += parser.feed(stream[i:i+1])
+    assert str(events[0].payload, 'utf8') == 'héllo wörld ✓'
+
+def test_length_mismatch_resynchronizes():
+    """A frame whose length is wrong is dropped, the next one is parsed"""
+    parser = ResponseParser()
+    events = parser.feed(b'+RCV=1,9,abc,-40,11\r\n+OK\r\n')
+    assert events == [Ok()]
+    assert parser.discarded == 1
+
+def test_small_buffer_keeps_payloads():
+    """Payloads handed out before the buffer wraps are not overwritten"""
+    frames = [b'+RCV=%d,5,%05d,-40,11\r\n' % (i, i) for i in range(50)]
+    parser = ResponseParser(size=ResponseParser.MAX_LINE + 1)
+    events = parser.feed(b''.join(frames))
+    assert [bytes(event.payload) for event in events] == [b'%05d' % i for i in range(50)]
+    events = []
+    for frame in frames:
+        events += [detach(event) for event in parser.feed(frame)]
+    assert [bytes(event.payload) for event in events] == [b'%05d' % i for i in range(50)]
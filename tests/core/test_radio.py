@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+from src.core.emulator import Air, RYLR998Emulator
+from src.core.protocol import ParamReport, RcvFrame
+from src.core.payload import relay
+from src.core.radio import Radio
+
+PARAMETER = '7,9,1,4'  # the fastest setting
+
+
+def test_radios_share_a_loop():
+    """Two modules on one channel, a third on another, one event loop"""
+    async def run():
+        air = Air()
+        emulators = [RYLR998Emulator(air=air) for _ in range(3)]
+        for a in emulators:
+            for b in emulators:
+                if a is not b:
+                    air.link(a, b)
+        bands = ('915000000', '915000000', '920000000')
+        radios = []
+        heard = {1: [], 2: [], 3: []}
+        reports = {1: [], 2: [], 3: []}
+        wakeup = asyncio.Event()
+        try:
+            for number, (emulator, band) in enumerate(zip(emulators, bands), 1):
+                emulator.start()
+                radio = Radio(emulator.port, '115200', str(number), band, '18',
+                              PARAMETER, number=number)
+                radio.add_reader(wakeup.set)
+                radios.append(radio)
+
+            async def loop():
+                # what a front end does: read whichever radios have data
+                while True:
+                    await wakeup.wait()
+                    wakeup.clear()
+                    for radio in radios:
+                        if not radio.has_data():
+                            continue
+                        for event in radio.read():
+                            if isinstance(event, RcvFrame):
+                                heard[radio.number].append((event.addr, bytes(event.payload)))
+                            elif isinstance(event, ParamReport):
+                                reports[radio.number].append(event.value)
+            reader = asyncio.create_task(loop())
+
+            async def configure(radio):
+                for cmd in radio.commands():
+                    await radio.engine.send(cmd)
+            await asyncio.gather(*(configure(radio) for radio in radios))
+            for radio, emulator in zip(radios, emulators):
+                assert emulator.settings.ADDRESS == radio.addr
+                assert emulator.settings.BAND == radio.band
+            await asyncio.gather(radios[0].scheduler.send(0, b'from 1'),
+                                 radios[2].scheduler.send(0, b'from 3'))
+            for _ in range(100):
+                if heard[2]:
+                    break
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            reader.cancel()
+        finally:
+            for radio in radios:
+                radio.close()
+            for emulator in emulators:
+                emulator.stop()
+        return heard, reports
+    heard, reports = asyncio.run(run())
+    assert heard == {1: [], 2: [(1, b'from 1')], 3: []}  # 3 is on another band
+    assert [r for r in reports[3] if r.startswith('92')] == ['920000000']
+
+
+def receive_all(radio: Radio, frames) -> list:
+    return [radio.receive(RcvFrame(addr, len(payload), memoryview(payload), -40, 9)).messages
+            for addr, payload in frames]
+
+
+def test_direct_repeats_shown_unless_echoing():
+    async def run():
+        emulator = RYLR998Emulator()
+        emulator.start()
+        radio = Radio(emulator.port, '115200', '1', '915000000', '18', PARAMETER)
+        echoing = Radio(emulator.port, '115200', '1', '915000000', '18', PARAMETER, echo=True)
+        try:
+            relayed = relay(b'ok', 5, 2)
+            # a peer may say the same thing twice; a relayed copy is a repeat
+            assert receive_all(radio, [(5, b'ok'), (5, b'ok'), (7, relayed)]) == [[b'ok'], [b'ok'], []]
+            assert receive_all(echoing, [(5, b'ok'), (5, b'ok'), (7, relayed)]) == [[b'ok'], [], []]
+            # echoing, our own message passed back is not news
+            mine = relay(echoing.split(b'mine')[0], 1, 2)
+            assert receive_all(echoing, [(7, mine)]) == [[]]
+            radio.split(b'mine')
+            assert len(radio.dedup) == 1  # not echoing: only the direct 'ok', for its relayed copies
+        finally:
+            radio.close()
+            echoing.close()
+            emulator.stop()
+    asyncio.run(run())
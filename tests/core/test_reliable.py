@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+import pytest
+
+from src.core.payload import PayloadType
+from src.core.reliable import MAX_DATA, ReliableLink, format_stats
+
+
+class Channel:
+    """Two links, 1 and 2, joined by a channel that may drop frames"""
+
+    def __init__(self, drop=lambda src, payload: False, **kwargs):
+        self.drop = drop
+        self.frames = []  # (src, payload) as sent
+        self.received = {1: [], 2: []}
+        options = dict(rto=0.1, min_rto=0.05, ack_delay=0.01, **kwargs)
+        self.links = {1: ReliableLink(self.sender(1), **options),
+                      2: ReliableLink(self.sender(2), **options)}
+
+    def sender(self, src):
+        async def send(addr, payload):
+            self.frames.append((src, payload))
+            await asyncio.sleep(0.001)  # on the air
+            if not self.drop(src, payload):
+                data = self.links[addr].feed(src, payload)
+                if data is not None:
+                    self.received[addr].append(bytes(data))
+        return send
+
+    def data(self, src):
+        """The RELIABLE frames src sent, by seq"""
+        return [p[2] for s, p in self.frames if s == src and p[0] == PayloadType.RELIABLE]
+
+    def close(self):
+        for link in self.links.values():
+            link.close()
+
+
+def test_delivered_once_each():
+    async def run():
+        channel = Channel()
+        results = await asyncio.gather(*(channel.links[1].send(2, b'm%d' % n) for n in range(20)))
+        await asyncio.sleep(0.05)
+        channel.close()
+        return channel, results
+    channel, results = asyncio.run(run())
+    assert results == [True] * 20
+    assert channel.received[2] == [b'm%d' % n for n in range(20)]
+    assert channel.received[1] == []  # ACKs are not data
+    stats = channel.links[1].stats(2)
+    assert (stats.sent, stats.delivered, stats.lost, stats.retransmits) == (20, 20, 0, 0)
+    assert stats.srtt > 0
+    assert channel.links[2].stats(1).received == 20
+
+def test_only_the_lost_frame_is_resent():
+    lost = set()
+    def drop(src, payload):
+        # the first copy of seq 3
+        if src == 1 and payload[0] == PayloadType.RELIABLE and payload[2] == 3 and 3 not in lost:
+            lost.add(3)
+            return True
+        return False
+    async def run():
+        channel = Channel(drop)
+        results = await asyncio.gather(*(channel.links[1].send(2, b'm%d' % n) for n in range(6)))
+        channel.close()
+        return channel, results
+    channel, results = asyncio.run(run())
+    assert results == [True] * 6
+    assert sorted(channel.data(1)) == [0, 1, 2, 3, 3, 4, 5]
+    assert sorted(channel.received[2]) == sorted(b'm%d' % n for n in range(6))
+    assert channel.links[1].stats(2).retransmits == 1
+
+def test_lost_ack_means_duplicate_not_redelivery():
+    acks = []
+    def drop(src, payload):
+        if payload[0] == PayloadType.ACK:
+            acks.append(payload)
+            return len(acks) == 1
+        return False
+    async def run():
+        channel = Channel(drop)
+        result = await channel.links[1].send(2, b'once')
+        channel.close()
+        return channel, result
+    channel, result = asyncio.run(run())
+    assert result
+    assert channel.received[2] == [b'once']
+    assert channel.links[2].stats(1).duplicates == 1
+
+def test_given_up_on_a_dead_link():
+    async def run():
+        channel = Channel(lambda src, payload: True, retries=2)
+        result = await channel.links[1].send(2, b'hello?')
+        channel.close()
+        return channel, result
+    channel, result = asyncio.run(run())
+    assert not result
+    stats = channel.links[1].stats(2)
+    assert (stats.sent, stats.delivered, stats.lost, stats.retransmits) == (1, 0, 1, 2)
+    assert format_stats(2, stats) == "to 2: 0/1 ok 1 lost 2 resent"
+
+def test_receiver_follows_a_restarted_sender():
+    async def run():
+        channel = Channel()
+        assert await channel.links[1].send(2, b'before')
+        channel.links[1].close()
+        session = channel.links[1].peers[2].session
+        channel.links[1] = ReliableLink(channel.sender(1), rto=0.1, ack_delay=0.01)
+        channel.links[1].stats(2)
+        channel.links[1].peers[2].session = (session + 1) & 0xFF  # 1 in 256 would not be
+        assert await channel.links[1].send(2, b'after')
+        channel.close()
+        return channel
+    channel = asyncio.run(run())
+    assert channel.received[2] == [b'before', b'after']
+
+def test_first_frame_of_a_session_lost():
+    """A frame lost before any other arrived is not acknowledged by the later ones"""
+    lost = []
+    def drop(src, payload):
+        if src == 1 and payload[0] == PayloadType.RELIABLE and payload[2] == 0 and not lost:
+            lost.append(payload)
+            return True
+        return False
+    async def run():
+        channel = Channel(drop)
+        first = asyncio.create_task(channel.links[1].send(2, b'first'))
+        await asyncio.sleep(0)  # seq 0 goes out, and is lost, before seq 1
+        second = await channel.links[1].send(2, b'second')
+        results = [await first, second]
+        channel.close()
+        return channel, results
+    channel, results = asyncio.run(run())
+    assert results == [True, True]
+    assert channel.received[2] == [b'second', b'first']  # resent, not assumed
+    assert sorted(channel.data(1)) == [0, 0, 1]
+
+def test_plain_payloads_pass_through():
+    link = ReliableLink(None)
+    assert link.feed(3, b'hello') == b'hello'
+    assert link.feed(3, bytes((PayloadType.ACK, 1))) is None  # too short
+    with pytest.raises(ValueError):
+        asyncio.run(link.send(3, bytes(MAX_DATA + 1)))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import asyncio
+
+import pytest
+
+from src.core.airtime import parameter_airtime
+from src.core.at_engine import ATCommandEngine
+from src.core.emulator import RYLR998Emulator
+from src.core.payload import unbatch
+from src.core.protocol import Err, Ok, RcvFrame, ResponseParser, parse_line
+from src.core.scheduler import TxScheduler
+from src.core.serial import SerialManager
+
+PARAMETER = '7,9,1,4'  # the fastest setting: about 6 ms for 10 bytes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    """A 10% duty cycle pays for airtime at a tenth of real time"""
+    clock = Clock()
+    scheduler = TxScheduler(None, PARAMETER, duty_cycle=0.1, window=10, clock=clock)
+    assert scheduler.tokens == pytest.approx(1.0)
+    scheduler._tokens = 0.0
+    assert scheduler.delay(0.5) == pytest.approx(5.0)
+    clock.now = 2.0
+    assert scheduler.delay(0.5) == pytest.approx(3.0)
+    clock.now = 100.0
+    assert scheduler.tokens == pytest.approx(1.0)  # never more than the window's worth
+    scheduler._busy_until = 100.5
+    assert scheduler.delay(0.1) == pytest.approx(0.5 + TxScheduler.GUARD)
+
+def test_queue_bound():
+    async def run():
+        scheduler = TxScheduler(ATCommandEngine(None), PARAMETER, queue_size=2)
+        scheduler._worker = asyncio.get_running_loop().create_future()  # not started
+        scheduler.submit(1, b'a')
+        scheduler.submit(1, b'b')
+        with pytest.raises(asyncio.QueueFull):
+            scheduler.submit(1, b'c')
+        with pytest.raises(ValueError):
+            scheduler.submit(1, bytes(241))
+        return scheduler
+    scheduler = asyncio.run(run())
+    assert scheduler.depth == 2
+    assert (scheduler.metrics.queued, scheduler.metrics.dropped) == (2, 1)
+
+def test_commands_overtake_data():
+    """Queued SENDs wait behind a query sent after them"""
+    written = []
+    async def run():
+        async def write(data):
+            written.append(data)
+            asyncio.get_running_loop().call_soon(engine.on_event, parse_line(
+                b'+BAND=915000000' if data == b'AT+BAND?\r\n' else b'+OK'))
+            return len(data)
+        engine = ATCommandEngine(write)
+        first = engine.send('SEND=0,1,a', priority=ATCommandEngine.DATA)
+        second = engine.send('SEND=0,1,b', priority=ATCommandEngine.DATA)
+        query = engine.send('BAND?')
+        await asyncio.gather(first, second, query)
+    asyncio.run(run())
+    assert written == [b'AT+BAND?\r\n', b'AT+SEND=0,1,a\r\n', b'AT+SEND=0,1,b\r\n']
+
+def test_refused_send_costs_no_airtime():
+    """A SEND answered with +ERR is not charged to the budget, nor waited out"""
+    clock = Clock()
+    clock.now = 1.0  # past the guard time after the last packet; the clock stands still
+    async def run():
+        async def write(data):
+            asyncio.get_running_loop().call_soon(engine.on_event, parse_line(
+                b'+ERR=5' if data.startswith(b'AT+SEND=0,1,a') else b'+OK'))
+            return len(data)
+        engine = ATCommandEngine(write)
+        scheduler = TxScheduler(engine, PARAMETER, duty_cycle=0.1, window=10, clock=clock)
+        refused = await scheduler.send(0, b'a')
+        charged = (scheduler.tokens, scheduler.metrics.airtime, scheduler.delay(0.0))
+        sent = await asyncio.wait_for(scheduler.send(0, b'b'), 1.0)  # not held up
+        scheduler.close()
+        engine.close()
+        return refused, charged, sent, scheduler
+    refused, charged, sent, scheduler = asyncio.run(run())
+    assert refused == Err(5) and sent == Ok()
+    assert charged == (pytest.approx(1.0), 0.0, 0.0)
+    airtime = parameter_airtime(PARAMETER, 1)
+    assert scheduler.tokens == pytest.approx(1.0 - airtime)
+    assert scheduler.metrics.airtime == pytest.approx(airtime)
+    assert scheduler.metrics.sent == 2
+
+def test_no_busy_errors_at_full_rate():
+    """A burst through the emulator is paced by airtime: all +OK, no +ERR=17"""
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            serial = SerialManager(emulator.port, '115200')
+            parser = ResponseParser()
+            engine = ATCommandEngine(serial.write)
+            scheduler = TxScheduler(engine, '9,7,1,12')
+            serial.add_reader(lambda: [engine.on_event(e) for e in parser.feed(serial.read_available())])
+            await engine.send(f'PARAMETER={PARAMETER}')
+            scheduler.parameter = PARAMETER
+            replies = await asyncio.gather(*(scheduler.send(2, b'%010d' % n) for n in range(10)))
+            scheduler.close()
+            engine.close()
+            serial.close()
+            return replies, len(emulator.sent), scheduler.metrics
+    replies, sent, metrics = asyncio.run(run())
+    assert replies == [Ok()] * 10
+    assert sent == 10
+    assert metrics.airtime == pytest.approx(10 * parameter_airtime(PARAMETER, 10))
+    assert metrics.wait_max >= 9 * parameter_airtime(PARAMETER, 10)
+
+def test_coalesce_queued_messages():
+    """Messages queued for one address go as one BATCH; others go alone"""
+    async def run():
+        async with RYLR998Emulator() as emulator:
+            serial = SerialManager(emulator.port, '115200')
+            parser = ResponseParser()
+            engine = ATCommandEngine(serial.write)
+            scheduler = TxScheduler(engine, PARAMETER, coalesce=True, linger=0.05)
+            serial.add_reader(lambda: [engine.on_event(e) for e in parser.feed(serial.read_available())])
+            futures = [scheduler.submit(2, b'one'), scheduler.submit(3, b'other'),
+                       scheduler.submit(2, b'two'), scheduler.submit(2, b'x' * 239)]
+            replies = await asyncio.gather(*futures)
+            scheduler.close()
+            engine.close()
+            serial.close()
+            return replies, list(emulator.sent), scheduler.metrics
+    replies, sent, metrics = asyncio.run(run())
+    assert replies == [Ok()] * 4
+    assert [unbatch(payload) for _, payload in sent] == [
+        [b'one', b'two'], [b'other'], [b'x' * 239]]
+    assert [addr for addr, _ in sent] == [2, 3, 2]
+    assert (metrics.sent, metrics.coalesced) == (3, 1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import os
+
+import pytest
+
+from src.core import store as store_module
+from src.core.store import Message, MessageStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+
+def message(n, sent=False):
+    return Message(1000.0 + n, sent, 1, n % 7, f"message {n} é", rssi=-90 + n % 20, snr=n % 10)
+
+
+def test_append_and_read(tmp_path):
+    path = str(tmp_path / 'messages.log')
+    store = MessageStore(path)
+    for n in range(100):
+        assert store.append(message(n, sent=n % 3 == 0)) == n
+    assert len(store) == 100
+    assert store[0] == message(0, sent=True)
+    assert store[-1] == message(99, sent=True)
+    assert [m.text for m in store.last(3)] == ['message 97 é', 'message 98 é', 'message 99 é']
+    assert store.range(10, 12) == [message(10), message(11)]
+    with pytest.raises(IndexError):
+        store[100]
+    store.close()
+
+    store = MessageStore(path)  # and it is all still there
+    assert len(store) == 100
+    assert store.last(1) == [message(99, sent=True)]
+    store.append(message(100))
+    assert store[100] == message(100)
+    store.close()
+
+def test_out_of_range_signal_clamped(tmp_path):
+    store = MessageStore(str(tmp_path / 'messages.log'))
+    store.append(Message(0.0, False, 1, 70000, 'x', rssi=-40000, snr=-200))
+    assert (store[0].addr, store[0].rssi, store[0].snr) == (70000 & 0xFFFF, -32768, -128)
+    store.close()
+
+def test_torn_record_cut_off(tmp_path):
+    path = str(tmp_path / 'messages.log')
+    store = MessageStore(path)
+    for n in range(5):
+        store.append(message(n))
+    store.close()
+    size = os.path.getsize(path)
+    with open(path, 'ab') as log:
+        log.write(b'\x40\x00\x00\x00half a rec')  # the crash came mid-write
+    store = MessageStore(path)
+    assert len(store) == 5
+    assert os.path.getsize(path) == size
+    store.append(message(5))
+    assert store[5] == message(5)
+    store.close()
+
+def test_index_rebuilt_from_the_log(tmp_path):
+    path = str(tmp_path / 'messages.log')
+    store = MessageStore(path)
+    for n in range(10):
+        store.append(message(n))
+    store.close()
+    with open(path + '.idx', 'r+b') as idx:
+        idx.truncate(3 * 8 + 5)  # lost entries, and half of one
+    store = MessageStore(path)
+    assert len(store) == 10
+    assert store.range(0, 10) == [message(n) for n in range(10)]
+    store.close()
+
+def test_index_past_the_log(tmp_path):
+    path = str(tmp_path / 'messages.log')
+    store = MessageStore(path)
+    for n in range(4):
+        store.append(message(n))
+    store.close()
+    with open(path, 'r+b') as log:
+        log.truncate(os.path.getsize(path) - 3)  # the log lost the tail
+    store = MessageStore(path)
+    assert len(store) == 3
+    assert store[-1] == message(2)
+    store.close()
+
+def test_fsync_batched(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(store_module.os, 'fsync', synced.append)
+    clock = Clock()
+    store = MessageStore(str(tmp_path / 'messages.log'), sync_every=4,
+                         sync_interval=10, clock=clock)
+    for n in range(8):
+        store.append(message(n))
+    assert len(synced) == 4  # log and index, twice
+    store.append(message(8))
+    clock.now = 11
+    store.append(message(9))  # a while since the last one
+    assert len(synced) == 6
+    store.close()
+    assert len(synced) == 6  # nothing left to sync
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+from src.core.trace import StageHistogram, Tracer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000
+
+    def __call__(self) -> int:
+        return self.now
+
+
+def test_stages_of_one_message():
+    clock = Clock()
+    trace = Tracer(clock=clock)
+    trace.arrived()        # readiness callback
+    clock.now += 300
+    trace.arrived()        # more bytes before the read: still the first arrival
+    clock.now += 200
+    start = trace.woken()
+    clock.now += 40
+    start = trace.lap('read', start)
+    clock.now += 10
+    trace.lap('parse', start)
+    start = clock()
+    clock.now += 1000
+    trace.lap('dispatch', start)
+    start = clock()
+    clock.now += 4000
+    trace.lap('render', start)
+    trace.shown()
+    trace.shown()          # nothing new to show
+    stats = {stage: (h.count, h.total) for stage, h in trace.stages.items()}
+    assert stats == {'wake': (1, 500), 'read': (1, 40), 'parse': (1, 10),
+                     'dispatch': (1, 1000), 'render': (1, 4000), 'total': (1, 5550)}
+    assert trace.arrival == trace.pending == 0
+
+
+def test_polled_read_counts_from_the_read():
+    clock = Clock()
+    trace = Tracer(clock=clock)
+    trace.woken()          # no callback: the loop found the bytes itself
+    clock.now += 7
+    trace.shown()
+    assert trace.stages['wake'].total == 0
+    assert trace.stages['total'].total == 7
+
+
+def test_percentiles_within_a_factor_of_two():
+    h = StageHistogram()
+    for ns in [100] * 90 + [5000] * 9 + [80000]:
+        h.add(ns)
+    assert 100 <= h.percentile(50) < 200
+    assert 5000 <= h.percentile(99) < 10000
+    assert h.percentile(100) == 80000  # never past the maximum
+    report = Tracer().report()
+    assert report.splitlines()[1].split() == ['wake', '0']
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import pytest
+
+import display
+from display import Display
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    calls = []
+    monkeypatch.setattr(display.cur, 'doupdate', lambda: calls.append(True))
+    return calls
+
+
+def frames(clock: Clock) -> Display:
+    """A Display with only its frame interval state: no terminal needed"""
+    dsply = Display.__new__(Display)
+    dsply.frame_interval = Display.FRAME_INTERVAL
+    dsply.clock = clock
+    dsply.flushed_at = clock() - Display.FRAME_INTERVAL
+    return dsply
+
+
+def test_marks_within_an_interval_flush_once(updates):
+    clock = Clock()
+    dsply = frames(clock)
+    assert dsply.due() is None  # nothing to write
+    dsply.mark()
+    assert dsply.due() == 0.0 and dsply.flush()  # the first is not held back
+    for _ in range(3):
+        clock.now += 0.01
+        dsply.mark()
+        assert not dsply.flush()
+    assert dsply.due() == pytest.approx(0.02)  # the time left in the interval
+    clock.now += 0.021
+    assert dsply.flush()
+    assert len(updates) == dsply.flushes == 2
+    assert dsply.due() is None and not dsply.flush()
+
+
+def test_urgent_mark_flushes_at_once(updates):
+    clock = Clock()
+    dsply = frames(clock)
+    dsply.mark()
+    dsply.flush()
+    clock.now += 0.001
+    dsply.mark()
+    dsply.mark(urgent=True)  # a key to echo
+    assert dsply.due() == 0.0
+    assert dsply.flush()
+    assert len(updates) == 2
+    dsply.mark()  # urgency lasts one flush
+    assert dsply.due() == pytest.approx(Display.FRAME_INTERVAL)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+from src.ui.scrollback import Scrollback
+
+
+def test_pages_and_wrapping():
+    sb = Scrollback(size=100, rows=3, width=5)
+    assert sb.page() == [] and sb.following
+    assert sb.append('abcdefgh', 1) == 2  # wrapped as curses wraps it
+    assert sb.append('', 2) == 1
+    for n in range(5):
+        sb.append(f"m{n}", 3)
+    assert [text for text, _ in sb.page()] == ['m2', 'm3', 'm4']
+    assert sb.page_up()
+    assert [text for text, _ in sb.page()] == ['m0', 'm1', 'm2']
+    sb.append('m5')  # scrolled back: the view stays put
+    assert [text for text, _ in sb.page()] == ['m0', 'm1', 'm2']
+    assert sb.page_up()  # a page less the row kept for context
+    assert sb.page() == [('fgh', 1), ('', 2), ('m0', 3)]
+    assert sb.page_up()
+    assert sb.page() == [('abcde', 1), ('fgh', 1), ('', 2)]
+    assert not sb.page_up()  # the top
+    assert sb.bottom() and sb.following
+    assert sb.page()[-1] == ('m5', 0)
+
+
+def test_ring_bounds_memory_and_view():
+    sb = Scrollback(size=10, rows=4, width=40)
+    for n in range(25):
+        sb.append(f"line {n}")
+    assert len(sb) == 10 and sb.oldest == 15
+    sb.scroll(100)
+    assert sb.page()[0] == ('line 15', 0)
+    for n in range(25, 40):
+        sb.append(f"line {n}")  # the rows in view leave the ring
+    assert sb.page()[0] == ('line 30', 0)
+    # the index forgets rows that left
+    assert all(rows[0] >= sb.oldest - sb.size // 2 for rows in sb._index.values())
+
+
+def test_incremental_search():
+    sb = Scrollback(size=1000, rows=5, width=40)
+    for n in range(300):
+        sb.append(f"Message {n} from {n % 7}")
+    newest = sb.search('message 29')
+    assert sb.row(newest)[0] == 'Message 299 from 5'
+    # typing more keeps the match while it still matches
+    match = sb.search('message 29', before=newest + 1)
+    assert match == newest
+    match = sb.search('message 29 ', before=match + 1)
+    assert sb.row(match)[0] == 'Message 29 from 1'
+    assert sb.search('message 29 ', before=match) is None
+    assert sb.row(sb.search('M 6', before=100))[0] == 'Message 97 from 6'
+    assert sb.search('9 f', before=0) is None
+    assert sb.search('nowhere') is None
+    sb.show(match)
+    assert any(text == 'Message 29 from 1' for text, _ in sb.page())
+    assert sb.row(sb.search('m')) == ('Message 299 from 5', 0)  # short: a scan
+
+
+def test_search_skips_rows_gone():
+    sb = Scrollback(size=8, rows=2, width=40)
+    sb.append('needle')
+    for n in range(7):
+        sb.append(f"hay {n}")
+    assert sb.search('needle') == 0
+    sb.append('hay 7')
+    assert sb.search('needle') is None
+    assert sb.search('nee') is None
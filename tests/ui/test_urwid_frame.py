@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+import pytest
+import urwid
+
+from src.ui.urwid_init import RadioFrame, Status
+
+SIZE = (42, 28)
+
+
+def shown(frame: RadioFrame) -> str:
+    return '\n'.join(row.decode() for row in frame.widget.render(SIZE, focus=True).text)
+
+
+def test_status_emits_changes_only():
+    status = Status()
+    changes = []
+    urwid.connect_signal(status, 'change', lambda name, value: changes.append((name, value)))
+    status.set(addr='7', rssi='-40')
+    status.set(addr='7', rssi='-41')  # the same address: no news
+    assert changes == [('addr', '7'), ('rssi', '-40'), ('rssi', '-41')]
+    with pytest.raises(KeyError):
+        status.set(volume='11')
+
+
+def test_status_fields_in_frame():
+    status = Status()
+    frame = RadioFrame(status)
+    status.set(addr='12', rssi='-42', snr='9', band='915000000', pwr='22', netid='18')
+    screen = shown(frame)
+    for text in ('ADDR 12', 'RSSI -42', 'SNR 9', 'VFO 915000000', 'PWR 22', 'NETWORK ID 18'):
+        assert text in screen
+    status.set(txrx='tx')
+    assert frame.fields['txrx'].get_text()[1][0][0] == 'lora_tx'
+
+
+def test_receive_box_follows_and_trims():
+    frame = RadioFrame(Status(), max_lines=50)
+    for n in range(60):
+        frame.add(f"message {n}", 'receive')
+    assert len(frame.messages) == 50
+    assert frame.messages[0].text == 'message 10'
+    screen = shown(frame)
+    assert 'message 59' in screen and 'message 40' not in screen
+    # scrolled back, the view stays put as messages arrive
+    frame.scroll('page up')
+    assert not frame.following
+    frame.add('message 60')
+    screen = shown(frame)
+    assert 'message 60' not in screen and 'message 40' in screen
+    frame.bottom()
+    assert frame.following and 'message 60' in shown(frame)
@@ -29,18 +29,28 @@
 #
 # Further instructions are available in the accompanying README.md document
 #
+# urwid998.py is the urwid front end: the same radio stack as rylr998.py
+# (src/core/radio.py) with urwid widgets in place of curses windows, for
+# one module. It runs on the asyncio loop; nothing polls. The loop calls
+# on_readable() when the port has bytes, which parses them and hands the
+# responses to the handlers. Messages go into the receive box's
+# SimpleListWalker, and the status fields are set on a Status, whose
+# 'change' signal updates the widgets that show them (src/ui/urwid_init.py).
+# The screen is drawn at most once per FRAME_INTERVAL for what the radio
+# brings, so a burst of frames costs one draw; urwid draws after each key
+# by itself. See benchmarks/urwid_frame_cost.py for what a frame costs.
+#
 
 import asyncio
-from serial import EIGHTBITS, PARITY_NONE,  STOPBITS_ONE
+from typing import Optional
 import logging
-import curses as cur
-import _curses
-import curses.ascii
+import signal
 import urwid
 import platform
-from src.core.serial import SerialManager
-from display import Display
-from src.ui.urwid_init import initialize_display
+from src.core.radio import Outcome, Radio
+from src.core.protocol import Err, Factory, Ok, ParamReport, RcvFrame, Ready, Reset
+from src.core.at_engine import CommandTimeout, Command
+from src.ui.urwid_init import RadioFrame, Status, initialize_display
 
 # Platform detection
 PLATFORM = platform.system()
@@ -86,10 +96,13 @@ class RYLR998:
     RXD1   = 15    # GPIO.BCM  pin 10
     RST    = 4     # GPIO.BCM  pin 7
 
-    serial: SerialManager = None
+    FRAME_INTERVAL = 0.05 # s, the most a received frame waits to be drawn
+    FOURTHSEC = 0.25
+
+    radio: Optional[Radio] = None
+    main_loop: Optional[urwid.MainLoop] = None
     
     debug  = False # By default, don't go into debug mode
-    reset  = False
 
     # RYLR998 configuration parameters 
     addr      = str(DEFAULT_ADDR_INT) # the default
@@ -101,100 +114,175 @@ class RYLR998:
     bandwidth = str(DEFAULT_BANDWIDTH)
     coding_rate = str(DEFAULT_CODING_RATE)
     preamble  = str(DEFAULT_PREAMBLE)
-    version   = ''
-    uid       = '' 
 
-    # state "machines" for various AT command and receiver responses
-    
-    ADDR_TABLE  = [b'+',b'A',b'D',b'D',b'R',b'E',b'S',b'S',b'=']
-    BAND_TABLE  = [b'+',b'B',b'A',b'N',b'D',b'=']
-    CRFOP_TABLE = [b'+',b'C',b'R',b'F',b'O',b'P',b'=']
-    ERR_TABLE   = [b'+',b'E',b'R',b'R',b'=']
-    FACT_TABLE  = [b'+',b'F',b'A',b'C',b'T',b'O',b'R',b'Y'] # reset to factory defaults
-    IPR_TABLE   = [b'+',b'I',b'P',b'R',b'=']
-    MODE_TABLE  = [b'+',b'M',b'O',b'D',b'E',b'=']
-    NETID_TABLE = [b'+',b'N',b'E',b'T',b'W',b'O',b'R',b'K',b'I',b'D',b'=']
-    OK_TABLE    = [b'+',b'O',b'K']
-    PARAM_TABLE = [b'+',b'P',b'A',b'R',b'A',b'M',b'E',b'T',b'E',b'R',b'=']
-    RCV_TABLE   = [b'+',b'R',b'C',b'V',b'=']  # receive is the default "state"
-#   RESET_table = [b'+',b'R',b'E',b'S',b'E',b'T'] # RESET detected in state 2 if state_table == RCV_table
-#   READY_table = [b'+',b'R',b'E',b'A',b'D',b'Y'] # if RESET received, state_table = READY_table
-    UID_TABLE   = [b'+',b'U',b'I',b'D',b'=']
-    VER_TABLE   = [b'+',b'V',b'E',b'R',b'=']
- 
-    # state machine initial state 
-
-    state = 0   # index into the current state table
-    state_table = RCV_TABLE # start state for the "machine"
-
-    # initial receive buffer state
-
-    rx_buf = ''  # string response
-    rx_len = 0
-
-    # initial transmit buffer state
-
-    tx_buf = ''     # tx buffer
-    tx_len = 0      # tx buffer length
-
-    # reset the receive buffer state
-    # NOTE: the receive buffer state is part of the RYLR998 object
-    # but the curses receive window state is maintained in the xcvr() function
-
-    # the state table can be overriden. This is used in the transition
-    # from the RESET_table state to the READY_table state.
-    def rx_buf_reset(self, state_table = RCV_TABLE) -> None:
-        self.rx_buf = ''
-        self.rx_len = 0
-        self.state = 0
-        self.state_table = state_table # default since RCV takes priority
-
-    # reset the transmit buffer state
-    # NOTE: the transmit buffer state is part of the RYRL998 object
-    # the curses transmit window state is maintained in the xcvr() function 
-
-    def tx_buf_reset(self) -> None:
-        self.tx_buf = '' # clear tx buffer
-        self.tx_len = 0  # tx_len is zero
-
-    # state machine functions
-
-    def in_rcv(self): # I would rather short-circuit inline
-        return self.state == 2 and self.state_table == self.RCV_TABLE
-  
-    # character differs from RCV_table at position 1 
-    # -- change the state table or start over
-    def change_state_table(self, data):
-        self.state += 1 # advance the state index
-        match data:
-            case b'A':
-                self.state_table = self.ADDR_TABLE
-            case b'B':
-                self.state_table = self.BAND_TABLE
-            case b'C':
-                self.state_table = self.CRFOP_TABLE
-            case b'E':
-                self.state_table = self.ERR_TABLE
-            case b'F': # factory
-                self.state_table = self.FACT_TABLE
-            case b'I':
-                self.state_table = self.IPR_TABLE
-            case b'M':
-                self.state_table = self.MODE_TABLE
-            case b'N':
-                self.state_table = self.NETID_TABLE # like a net group
-            case b'O':
-                self.state_table = self.OK_TABLE 
-            case b'P':
-                self.state_table = self.PARAM_TABLE
-            case b'R':
-                self.state_table = self.RCV_TABLE  # impossibe! 
-            case b'U':
-                self.state_table = self.UID_TABLE
-            case b'V':
-                self.state_table = self.VER_TABLE
-            case _:
-                self.rx_buf_reset() # beats me start over
+    def say(self, msg: str, attr: str = 'default') -> None:
+        self.frame.add(msg, attr)
+
+    def show_settings(self) -> None:
+        radio = self.radio
+        self.status.set(band=radio.band, pwr=radio.pwr or '', netid=radio.netid)
+
+    # Response handlers. Each takes the event from the parser; the radio
+    # has already taken note of the settings the module reports. They
+    # change widgets and leave the drawing to redraw().
+
+    def on_ok(self, event: Ok) -> None:
+        if self.radio.tx_flag:
+            self.status.set(txrx='') # turn the transmit indicator off
+            self.radio.tx_flag = False
+        else:
+            self.say("+OK")
+
+    def on_err(self, event: Err) -> None:
+        self.say(f"ERR={event.code}", 'error')
+
+    def on_param_report(self, event: ParamReport) -> None:
+        self.say(f"{event.name}: {event.value}")
+        if event.name in ('BAND', 'CRFOP', 'NETWORKID'):
+            self.show_settings()
+
+    def on_rcv(self, event: RcvFrame) -> None:
+        # ACKs and duplicates show nothing, nor does a fragment until its
+        # message is complete; a batch holds several messages
+        radio = self.radio
+        received = radio.receive(event)
+        for data in received.messages:
+            self.say(str(data, 'utf8', errors='replace'), 'receive')
+        self.status.set(txrx='', addr=str(event.addr), rssi=str(event.rssi), snr=str(event.snr))
+        frame = radio.repeats(received) if self.echo else None
+        if frame is not None:
+            self.spawn(self.repeat(frame, delay=self.FOURTHSEC))
+
+    def on_factory(self, event: Factory) -> None:
+        self.say("Factory defaults")
+
+    def on_reset(self, event: Reset) -> None:
+        self.say("Reset") # +READY follows
+
+    def on_ready(self, event: Ready) -> None:
+        self.say("Ready")
+
+    EVENT_HANDLERS = {
+        Ok:          on_ok,
+        Err:         on_err,
+        ParamReport: on_param_report,
+        RcvFrame:    on_rcv,
+        Factory:     on_factory,
+        Reset:       on_reset,
+        Ready:       on_ready,
+    }
+
+    def on_readable(self) -> None:
+        """The port has bytes: the event loop calls this, nothing polls"""
+        radio = self.radio
+        events = radio.read()
+        if radio.receiving:
+            self.status.set(txrx='rx') # a message is still arriving
+        for event in events:
+            self.EVENT_HANDLERS[type(event)](self, event)
+        self.redraw()
+
+    def redraw(self) -> None:
+        """Have the screen drawn within FRAME_INTERVAL"""
+        if self.pending is None and self.main_loop is not None:
+            self.pending = asyncio.get_running_loop().call_later(self.frame_interval, self.draw)
+
+    def draw(self) -> None:
+        self.pending = None
+        self.main_loop.draw_screen() # only the widgets that changed are rendered again
+        self.draws += 1
+
+    def on_key(self, key: str) -> None:
+        """The keys the transmit box leaves: urwid draws the screen after"""
+        if key == 'enter':
+            msg = self.frame.edit.edit_text
+            if msg:
+                self.frame.edit.set_edit_text('')
+                dest = self.radio.addr if self.dest is None else str(self.dest)
+                self.spawn(self.transmit(dest, msg))
+        elif key in ('page up', 'page down'):
+            self.frame.scroll(key)
+        elif key == 'esc':
+            self.frame.bottom()
+        elif key == 'ctrl c':
+            self.quit()
+
+    def quit(self) -> None:
+        if self.done is not None and not self.done.done():
+            self.done.set_result(None)
+
+    def spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task) # keep a reference until it is done
+        task.add_done_callback(self.reap)
+        return task
+
+    def reap(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"{task.get_coro().__name__}: {task.exception()!r}")
+
+    async def command(self, cmd: Command) -> None:
+        # The handlers show the reply. Only a silent module is news here.
+        try:
+            await self.radio.engine.send(cmd)
+        except CommandTimeout:
+            name = (cmd if isinstance(cmd, str) else str(cmd, 'utf8', errors='replace')).split('=')[0]
+            self.say(f"No reply to AT+{name}", 'error')
+            self.redraw()
+
+    async def configure(self) -> None:
+        # The engine writes each command once the previous one is answered
+        if self.factory:
+            await self.command('FACTORY')
+            await asyncio.sleep(self.FOURTHSEC)
+        for cmd in self.radio.commands():
+            await self.command(cmd)
+
+    async def transmit(self, addr: str, msg: str) -> None:
+        radio = self.radio
+        try:
+            payloads = radio.split(bytes(msg, 'utf8'), self.compress)
+        except ValueError as e:
+            self.say(str(e), 'error')
+            self.redraw()
+            return
+        self.say(msg, 'transmit')
+        self.status.set(txrx='tx') # on_ok() turns the indicator off
+        radio.tx_flag = True
+        self.redraw()
+
+        outcome = await radio.send(int(addr), payloads, self.reliable)
+        if outcome is Outcome.HELD:
+            self.say(f"No route to {addr} yet: held", 'error')
+        elif outcome is Outcome.LOST:
+            self.say(f"Not delivered to {addr}", 'error')
+        elif outcome is Outcome.QUEUE_FULL:
+            self.say("TX queue full: not sent", 'error')
+        elif outcome is Outcome.NO_REPLY:
+            self.say("No reply to AT+SEND", 'error')
+        elif outcome is Outcome.REJECTED:
+            self.say(f"AT+SEND rejected: +ERR={radio.rejected}", 'error')
+        if outcome in (Outcome.HELD, Outcome.QUEUE_FULL, Outcome.NO_REPLY, Outcome.REJECTED):
+            self.on_ok(Ok()) # no +OK is coming: turn the indicator off
+        self.redraw()
+
+    async def repeat(self, frame: bytes, delay: float = 0) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        self.status.set(txrx='tx')
+        self.radio.tx_flag = True
+        self.redraw()
+        if not await self.radio.repeat(frame):
+            self.on_ok(Ok()) # no +OK is coming: turn the indicator off
+            self.redraw()
+
+    async def poll(self) -> None:
+        # only where the loop cannot watch the port
+        while True:
+            if self.radio.has_data():
+                self.on_readable()
+            await asyncio.sleep(self.frame_interval)
 
     def gpio_setup(self) -> None:
         if self.exist_gpio:
@@ -207,8 +295,8 @@ class RYLR998:
 
     def __del__(self):
         try:
-            if self.serial:
-                self.serial.close()
+            if self.radio:
+                self.radio.close()
         except Exception as e:
             logging.error(str(e))
 
@@ -216,12 +304,17 @@ class RYLR998:
             GPIO.cleanup()  # clean up the GPIO
 
 
-    def __init__(self, args):
+    def __init__(self, args, frame_interval: float = FRAME_INTERVAL):
 
         self.port = args.port     # the RYLR998 cares about this
         self.baudrate = args.baud # and this (type string!)
         self.debug = args.debug
         self.factory = args.factory
+        self.echo = args.echo
+        self.compress = args.compress
+        self.reliable = args.reliable
+        self.dest = args.dest
+        self.frame_interval = frame_interval
 
         # note: self.addr is a str, args.addr is an int
         self.addr = str(args.addr) # set the default
@@ -251,437 +344,63 @@ class RYLR998:
 
         self.gpio_setup()
 
+        self.status = Status()
+        self.frame = RadioFrame(self.status)
+        self.tasks = set()
+        self.pending: Optional[asyncio.TimerHandle] = None # the next draw
+        self.draws = 0
+        self.done: Optional[asyncio.Future] = None
+
         try:
-            self.serial = SerialManager(self.port, self.baudrate)
+            self.radio = Radio(self.port, self.baudrate, self.addr, args.band, self.netid,
+                f"{self.spreading_factor},{self.bandwidth},{self.coding_rate},{self.preamble}",
+                pwr=self.pwr, mode=self.mode, duty_cycle=float(args.duty) / 100,
+                coalesce=args.coalesce, mesh=args.mesh, hops=args.hops, echo=self.echo,
+                debug=self.debug)
         except Exception as e:
             logging.error(str(e))
             exit(1)
 
     # Transceiver function
     #
-    # This is the main loop. The transceiver function xcvr(scr) is designed
-    # to prioritize receving and parsing command responses from the RYLR998
-    # over transmission and configuration. This is done one character at
-    # a time, by maintining the receive buffer, receive window, transmit
-    # buffer and transmit windows separately.
-
-    async def xcvr(self, scr : _curses.window) -> None:
-
-        # ATcmd() is only called within the transceiver loop (OUTER LOOP), 
-        # so it is an inner function. The OUTER LOOP parses the response 
-        # to AT commands from the RYLR998 in two phases, incidentally.
-
-        async def at_cmd(cmd: str = '') -> int:
-            command = f"AT{'+' if len(cmd) > 0 else ''}{cmd}\r\n"
-            count: int = await self.serial.write(bytes(command, 'utf8'))
-            return count
-        
-        dsply  = Display(scr) 
-
-        # Initialize urwid with asyncio event loop
-        evl = urwid.AsyncioEventLoop(loop=asyncio.get_event_loop())
-        loop = initialize_display(evl)  # Call our new initialization
-        loop.start()
-         
-        # The LoRa® status indicator turns beet RED if the following is True
-        tx_flag = False # True if and only if transmitting
-        # txwin cursor coordinates
-        tx_row = 0   # txwin_y
-        tx_col = 0   # txwin_x
-        dsply.txwin.move(tx_row, tx_col)
-        dsply.txwin.noutrefresh()
-
-        self.tx_buf_reset()
- 
-        # show the rectangles etc
-        scr.noutrefresh()
-     
-        # Brace yourself: we are approaching the xcvr() loop 
-
-        # NOTE: AT+RCV is NOT a valid command.
-        # The RYLR998 module emits "+RCV=w,x,y,z" when it receives a packet
-        # To test the +ERR= logic, uncomment the following
-        # count : int  = await at_cmd('RCV')
-        # This generates the response b'+ERR=4\r\n'. Else, leave commented.
-
-        # this next causes trouble  debug
-        # count : int  = await at_cmd('RESET')
-        # Add English interpretations of the ERR conditions
-
-        # sorry, these commands have to be enqueued and dequeued
-        # one at a time within the transceiver loop
-
-        queue = asyncio.Queue()  # no limit
-
-
-        if self.factory:
-            await queue.put('FACTORY')
-            await queue.put(f"DELAY,{str(dsply.FOURTHSEC)}")
-
-        await queue.put(f"IPR={self.baudrate}") #  chicken and egg
-        await queue.put(f"ADDRESS={self.addr}")  
-        await queue.put(f"NETWORKID={self.netid}") # this is a str
-        await queue.put(f"BAND={args.band}")
-
-        if self.pwr:   
-            await queue.put(f"CRFOP={self.pwr}") # the next is needed to receive again!
-        await queue.put(f"PARAMETER={self.spreading_factor},{self.bandwidth},{self.coding_rate},{self.preamble}")
-
-        await queue.put('ADDRESS?')
-        await queue.put('BAND?')
-        await queue.put('CRFOP?')
-        await queue.put(f"MODE={self.mode}")
-        await queue.put('PARAMETER?') 
-        await queue.put('UID?')
-        await queue.put('VER?')
-        await queue.put('NETWORKID?')
-
-
-        # You are about to participate in a great adventure.
-        # You are about to experience the awe and mystery that
-        # reaches from the inner functions to THE OUTER LOOP
-
-        dirty = True  # transmit and RCV will set this
-
-        # a state variable is enough to synchronize AT commands
-        wait_for_reply =  False 
-
-        # Hold onto your chair and godspeed. 
+    # urwid and the radio share the asyncio loop. urwid watches the
+    # keyboard, the radio's port calls on_readable(), and the coroutines
+    # that configure the module and transmit run beside them. xcvr()
+    # only sets them up and waits for CTRL-C.
+
+    async def xcvr(self) -> None:
+        loop = asyncio.get_running_loop()
+        evl = urwid.AsyncioEventLoop(loop=loop)
+        self.main_loop = initialize_display(self.frame.widget, evl, self.on_key)
+        self.done = loop.create_future()
+        self.show_settings()
+        self.main_loop.start()
         try:
-            while True:
-            # At the beginning of the xcvr loop, 
-            # cur.doupdate() is called and the dirty flag is  reset,
-            # provided the dirty flag is set. This speeds up the display
-
-                if dirty:
-                    cur.doupdate() # oh baby
-                    dirty = False # reset the dirty bit
-
-                if self.serial.has_data():  # Changed from self.aio.in_waiting
-                    # read and act one byte at a time. Be a Markov process.
-                    data = await self.serial.read_byte()  # Changed from self.aio.read_async
-                    # you could use a debug window -- perhaps
-                    if self.debug: # this is buggy
-                        logging.info("read:{} state:{}".format(data, self.state))
-
-                    # Phase One: parse the fixed portion of the serial port response
-                    if self.state < len(self.state_table):
-                        if self.state_table[self.state] == data:
-                            if self.state == 2 and self.state_table == self.RCV_TABLE:
-                                dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                            cur.color_pair(dsply.WHITE_GREEN))
-                                dsply.stwin.noutrefresh()
-                                # cursor back to tx window to avoid flicker
-                                dsply.txwin.move(tx_row, tx_col)  
-                                dsply.txwin.noutrefresh()
-                                dirty = True
-
-                            self.state += 1 # advance the state index
-                        else:
-                            if self.state == 1:
-                                # advance the state index
-                                # if the state table cannot be changed
-                                # the rx buffer and the state will be reset
-                                self.change_state_table(data)
-                            else:
-                                # in this case, the state is 0 and you are lost
-                                # preamble possibly -- or state > 1 and you are lost
-                                self.rx_buf_reset() 
-
-                        continue  # parsing output takes priority over input
-                    else:
-                        # Phase Two: parse the data portion of the response
-                        # the precondition for the second parsing phase obtains:
-                        # self.state == len(self.state_table). 
-
-                        # accumulate data into rx_buf after the '=' sign until '\n'
-                        # The OK does not have an equal sign, so it vanishes.
-
-                        # advance the rx buffer 
-                        self.rx_buf += str(data,'utf8')
-                        self.rx_len += 1 # superior to calling len()
-
-                        # If you made it here, the msg is <= 240 chars
-                        # the hardware ensures this
-
-                        if data == b'\n':
-                            # remove the carriage return, newline from rx_buf
-                            self.rx_buf = self.rx_buf[:-2]
-                            self.rx_len -= 2
-
-                            match self.state_table:
-                                case self.ADDR_TABLE:
-                                    dsply.rxaddnstr(f"addr: {self.rx_buf}", self.rx_len+6)
-                                    self.addr = self.rx_buf
-                                    wait_for_reply = False
-
-                                case self.BAND_TABLE:
-                                    dsply.rxaddnstr(f"frequency: {self.rx_buf} Hz", self.rx_len+15) 
-                                    self.band = self.rx_buf
-                                    dsply.stwin.addnstr(dsply.VFO_ROW, dsply.VFO_COL+4,self.band, 
-                                                self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                    dsply.stwin.noutrefresh()
-                                    wait_for_reply = False
-
-                                case self.CRFOP_TABLE:
-                                    dsply.rxaddnstr(f"power output: {self.rx_buf} dBm", self.rx_len+18)       
-                                    self.pwr = self.rx_buf
-                                    dsply.stwin.addnstr(dsply.PWR_ROW, dsply.PWR_COL+4,self.pwr, 
-                                                self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                    dsply.stwin.noutrefresh()
-                                    wait_for_reply = False
-
-                                case self.ERR_TABLE:
-                                    dsply.xlateError(self.rx_buf)
-                                    wait_for_reply = False
-                                  
-                                case self.FACT_TABLE:
-                                    dsply.rxaddnstr("Factory defaults", 16)
-                                    wait_for_reply = False
-
-                                case self.IPR_TABLE:
-                                    dsply.rxaddnstr(f"uart: {self.rx_buf} baud", self.rx_len+11)
-                                    self.baudrate = self.rx_buf
-                                    wait_for_reply = False
-
-                                case self.MODE_TABLE:
-                                    dsply.rxaddnstr(f"mode: {self.rx_buf}", self.rx_len+6)
-                                    self.mode = self.rx_buf
-                                    wait_for_reply = False
-        
-
-                                case self.OK_TABLE:
-                                    if tx_flag:
-                                        # turn the transmit indicator off
-                                        dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                                    cur.color_pair(dsply.WHITE_BLACK))
-                                        dsply.stwin.noutrefresh() # yes, that was it
-                                        tx_flag = False # will be reset below
-                                    else:
-                                        dsply.rxaddnstr("+OK", 3)
-                                    wait_for_reply = False
-                                
-                                case self.NETID_TABLE:
-                                    dsply.rxaddnstr(f"NETWORK ID: {self.rx_buf}", self.rx_len+12) 
-                                    self.netid = self.rx_buf
-                                    dsply.stwin.addnstr(dsply.NETID_ROW, 37,self.netid, 
-                                                self.rx_len, cur.color_pair(dsply.WHITE_BLACK))
-                                    dsply.stwin.noutrefresh()
-                                    wait_for_reply = False
-
-                                
-                                case self.PARAM_TABLE:
-                                    self.spreading_factor, self.bandwidth, self.coding_rate, self.preamble = self.rx_buf.split(',', 3)
-                                    dsply.rxaddnstr(f"spreading factor: {self.spreading_factor}", len(self.spreading_factor)+18) 
-                                    dsply.rxaddnstr(f"bandwidth: {self.bandwidth}", len(self.bandwidth)+11)  
-                                    dsply.rxaddnstr(f"coding rate: {self.coding_rate}", len(self.coding_rate)+13)  
-                                    dsply.rxaddnstr(f"preamble: {self.preamble}", len(self.preamble)+10)
-                                    wait_for_reply = False
-
-                                case self.RCV_TABLE:
-                                    # The following five lines are adapted from
-                                    # https://github.com/wybiral/micropython-rylr/blob/master/rylr.py
-                                
-                                    addr, n, self.rx_buf = self.rx_buf.split(',', 2)
-                                    n = int(n)
-                                    msg = self.rx_buf[:n]
-                                    self.rx_buf = self.rx_buf[n+1:]
-                                    rssi, snr = self.rx_buf.split(',')
-
-                                    if n == 40:
-                                        # prevent auto scrolling if EOL at the
-                                        # end of the window
-                                        dsply.rxinsnstr(msg, n, fg_bg = dsply.BLACK_PINK)
-                                    else:
-                                        # take advantage of auto scroll if n > 40.
-                                        dsply.rxaddnstr(msg, n, fg_bg = dsply.BLACK_PINK) 
-
-                                    dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                                        cur.color_pair(dsply.WHITE_BLACK))
-
-                                    # add the ADDRESS, RSSI and SNR to the status window
-                                    dsply.stwin.addstr(0, 13, addr, cur.color_pair(dsply.BLUE_BLACK))
-                                    dsply.stwin.addstr(0, 26, rssi, cur.color_pair(dsply.BLUE_BLACK))
-                                    dsply.stwin.addstr(0, 36, snr, cur.color_pair(dsply.BLUE_BLACK))
-                                    dsply.stwin.noutrefresh()
-                                    # not waiting for a reply from the module
-                                    # so we do not reset the waitForReply flag
-
-                                    # if echoing the received message, delay 0.25 sec
-                                    if args.echo:
-                                        await queue.put(f"DELAY,{str(dsply.FOURTHSEC)}")
-                                        await queue.put(f"SEND={addr},{str(n)},{msg}")
-
-                                case self.UID_TABLE:
-                                    dsply.rxaddnstr(f"UID: {self.rx_buf}", self.rx_len+5) 
-                                    self.uid = self.rx_buf
-                                    wait_for_reply = False
-
-
-                                case self.VER_TABLE:
-                                    dsply.rxaddnstr(f"VER: {self.rx_buf}", self.rx_len+5) 
-                                    self.version = self.rx_buf
-                                    wait_for_reply = False
-                                
-                                case _:
-                                    dsply.rxaddnstr("ERROR. Call Tech Support!",25, fg_bg = dsply.RED_BLACK) 
-                                    wait_for_reply = False
-                         
-                            # also return to the txwin
-                            dsply.txwin.move(tx_row, tx_col)
-                            dsply.txwin.noutrefresh()
-
-                            self.rx_buf_reset() # reset the receive buffer state and assume RCV -- this is necessary
-
-                            dirty = True    # instead of doupdate() here, use the dirty bit
-                            # RCV does not reset waitForReply, since there is no AT command 
-                            # for which a response is expected
-
-                        continue # The dirty bit logic will update the screen
-
-                    # else: # not a newline yet. Prioritize receive and responses from the module
-                    #     if self.rx_len > 240: # hardware should prevent this from occurring.
-                    #         self.rxbufReset() # this is an error
-                    #     continue # still accumulating chars from serial port, keep listening
-
-                # at long last, you can speak
-                ch = dsply.txwin.getch()
-                if ch == -1: # cat got your tongue? 
-                    # dequeue AT commands only if not waiting for AT response to finish
-                    # receive will take priority if you are receiving
-                    # use a waitForReply.instead of the txflag, which is for the tx indictor
-                    # check if there is a command
-                    if not wait_for_reply and  not queue.empty(): 
-                        wait_for_reply = True
-                        cmd = await queue.get()
-                        if cmd.startswith('SEND='):
-                            # parse the command SEND=#,msglen,msg) 
-                            _, _msg_len, msg = cmd.split(',', 2) # the 2 here accounts for commas in msg
-                            msg_len = int(_msg_len) # _msglen is a string
-                            # use insnsstr() here to avoid scrolling if 40 characters (the maximum)
-                            if msg_len == 40:
-                                dsply.rxinsnstr(msg, msg_len, fg_bg = dsply.YELLOW_BLACK)
-                            else:
-                                dsply.rxaddnstr(msg, msg_len, fg_bg = dsply.YELLOW_BLACK)
-
-                            tx_col=0  # local transmit window cursor position
-                            dsply.txwin.move(tx_row, tx_col) # cursor to tx initial input position
-                            dsply.txwin.clear()
-                            dsply.txwin.noutrefresh()
-                            self.tx_buf_reset()
-
-                            # flash the LoRa® indicator on transmit
-                            dsply.stwin.addnstr(0,dsply.TXRX_COL, dsply.TXRX_LBL, dsply.TXRX_LEN, 
-                                                cur.color_pair(dsply.WHITE_RED))
-                            dsply.stwin.noutrefresh()
-                            tx_flag = True # transmitting 
-                            dirty = True # really True this time 
-                        elif cmd.startswith('DELAY,'):
-                            _,delay = cmd.split(',',1)
-                            await asyncio.sleep(float(delay))
-                            wait_for_reply = False # not an AT command!
-                            continue # use this to escape
-                        await at_cmd( cmd ) # send command to serial port to rylr998
-                    continue # remember that RCV and AT cmd responses take priority
-
-                elif ch == cur.ascii.ETX: # CTRL-C
-                    cur.noraw()     # go back to cooked mode
-                    cur.resetty()   # restore the terminal
-                    print("\n")
-                    return
-
-                elif ch == cur.ascii.ESC: 
-                    # refresh the border
-                    dsply.draw_border()
-                    # refresh the border
-
-                    tx_col = 0
-                    dsply.txwin.move(tx_row, tx_col)
-                    self.tx_buf_reset()
-                    dsply.txwin.erase()
-                    dsply.txwin.noutrefresh() # may not be needed
-
-                    dirty = True
-
-                elif ch == cur.ascii.LF:
-                    if self.tx_len > 0:
-                        # the SEND_COMMAND includes the address 
-                        # Don't be silly: you don't have to send only to your address!!!
-                        # you could send to some other address
-                        await queue.put(f"SEND={self.addr},{str(self.tx_len)},{self.tx_buf}")
-
-                elif ch == cur.KEY_LEFT:
-                    tx_col = max(0, tx_col - 1)
-                    dsply.txwin.move(tx_row, tx_col)
-                    dsply.txwin.noutrefresh()
-                    dirty = True
-
-                elif ch == cur.KEY_RIGHT:
-                    tx_col = min(tx_col+1, self.tx_len, 39)
-                    dsply.txwin.move(tx_row, tx_col)
-                    dsply.txwin.noutrefresh()
-                    dirty = True
-
-                elif ch == cur.KEY_DC: # Delete
-                    if tx_col >= self.tx_len:
-                        continue
-                    # tx_col must be to the left of a character to delete somethin  to the right
-                    self.tx_buf = self.tx_buf[0:tx_col] + self.tx_buf[tx_col+1:min(40,self.tx_len)]
-                    self.tx_len = max(0,min(40, self.tx_len)-1)
-                    dsply.txwin.delch(tx_row,tx_col)
-                    if self.tx_len < 40:
-                        dsply.txwin.addnstr(tx_row, 0, self.tx_buf ,self.tx_len)
-                    else:
-                        dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)
-                    dsply.txwin.move(tx_row,tx_col)
-                    dsply.txwin.noutrefresh()
-                    dirty = True
-
-                elif ch == cur.ascii.BS: # Backspace
-                    if tx_col == 0:
-                        continue # nothing to delete
-                    # tx_col > 0 here: must be to the right of a character to delete something to the left
-                    self.tx_buf = self.tx_buf[0:max(0,tx_col-1)]+self.tx_buf[tx_col:self.tx_len]
-                    self.tx_len = len(self.tx_buf) # Don't take chances with this
-                    tx_col -= 1
-                    dsply.txwin.clear() # clear the transmit window
-                    if self.tx_len < 40:
-                        dsply.txwin.addnstr(tx_row, 0, self.tx_buf, self.tx_len) # display the tx buffer
-                    else:
-                        dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)  # display the tx buffer 
-                    dsply.txwin.move(tx_row, tx_col) # move the cursor
-                    dsply.txwin.noutrefresh()
-                    dirty = True
-
-                elif cur.ascii.isascii(ch):
-                    if self.tx_len == 40 and tx_col < 40:
-                        continue   # don't change!
-                    self.tx_buf = self.tx_buf[0:tx_col] + str(chr(ch)) + self.tx_buf[tx_col:min(39,self.tx_len)]
-                    self.tx_len = min(40, self.tx_len+1) #  
-                    #txwin.insnstr(tx_row, tx_col, str(chr(ch)),1)
-                    if self.tx_len < 40:
-                        dsply.txwin.addnstr(tx_row, 0, self.tx_buf ,self.tx_len)
-                    else:
-                        dsply.txwin.insnstr(tx_row, 0, self.tx_buf, self.tx_len)
-                    tx_col = min(39, tx_col+1)
-                    dsply.txwin.move(tx_row, tx_col)
-                    dsply.txwin.noutrefresh()
-                    dirty = True
-
-        except Exception as e:
-            logging.error(f"Error in xcvr: {e}")
-            raise
+            if not self.radio.add_reader(self.on_readable):
+                logging.info("Cannot watch the port, polling")
+                self.spawn(self.poll())
+            try:
+                loop.add_signal_handler(signal.SIGINT, self.quit)
+            except (NotImplementedError, AttributeError):
+                pass
+            self.spawn(self.configure())
+            self.radio.start() # HELLOs, so that routes spread
+            await self.done
         finally:
-            loop.stop()  # Stop urwid main loop before raising KeyboardInterrupt
-            raise KeyboardInterrupt
- 
+            self.radio.close() # and its reader
+            for task in list(self.tasks):
+                task.cancel()
+            if self.pending is not None:
+                self.pending.cancel()
+            self.main_loop.stop()
+
 # end of the XCVR loop
 
 if __name__ == "__main__":
     import re # regular expressions for argument checking
     from src.ui.constants import (RadioDefaults, RadioLimits)
     from src.config.validators import (
-        bandcheck, pwrcheck, modecheck, netidcheck, uartcheck,
+        bandcheck, pwrcheck, modecheck, netidcheck, uartcheck, dutycheck,
          paramcheck, validate_netid_parameter
     )
 
@@ -691,12 +410,13 @@ if __name__ == "__main__":
     args = parse_args()
     
     # Apply all validation functions to the args
-    args.band = bandcheck(args.band)
+    args.band = bandcheck(args.band[0]) # one module
     if args.pwr is not None:
         args.pwr = pwrcheck(args.pwr)
     args.mode = modecheck(args.mode)  
     args.netid = netidcheck(args.netid)
-    args.port = uartcheck(args.port)
+    args.port = uartcheck(args.port[0])
+    args.duty = dutycheck(args.duty)
 
      # Parameter validation including netid check
     validate_netid_parameter(args.netid, args.parameter)
@@ -704,8 +424,8 @@ if __name__ == "__main__":
 
     rylr  = RYLR998(args)
     try:
-        asyncio.run(cur.wrapper(rylr.xcvr))
+        asyncio.run(rylr.xcvr())
     except KeyboardInterrupt:
         pass
     finally:
-        print("73!")
\ No newline at end of file
+        print("73!")